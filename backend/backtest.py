@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Rolling-origin backtest for Kansas Claims Predictor engines
+For each origin, every engine is fitted on the data before it and scored on the
+following horizon. Folds and engines run in parallel worker processes; each
+run reports MAE/RMSE per series and in aggregate, with fit time, predict time
+and the pickled size of the fitted artifact, so engines can be compared on an
+accuracy/cost trade-off.
+
+Usage:
+  python backtest.py                                  # all engines, 3 folds of 30 days
+  python backtest.py --engines regression,pooled --folds 6 --horizon 14
+  python backtest.py --data ../data/kansas_claims_10years.csv --jobs 4
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from benchmark import BENCH_RESULTS_DIR, get_git_commit
+from harness import get_dataset
+from ml_models import ENGINES, ClaimsPredictionModel, score_forecasts
+
+TARGETS = (("count", "claim_count", "predicted_count"), ("cost", "total_cost", "predicted_cost"))
+
+_frames = {}
+
+
+def _load_frame(csv_path, counties):
+    """Read the dataset once per worker process"""
+    key = (csv_path, tuple(counties or ()))
+    if key not in _frames:
+        data = pd.read_csv(csv_path, parse_dates=["date"])
+        if counties:
+            data = data[data["county"].isin(counties)].reset_index(drop=True)
+        _frames[key] = data
+    return _frames[key]
+
+
+def rolling_origins(last_date, folds, horizon, step):
+    """Origins of each fold, oldest first; fold k tests [origin, origin + horizon)"""
+    last_origin = pd.Timestamp(last_date) + pd.Timedelta(days=1) - pd.Timedelta(days=horizon)
+    return [last_origin - pd.Timedelta(days=step * k) for k in reversed(range(folds))]
+
+
+def fit_engine(model, engine, horizon, arima_budget):
+    """Fit one engine on model.data and return its artifact"""
+    if engine == "regression":
+        model.train_all_models()
+        return model.models
+    if engine == "pooled":
+        return model.train_pooled_model()
+    model.train_time_series_engine(n_jobs=1, time_budget=arima_budget, horizon_days=horizon)
+    return model.ts_engine
+
+
+def artifact_size(artifact):
+    """Bytes the fitted artifact takes when saved with joblib"""
+    buffer = io.BytesIO()
+    joblib.dump(artifact, buffer)
+    return buffer.tell()
+
+
+def run_fold(csv_path, counties, engine, origin, horizon, arima_budget):
+    """Fit one engine before origin and predict every series over the horizon"""
+    data = _load_frame(csv_path, counties)
+    end = origin + pd.Timedelta(days=horizon)
+    test = data[(data["date"] >= origin) & (data["date"] < end)]
+
+    model = ClaimsPredictionModel()
+    model.data = data[data["date"] < origin]
+
+    start = time.perf_counter()
+    artifact = fit_engine(model, engine, horizon, arima_budget)
+    fit_seconds = time.perf_counter() - start
+
+    series = {}
+    predict_seconds = 0.0
+    for (county, claim_type), actual in test.groupby(["county", "claim_type"], sort=True):
+        start = time.perf_counter()
+        predictions = model.predict_dates(county, claim_type, actual["date"], engine)
+        predict_seconds += time.perf_counter() - start
+        if not predictions:
+            continue
+        predicted = pd.DataFrame(predictions).set_index("date")
+        actual = actual.set_index(actual["date"].dt.strftime("%Y-%m-%d")).loc[predicted.index]
+        series[f"{county}_{claim_type}"] = {
+            "actual": actual[[column for _, column, _ in TARGETS]].to_numpy(np.float64),
+            "predicted": predicted[[column for _, _, column in TARGETS]].to_numpy(np.float64),
+        }
+
+    return {
+        "engine": engine,
+        "origin": origin.strftime("%Y-%m-%d"),
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+        "artifact_bytes": artifact_size(artifact),
+        "series": series,
+    }
+
+
+def score(actual, predicted):
+    """MAE/RMSE for each target"""
+    result = {}
+    for i, (name, _, _) in enumerate(TARGETS):
+        for metric, value in score_forecasts(actual[:, i], predicted[:, i]).items():
+            result[f"{name}_{metric}"] = round(value, 4)
+    return result
+
+
+def summarize_engine(fold_results):
+    """Per-series and aggregate scores plus cost figures for one engine's folds"""
+    by_series = {}
+    for fold in fold_results:
+        for key, values in fold["series"].items():
+            by_series.setdefault(key, []).append(values)
+
+    series_scores = {}
+    all_actual, all_predicted = [], []
+    for key, parts in sorted(by_series.items()):
+        actual = np.concatenate([part["actual"] for part in parts])
+        predicted = np.concatenate([part["predicted"] for part in parts])
+        series_scores[key] = score(actual, predicted)
+        all_actual.append(actual)
+        all_predicted.append(predicted)
+
+    predictions = sum(len(a) for a in all_actual)
+    aggregate = score(np.concatenate(all_actual), np.concatenate(all_predicted)) if all_actual else {}
+    # Mean of per-series scores weights small rural series like large ones
+    for metric in list(aggregate):
+        aggregate[f"mean_series_{metric}"] = round(float(np.mean([s[metric] for s in series_scores.values()])), 4)
+
+    predict_seconds = sum(fold["predict_seconds"] for fold in fold_results)
+    return {
+        "aggregate": aggregate,
+        "series_evaluated": len(series_scores),
+        "predictions": predictions,
+        "fit_seconds": round(float(np.mean([fold["fit_seconds"] for fold in fold_results])), 3),
+        "predict_seconds": round(predict_seconds / len(fold_results), 4),
+        "predict_us_per_date": round(predict_seconds / max(1, predictions) * 1e6, 2),
+        "artifact_bytes": int(np.mean([fold["artifact_bytes"] for fold in fold_results])),
+        "folds": [{key: fold[key] for key in ("origin", "fit_seconds", "predict_seconds", "artifact_bytes")}
+                  for fold in fold_results],
+        "series": series_scores,
+    }
+
+
+def run_backtest(csv_path, engines, folds=3, horizon=30, step=None, counties=None, n_jobs=-1, arima_budget=None):
+    """Backtest each engine over rolling origins; folds x engines run in parallel"""
+    step = step or horizon
+    last_date = _load_frame(csv_path, counties)["date"].max()
+    origins = rolling_origins(last_date, folds, horizon, step)
+
+    tasks = [(engine, origin) for engine in engines for origin in origins]
+    fold_results = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(run_fold)(csv_path, counties, engine, origin, horizon, arima_budget)
+        for engine, origin in tasks
+    )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": get_git_commit(),
+            "dataset": csv_path,
+            "origins": [origin.strftime("%Y-%m-%d") for origin in origins],
+            "horizon_days": horizon,
+            "step_days": step,
+            "counties": counties,
+        },
+        "engines": {
+            engine: summarize_engine([fold for fold in fold_results if fold["engine"] == engine])
+            for engine in engines
+        },
+    }
+
+
+def print_results(results):
+    """Print the accuracy/cost trade-off of each engine"""
+    print("\n" + "=" * 96)
+    print(f"{'Engine':<12}{'series':>8}{'count MAE':>11}{'count RMSE':>12}{'cost MAE':>13}"
+          f"{'fit s':>9}{'us/date':>10}{'artifact KB':>13}")
+    print("-" * 96)
+    for engine, stats in results["engines"].items():
+        agg = stats["aggregate"]
+        print(f"{engine:<12}{stats['series_evaluated']:>8}{agg.get('count_mae', float('nan')):>11.2f}"
+              f"{agg.get('count_rmse', float('nan')):>12.2f}{agg.get('cost_mae', float('nan')):>13.0f}"
+              f"{stats['fit_seconds']:>9.2f}{stats['predict_us_per_date']:>10.1f}"
+              f"{stats['artifact_bytes'] / 1024:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kansas Claims Predictor rolling-origin backtest")
+    parser.add_argument("--data", help="CSV to backtest (default: seeded synthetic dataset)")
+    parser.add_argument("--years", type=int, default=2, help="Years of synthetic data when --data is not given")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic dataset")
+    parser.add_argument("--counties", help="Comma-separated subset of counties (default: all)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma-separated engines to compare")
+    parser.add_argument("--folds", type=int, default=3, help="Number of rolling origins")
+    parser.add_argument("--horizon", type=int, default=30, help="Days scored after each origin")
+    parser.add_argument("--step", type=int, help="Days between origins (default: horizon)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel worker processes")
+    parser.add_argument("--arima-budget", type=float, help="Seconds allowed for fitting the whole ARIMA engine in each fold")
+    parser.add_argument("--output", help="Output JSON path (default: bench_results/backtest_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    engines = args.engines.split(",")
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+    counties = args.counties.split(",") if args.counties else None
+    csv_path = args.data or get_dataset(args.years, args.seed)
+
+    results = run_backtest(csv_path, engines, args.folds, args.horizon, args.step, counties,
+                           args.jobs, args.arima_budget)
+
+    output = args.output
+    if not output:
+        os.makedirs(BENCH_RESULTS_DIR, exist_ok=True)
+        commit = results["meta"]["git_commit"] or "nogit"
+        output = os.path.join(BENCH_RESULTS_DIR, f"backtest_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_results(results)
+    print(f"\nResults written to {output}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for Kansas Claims Predictor backend
+Times data loading, training, prediction helpers, cold import of the API
+modules (with a -X importtime breakdown) and in-process API endpoint latency
+against a seeded synthetic dataset, and writes JSON results that can be
+compared across commits.
+
+Usage:
+  python benchmark.py                          # run with defaults
+  python benchmark.py --years 2 --requests 200 # bigger dataset / more requests
+  python benchmark.py --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import charts
+from harness import FakeGroqClient, get_dataset, run_load_test, setup_app, summarize_timings
+from ml_models import ClaimsPredictionModel
+
+BENCH_RESULTS_DIR = "bench_results"
+
+# Series used for the per-call benchmarks
+BENCH_COUNTY = "Johnson"
+BENCH_CLAIM_TYPE = "emergency"
+BENCH_TARGET_DATE = "2025-01-15"
+
+
+def time_call(fn, repeat):
+    """Call fn() repeat times and return the list of wall-clock durations"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def benchmark_functions(csv_path, repeat, train_repeat):
+    """Time the model and chart helpers; returns (results, trained predictor)"""
+    results = {}
+    predictor = ClaimsPredictionModel()
+
+    print("Timing load_data...")
+    results["load_data"] = summarize_timings(time_call(lambda: predictor.load_data(csv_path), train_repeat))
+
+    print("Timing train_all_models...")
+    results["train_all_models"] = summarize_timings(time_call(predictor.train_all_models, train_repeat))
+
+    print("Timing prediction and insight helpers...")
+    results["predict_claims"] = summarize_timings(time_call(
+        lambda: predictor.predict_claims(BENCH_COUNTY, BENCH_CLAIM_TYPE, BENCH_TARGET_DATE), repeat))
+    results["predict_multiple_dates"] = summarize_timings(time_call(
+        lambda: predictor.predict_multiple_dates(BENCH_COUNTY, BENCH_CLAIM_TYPE, BENCH_TARGET_DATE, 30), repeat))
+    results["get_seasonal_insights"] = summarize_timings(time_call(
+        lambda: predictor.get_seasonal_insights(BENCH_COUNTY, BENCH_CLAIM_TYPE), repeat))
+    results["get_county_summary"] = summarize_timings(time_call(
+        lambda: predictor.get_county_summary(BENCH_COUNTY), repeat))
+
+    print("Timing render_chart (one renderer process)...")
+    insights = predictor.get_seasonal_insights(BENCH_COUNTY, BENCH_CLAIM_TYPE)
+    predictions = predictor.predict_multiple_dates(BENCH_COUNTY, BENCH_CLAIM_TYPE, BENCH_TARGET_DATE, 7)
+    summary = predictor.get_county_summary(BENCH_COUNTY)
+    cost_data = {claim_type: stats["total_cost_mean"] for claim_type, stats in summary.items()}
+    chart_repeat = max(1, repeat // 10)
+    chart_cases = {
+        "seasonal_trends": (insights["monthly_patterns"]["claim_count"], "Seasonal Trends", BENCH_COUNTY, BENCH_CLAIM_TYPE),
+        "prediction_timeline": (predictions, "Prediction Timeline"),
+        "cost_comparison": (cost_data, "Cost Comparison"),
+    }
+    for chart_type, args in chart_cases.items():
+        data, title = args[0], args[1]
+        extra = args[2:]
+        results[f"render_chart[{chart_type}]"] = summarize_timings(time_call(
+            lambda: charts.render_chart(chart_type, data, title, *extra), chart_repeat))
+
+    return results, predictor
+
+
+# Modules whose cold import time is profiled (each in a fresh interpreter)
+IMPORT_MODULES = ("main", "ml_models")
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from `python -X importtime` output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def profile_imports(modules=IMPORT_MODULES, repeat=3, top=10):
+    """Cold import wall time of each module and its slowest transitive imports
+
+    Returns (timings, profiles): timings are summarize_timings() entries keyed
+    "import[module]"; profiles list the `top` heaviest imports of the last run.
+    """
+    timings, profiles = {}, {}
+    for module in modules:
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                    capture_output=True, text=True, check=True)
+            durations.append(time.perf_counter() - start)
+        cumulative = parse_importtime(result.stderr)
+        timings[f"import[{module}]"] = summarize_timings(durations)
+        profiles[module] = [
+            {"module": name, "cumulative_ms": round(us / 1000, 2)}
+            for name, us in sorted(cumulative.items(), key=lambda item: -item[1])
+            if name != module
+        ][:top]
+    return timings, profiles
+
+
+def get_endpoint_scenarios():
+    """Request definitions for each benchmarked endpoint, keyed by name"""
+    return {
+        "GET /counties": ("GET", "/counties", None),
+        "GET /claim-types": ("GET", "/claim-types", None),
+        "POST /predict": ("POST", "/predict",
+                          {"county": BENCH_COUNTY, "claim_type": BENCH_CLAIM_TYPE, "target_date": BENCH_TARGET_DATE}),
+        "GET /predict-range": ("GET", f"/predict-range/{BENCH_COUNTY}/{BENCH_CLAIM_TYPE}?days=30", None),
+        "GET /summary": ("GET", f"/summary/{BENCH_COUNTY}", None),
+        "GET /insights": ("GET", f"/insights/{BENCH_COUNTY}/{BENCH_CLAIM_TYPE}", None),
+        "POST /chat": ("POST", "/chat",
+                       {"message": f"Predict {BENCH_CLAIM_TYPE} claims for {BENCH_COUNTY} County next week"}),
+    }
+
+
+def benchmark_endpoints(predictor, requests_per_endpoint, concurrency):
+    """Drive the FastAPI app in-process and measure per-endpoint latency and throughput"""
+    # Reuse the trained predictor and stay offline with the fake Groq client
+    scenarios = get_endpoint_scenarios()
+    quota = requests_per_endpoint * len(scenarios)
+    app = setup_app(None, FakeGroqClient(), predictor=predictor, llm_quota=quota)
+    print(f"LLM quota sized to the run ({quota} calls): every /chat takes the LLM path")
+    print("Benchmarking endpoints...")
+    results = asyncio.run(run_load_test(app, list(scenarios), requests_per_endpoint, concurrency, scenarios))
+
+    for name, stats in results.items():
+        if stats["errors"]:
+            raise RuntimeError(f"{name} returned {stats['errors']} non-200 responses")
+    return results
+
+
+def get_git_commit():
+    """Return the current git commit hash, if available"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def run_benchmarks(args):
+    """Run the full benchmark suite and write the JSON results"""
+    counties = args.counties.split(",") if args.counties else None
+    csv_path = get_dataset(args.years, args.seed, counties)
+
+    print("Profiling cold imports...")
+    import_results, import_profiles = profile_imports(repeat=args.import_repeat)
+    function_results, predictor = benchmark_functions(csv_path, args.repeat, args.train_repeat)
+    function_results.update(import_results)
+    endpoint_results = benchmark_endpoints(predictor, args.requests, args.concurrency)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "dataset": csv_path,
+            "rows": len(predictor.data),
+            "years": args.years,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "requests_per_endpoint": args.requests,
+        },
+        "functions": function_results,
+        "endpoints": endpoint_results,
+        "import_profile": import_profiles,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(BENCH_RESULTS_DIR, exist_ok=True)
+        commit = results["meta"]["git_commit"] or "nogit"
+        output = os.path.join(BENCH_RESULTS_DIR, f"bench_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_results(results)
+    print(f"\nResults written to {output}")
+    return results
+
+
+def print_results(results):
+    """Print a compact table of benchmark results"""
+    print("\n" + "=" * 72)
+    print(f"{'Function':<40}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>12}")
+    print("-" * 72)
+    for name, stats in results["functions"].items():
+        print(f"{name:<40}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['mean_ms']:>12.2f}")
+
+    for module, heaviest in results.get("import_profile", {}).items():
+        print(f"\nSlowest imports under {module}:")
+        for entry in heaviest[:5]:
+            print(f"  {entry['module']:<38}{entry['cumulative_ms']:>10.2f} ms")
+
+    print("\n" + f"{'Endpoint':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>12}")
+    print("-" * 72)
+    for name, stats in results["endpoints"].items():
+        print(f"{name:<24}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['throughput_rps']:>12.2f}")
+
+
+def compare_results(baseline_path, current_path, threshold):
+    """Compare two result files; returns False if any p50 regressed beyond threshold"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    print(f"Baseline: {baseline['meta'].get('git_commit')}  Current: {current['meta'].get('git_commit')}")
+    print(f"{'Benchmark':<44}{'base p50':>10}{'new p50':>10}{'ratio':>8}")
+    print("-" * 72)
+
+    ok = True
+    for section in ("functions", "endpoints"):
+        for name, stats in current.get(section, {}).items():
+            base_stats = baseline.get(section, {}).get(name)
+            if not base_stats:
+                print(f"{name:<44}{'-':>10}{stats['p50_ms']:>10.2f}{'new':>8}")
+                continue
+            ratio = stats["p50_ms"] / base_stats["p50_ms"] if base_stats["p50_ms"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(f"{name:<44}{base_stats['p50_ms']:>10.2f}{stats['p50_ms']:>10.2f}{ratio:>8.2f}{flag}")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kansas Claims Predictor benchmark suite")
+    parser.add_argument("--years", type=int, default=1, help="Years of synthetic data to generate")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic dataset")
+    parser.add_argument("--counties", help="Comma-separated subset of counties (default: all)")
+    parser.add_argument("--repeat", type=int, default=50, help="Repetitions for per-call benchmarks")
+    parser.add_argument("--train-repeat", type=int, default=1, help="Repetitions for load/train benchmarks")
+    parser.add_argument("--import-repeat", type=int, default=3, help="Fresh-interpreter runs per import profile")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent in-flight requests")
+    parser.add_argument("--output", help="Output JSON path (default: bench_results/bench_<commit>_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed p50 slowdown ratio before --compare reports a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare_results(args.compare[0], args.compare[1], args.threshold)
+
+    run_benchmarks(args)
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,202 @@
+"""
+Chart rendering in a pool of warm matplotlib worker processes
+The API process never imports matplotlib: chart specs (chart type, data,
+title) go over the process pool's queue to worker processes that imported
+matplotlib and rendered a throwaway figure at startup, and PNG bytes come
+back. Rendering no longer holds the API process's GIL, and throughput scales
+with CHART_WORKERS. With CHART_WORKERS=0 charts render in a thread of the
+API process instead (matplotlib is then imported on first use).
+
+chart_spec() describes the same charts as data (labels and series) for the
+frontend to draw; that is what /chat returns unless a PNG is asked for.
+
+Environment:
+  CHART_WORKERS  renderer processes (default: min(2, CPU count); 0 renders in-process)
+"""
+
+import asyncio
+import calendar
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from logging_config import get_logger
+
+logger = get_logger("charts")
+
+CHART_TYPES = ("seasonal_trends", "cost_comparison", "prediction_timeline")
+
+_STYLE = {
+    'figure.facecolor': 'white',
+    'axes.facecolor': 'white',
+    'axes.edgecolor': 'gray',
+    'axes.linewidth': 0.8,
+    'grid.alpha': 0.3,
+}
+
+
+def chart_spec(chart_type, data, title, county=None, claim_type=None):
+    """Structured chart for client-side drawing: same inputs as render_chart, no rendering
+
+    {"chart_type", "kind": "line"|"bar", "title", "x_label", "y_label", "labels",
+     "series": [{"name", "data"}]}; prediction timelines add a "band" with the
+    interval bounds when the predictions carry them.
+    """
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type '{chart_type}'")
+
+    spec = {"chart_type": chart_type, "title": title}
+    if chart_type == 'seasonal_trends':
+        months = list(data.keys())
+        spec.update(kind="line", x_label="Month", y_label="Claims Count",
+                    labels=[calendar.month_abbr[int(month)] for month in months],
+                    series=[{"name": f'{(claim_type or "claims").replace("_", " ").title()} Claims',
+                             "data": [round(float(data[month]), 2) for month in months]}])
+    elif chart_type == 'cost_comparison':
+        spec.update(kind="bar", x_label="", y_label="Cost ($)", labels=[str(label) for label in data],
+                    series=[{"name": "Cost ($)", "data": [round(float(value), 2) for value in data.values()]}])
+    else:
+        spec.update(kind="line", x_label="Date", y_label="Predicted Claims",
+                    labels=[item['date'] for item in data],
+                    series=[{"name": "Predicted Claims", "data": [item['predicted_count'] for item in data]}])
+        # Predictions without intervals carry None bounds; no band for those
+        if data and all(item.get('predicted_count_lower') is not None for item in data):
+            spec["band"] = {"lower": [item['predicted_count_lower'] for item in data],
+                            "upper": [item['predicted_count_upper'] for item in data]}
+    return spec
+
+
+def _warm_worker():
+    """Process-pool initializer: import matplotlib and render once so font caches are loaded"""
+    render_chart('cost_comparison', {'a': 1.0}, 'warm-up')
+
+
+def render_chart(chart_type, data, title, county=None, claim_type=None):
+    """PNG bytes for a chart spec; runs in a renderer process"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.dates import DateFormatter
+    from matplotlib.figure import Figure
+
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type '{chart_type}'")
+
+    # The object API (no pyplot) keeps no global figure state, so concurrent renders are safe
+    with matplotlib.rc_context(_STYLE):
+        fig = Figure(figsize=(6, 3.5))
+        ax = fig.subplots()
+
+        if chart_type == 'seasonal_trends':
+            # Monthly trends chart
+            months = list(data.keys())
+            values = list(data.values())
+
+            ax.plot(months, values, marker='o', linewidth=3, markersize=8,
+                    color='#1976d2', label=f'{(claim_type or "claims").replace("_", " ").title()} Claims')
+            ax.set_title(f'{title}', fontsize=16, fontweight='bold', pad=20)
+            ax.set_xlabel('Month', fontsize=12)
+            ax.set_ylabel('Claims Count', fontsize=12)
+            ax.grid(True, alpha=0.3)
+            ax.legend(loc='upper right', fontsize=11)
+
+            # Add value labels on points
+            for i, v in enumerate(values):
+                ax.annotate(f'{v:,.0f}', (months[i], v), textcoords="offset points",
+                            xytext=(0, 10), ha='center', fontsize=9)
+
+        elif chart_type == 'cost_comparison':
+            # Bar chart for cost comparison
+            categories = list(data.keys())
+            values = list(data.values())
+            colors = ['#1976d2', '#42a5f5', '#90caf9', '#64b5f6', '#2196f3']
+
+            bars = ax.bar(categories, values, color=colors[:len(categories)])
+            ax.set_title(f'{title}', fontsize=16, fontweight='bold', pad=20)
+            ax.set_ylabel('Cost ($)', fontsize=12)
+
+            # Add value labels on bars
+            for bar in bars:
+                height = bar.get_height()
+                ax.text(bar.get_x() + bar.get_width() / 2., height,
+                        f'${height:,.0f}', ha='center', va='bottom', fontsize=10)
+
+            # Add legend
+            ax.legend(bars, categories, loc='upper right', fontsize=11)
+
+        else:
+            # Timeline prediction chart
+            dates = [datetime.strptime(item['date'], '%Y-%m-%d') for item in data]
+            counts = [item['predicted_count'] for item in data]
+
+            ax.plot(dates, counts, marker='o', linewidth=3, markersize=8,
+                    color='#1976d2', label='Predicted Claims')
+            ax.set_title(f'{title}', fontsize=16, fontweight='bold', pad=20)
+            ax.set_xlabel('Date', fontsize=12)
+            ax.set_ylabel('Predicted Claims', fontsize=12)
+            ax.grid(True, alpha=0.3)
+            ax.legend(loc='upper right', fontsize=11)
+
+            # Add value labels on points
+            for i, (date, count) in enumerate(zip(dates, counts)):
+                if i % 2 == 0:  # Show every other label to avoid crowding
+                    ax.annotate(f'{count:,.0f}', (date, count), textcoords="offset points",
+                                xytext=(0, 10), ha='center', fontsize=9)
+
+            # Format x-axis dates
+            ax.xaxis.set_major_formatter(DateFormatter('%m/%d'))
+            ax.tick_params(axis='x', labelrotation=45)
+
+        # Add source attribution
+        fig.text(0.99, 0.01, 'Kansas Claims Predictor', ha='right', va='bottom',
+                 fontsize=8, alpha=0.7, style='italic')
+
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        return buffer.getvalue()
+
+
+class ChartRenderer:
+    """Async front end to the renderer processes; the pool is created by the first render"""
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(os.getenv("CHART_WORKERS", str(min(2, os.cpu_count() or 1))))
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None and self.workers > 0:
+                # spawn: workers start from a clean interpreter instead of a copy of the API process
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_warm_worker)
+            return self._pool
+
+    async def render(self, chart_type, data, title, county=None, claim_type=None):
+        """PNG bytes for the chart, or None if rendering failed"""
+        pool = self._get_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, render_chart, chart_type, data, title, county, claim_type)
+        except BrokenProcessPool:
+            logger.warning("Chart renderer pool broke; restarting it")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            return None
+        except Exception as e:
+            logger.warning("Error generating chart: %s", e)
+            return None
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
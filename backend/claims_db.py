@@ -0,0 +1,317 @@
+"""
+SQLite claims store with indexed series lookups and prebuilt rollup tables
+The claims CSV is streamed once into an on-disk SQLite database: one row per
+(county, claim type, day), indexed on (county_id, claim_type_id, date), plus
+rollup tables summed by month, by weekday and per series. Workers open the
+file read-only and share it through the OS page cache; a history window is an
+index range scan, and summaries, seasonal insights and the aggregate cube are
+read from the rollup tables instead of the raw rows, so memory stays bounded
+whatever the size of the history.
+
+Usage:
+    python claims_db.py ../data/kansas_claims_10years.csv ../models/claims.sqlite
+
+Environment:
+  CLAIMS_DB   database file to serve from (built from CLAIMS_DATA_PATH if missing or stale)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from history import RESAMPLE_RULES, resample_series
+from shared_store import MEASURES, MIN_INSIGHT_ROWS, SUMMARY_COLUMNS, file_fingerprint, store_lock
+
+DB_FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE counties (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, area_type TEXT, metro TEXT);
+CREATE TABLE claim_types (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE claims (
+    county_id INTEGER NOT NULL,
+    claim_type_id INTEGER NOT NULL,
+    date INTEGER NOT NULL,  -- days since 1970-01-01
+    claim_count INTEGER NOT NULL,
+    total_cost REAL NOT NULL
+);
+"""
+
+# Built after the bulk load, which is much faster than maintaining them row by row
+_INDEXES_AND_ROLLUPS = """
+CREATE INDEX claims_series_date ON claims (county_id, claim_type_id, date);
+CREATE TABLE monthly_rollup AS
+    SELECT county_id, claim_type_id,
+           CAST(strftime('%Y', date * 86400, 'unixepoch') AS INTEGER) AS year,
+           CAST(strftime('%m', date * 86400, 'unixepoch') AS INTEGER) AS month,
+           COUNT(*) AS rows, SUM(claim_count) AS claim_count, SUM(total_cost) AS total_cost
+    FROM claims GROUP BY county_id, claim_type_id, year, month;
+CREATE TABLE weekday_rollup AS
+    SELECT county_id, claim_type_id, (date + 3) % 7 AS weekday,
+           COUNT(*) AS rows, SUM(claim_count) AS claim_count, SUM(total_cost) AS total_cost
+    FROM claims GROUP BY county_id, claim_type_id, weekday;
+CREATE TABLE series_summary AS
+    SELECT c.county_id, c.claim_type_id, COUNT(*) AS rows,
+           SUM(c.claim_count) AS claim_count_sum, m.claim_count_mean,
+           SUM((c.claim_count - m.claim_count_mean) * (c.claim_count - m.claim_count_mean)) AS claim_count_ss,
+           SUM(c.total_cost) AS total_cost_sum, m.total_cost_mean,
+           SUM((c.total_cost - m.total_cost_mean) * (c.total_cost - m.total_cost_mean)) AS total_cost_ss
+    FROM claims c JOIN (
+        SELECT county_id, claim_type_id, AVG(claim_count) AS claim_count_mean, AVG(total_cost) AS total_cost_mean
+        FROM claims GROUP BY county_id, claim_type_id
+    ) m USING (county_id, claim_type_id)
+    GROUP BY c.county_id, c.claim_type_id;
+CREATE UNIQUE INDEX monthly_rollup_series ON monthly_rollup (county_id, claim_type_id, year, month);
+CREATE UNIQUE INDEX weekday_rollup_series ON weekday_rollup (county_id, claim_type_id, weekday);
+CREATE UNIQUE INDEX series_summary_series ON series_summary (county_id, claim_type_id);
+"""
+
+
+def build_claims_db(paths, db_path, chunk_size=500_000):
+    """Stream one or more CSV files into a new database at db_path; returns its version"""
+    import pandas as pd
+
+    source_path = paths
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    tmp_path = f"{db_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    connection = sqlite3.connect(tmp_path, isolation_level=None)
+    # Nothing reads the file until it is renamed into place, so skip durability while loading
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executescript(_SCHEMA)
+
+    county_ids, type_ids = {}, {}
+    n_rows = 0
+    connection.execute("BEGIN")
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            attributes = [name for name in ('area_type', 'metro') if name in chunk.columns]
+            for row in chunk.drop_duplicates('county')[['county'] + attributes].itertuples(index=False):
+                if row.county not in county_ids:
+                    county_ids[row.county] = len(county_ids)
+                    values = {name: getattr(row, name) for name in attributes}
+                    connection.execute(
+                        "INSERT INTO counties (id, name, area_type, metro) VALUES (?, ?, ?, ?)",
+                        (county_ids[row.county], row.county,
+                         *(None if pd.isna(values.get(name)) else str(values[name]) for name in ('area_type', 'metro'))))
+            for claim_type in chunk['claim_type'].unique():
+                if claim_type not in type_ids:
+                    type_ids[claim_type] = len(type_ids)
+                    connection.execute("INSERT INTO claim_types (id, name) VALUES (?, ?)",
+                                       (type_ids[claim_type], claim_type))
+            days = pd.to_datetime(chunk['date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+            connection.executemany(
+                "INSERT INTO claims VALUES (?, ?, ?, ?, ?)",
+                zip(chunk['county'].map(county_ids).tolist(), chunk['claim_type'].map(type_ids).tolist(),
+                    days.tolist(), chunk['claim_count'].astype(np.int64).tolist(),
+                    chunk['total_cost'].astype(np.float64).tolist()))
+            n_rows += len(chunk)
+    connection.execute("COMMIT")
+    connection.executescript(_INDEXES_AND_ROLLUPS)
+
+    source = file_fingerprint(source_path)
+    version = hashlib.sha1(json.dumps([source, n_rows, time.time()]).encode()).hexdigest()[:16]
+    meta = {"format_version": DB_FORMAT_VERSION, "version": version, "created": time.time(),
+            "source": source, "n_rows": n_rows}
+    connection.executemany("INSERT INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+    connection.execute("ANALYZE")
+    connection.close()
+
+    # Readers holding the old file keep their (unlinked) inode
+    os.replace(tmp_path, db_path)
+    return version
+
+
+def read_meta(db_path):
+    """meta table of a database as a dict, or None if it is missing or unreadable"""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return None
+
+
+def is_db_current(db_path, source_path=None):
+    """True if db_path holds a complete database built from the given source files"""
+    meta = read_meta(db_path)
+    if not meta or meta.get("format_version") != DB_FORMAT_VERSION:
+        return False
+    return not source_path or meta.get("source") == file_fingerprint(source_path)
+
+
+def ensure_claims_db(db_path, source_path, chunk_size=500_000):
+    """Build db_path from source_path unless it is current; one process builds, the rest wait
+
+    Returns True if this process built the database.
+    """
+    if is_db_current(db_path, source_path):
+        return False
+    with store_lock(db_path):
+        if is_db_current(db_path, source_path):
+            return False
+        build_claims_db(source_path, db_path, chunk_size)
+        return True
+
+
+class ClaimsDatabase:
+    """Read-only queries against a database written by build_claims_db"""
+
+    def __init__(self, db_path):
+        self.path = db_path
+        self._local = threading.local()
+        self.meta = read_meta(db_path)
+        if not self.meta or self.meta.get("format_version") != DB_FORMAT_VERSION:
+            raise ValueError(f"Unsupported or incomplete claims database {db_path}")
+        self.version = self.meta["version"]
+
+        connection = self._connection()
+        county_rows = connection.execute("SELECT id, name, area_type, metro FROM counties ORDER BY name").fetchall()
+        type_rows = connection.execute("SELECT id, name FROM claim_types ORDER BY name").fetchall()
+        self.counties = [name for _, name, _, _ in county_rows]
+        self.claim_types = [name for _, name in type_rows]
+        self.county_attributes = {'area_type': [row[2] for row in county_rows],
+                                  'metro': [row[3] for row in county_rows]}
+        self._county_ids = {name: county_id for county_id, name, _, _ in county_rows}
+        self._type_ids = {name: type_id for type_id, name in type_rows}
+        # Database ids to positions in the sorted vocabularies
+        self._county_codes = np.full(len(county_rows), -1)
+        self._county_codes[[row[0] for row in county_rows]] = np.arange(len(county_rows))
+        self._type_codes = np.full(len(type_rows), -1)
+        self._type_codes[[row[0] for row in type_rows]] = np.arange(len(type_rows))
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads; each gets its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return connection
+
+    def _series_ids(self, county, claim_type):
+        county_id, type_id = self._county_ids.get(county), self._type_ids.get(claim_type)
+        return None if county_id is None or type_id is None else (county_id, type_id)
+
+    def has_series(self, county, claim_type):
+        return self._series_ids(county, claim_type) is not None
+
+    def series(self, county, claim_type, start=None, end=None):
+        """(dates, claim_counts, total_costs) of one series for start <= date <= end, date-sorted"""
+        ids = self._series_ids(county, claim_type)
+        if ids is None:
+            return None
+        low = np.datetime64(start, "D").astype(np.int64) if start is not None else np.iinfo(np.int64).min
+        high = np.datetime64(end, "D").astype(np.int64) if end is not None else np.iinfo(np.int64).max
+        rows = self._connection().execute(
+            "SELECT date, claim_count, total_cost FROM claims "
+            "WHERE county_id = ? AND claim_type_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (*ids, int(low), int(high))).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        return (table[:, 0].astype(np.int64).astype("datetime64[D]"), table[:, 1].astype(np.int64), table[:, 2])
+
+    def query(self, county, claim_type, start=None, end=None, resample="daily"):
+        """Same contract as HistoryIndex.query, answered by an index range scan"""
+        if resample not in RESAMPLE_RULES:
+            raise ValueError(f"Unknown resample '{resample}', expected one of {', '.join(RESAMPLE_RULES)}")
+        series = self.series(county, claim_type, start, end)
+        return None if series is None else resample_series(*series, resample)
+
+    def seasonal_insights(self, county, claim_type):
+        """Same structure as ClaimsPredictionModel.get_seasonal_insights, from the rollup tables"""
+        ids = self._series_ids(county, claim_type)
+        if ids is None:
+            return None
+        connection = self._connection()
+        total = connection.execute("SELECT rows FROM series_summary WHERE county_id = ? AND claim_type_id = ?",
+                                   ids).fetchone()
+        if not total or total[0] < MIN_INSIGHT_ROWS:
+            return None
+
+        def patterns(sql):
+            rows = connection.execute(sql, ids).fetchall()
+            return {measure: {key: round(sums[i] / n, 2) for key, n, *sums in rows}
+                    for i, measure in enumerate(MEASURES)}
+
+        return {
+            'monthly_patterns': patterns(
+                "SELECT month, SUM(rows), SUM(claim_count), SUM(total_cost) FROM monthly_rollup "
+                "WHERE county_id = ? AND claim_type_id = ? GROUP BY month ORDER BY month"),
+            'day_of_week_patterns': patterns(
+                "SELECT weekday, rows, claim_count, total_cost FROM weekday_rollup "
+                "WHERE county_id = ? AND claim_type_id = ? ORDER BY weekday"),
+        }
+
+    def county_summary(self, county):
+        """Same structure as ClaimsPredictionModel.get_county_summary, from series_summary"""
+        county_id = self._county_ids.get(county)
+        if county_id is None:
+            return {}
+        rows = self._connection().execute(
+            "SELECT t.name, s.rows, s.claim_count_sum, s.claim_count_mean, s.claim_count_ss, "
+            "s.total_cost_sum, s.total_cost_mean, s.total_cost_ss "
+            "FROM series_summary s JOIN claim_types t ON t.id = s.claim_type_id "
+            "WHERE s.county_id = ? ORDER BY t.name", (county_id,)).fetchall()
+        summary = {}
+        for claim_type, n, count_sum, count_mean, count_ss, cost_sum, cost_mean, cost_ss in rows:
+            std = lambda ss: round(float(np.sqrt(ss / (n - 1))), 2) if n > 1 else float('nan')
+            values = (int(count_sum), round(count_mean, 2), std(count_ss),
+                      round(cost_sum, 2), round(cost_mean, 2), std(cost_ss))
+            summary[claim_type] = dict(zip(SUMMARY_COLUMNS, values))
+        return summary
+
+    def rollup_rows(self):
+        """(columns, rows) of monthly_rollup coded like ClaimsPredictionModel.coded_columns"""
+        from rollup import rollup_columns
+        table = np.array(self._connection().execute(
+            "SELECT county_id, claim_type_id, year, month, rows, claim_count, total_cost FROM monthly_rollup"
+        ).fetchall(), dtype=np.float64).reshape(-1, 7)
+        table[:, 0] = self._county_codes[table[:, 0].astype(np.int64)]
+        table[:, 1] = self._type_codes[table[:, 1].astype(np.int64)]
+        return rollup_columns(table)
+
+    def iter_chunks(self, chunk_size=500_000):
+        """Yield every row as coded column chunks of at most chunk_size rows"""
+        cursor = self._connection().execute(
+            "SELECT county_id, claim_type_id, date, claim_count, total_cost FROM claims")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            table = np.array(rows, dtype=np.float64)
+            yield {
+                'date': table[:, 2].astype(np.int64).astype('datetime64[D]'),
+                'county': self._county_codes[table[:, 0].astype(np.int64)],
+                'claim_type': self._type_codes[table[:, 1].astype(np.int64)],
+                'claim_count': table[:, 3].astype(np.int64),
+                'total_cost': table[:, 4],
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite claims database from CSV files")
+    parser.add_argument("csv", nargs="+", help="claims CSV file(s)")
+    parser.add_argument("db", help="database file to write")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="CSV rows read at a time")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    version = build_claims_db(args.csv if len(args.csv) > 1 else args.csv[0], args.db, args.chunk_size)
+    print(f"Built {args.db} (version {version}) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Shared pytest fixtures: serve the API in-process against a seeded dataset"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from harness import TEST_COUNTIES, FakeGroqClient, get_dataset, setup_app
+from ml_models import ClaimsPredictionModel
+
+
+@pytest.fixture(scope="session")
+def dataset_path(tmp_path_factory):
+    """CSV path of a one-year seeded dataset for the test counties"""
+    data_dir = tmp_path_factory.mktemp("data")
+    return get_dataset(1, 42, TEST_COUNTIES, data_dir=str(data_dir))
+
+
+@pytest.fixture(scope="session")
+def predictor(dataset_path):
+    """Predictor with data loaded and all models trained"""
+    model = ClaimsPredictionModel()
+    model.load_data(dataset_path)
+    model.train_all_models()
+    return model
+
+
+@pytest.fixture(scope="session")
+def fake_groq():
+    """Local Groq stand-in shared by the whole session"""
+    return FakeGroqClient()
+
+
+@pytest.fixture(scope="session")
+def client(predictor, fake_groq):
+    """TestClient bound to main.app serving the session predictor"""
+    app = setup_app(None, fake_groq, predictor=predictor)
+    return TestClient(app)
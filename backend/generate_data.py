@@ -3,8 +3,15 @@ import numpy as np
 from datetime import datetime, timedelta
 import random
 
-def generate_kansas_claims_data(years=10):
-    """Generate realistic Kansas health claims data"""
+def generate_kansas_claims_data(years=10, seed=None, end_date=None, counties=None):
+    """Generate realistic Kansas health claims data
+
+    Pass a seed and a fixed end_date for a reproducible dataset, and a list of
+    county names to restrict generation to a subset of counties.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
     
     # All 105 Kansas counties with populations
     kansas_counties = {
@@ -125,8 +132,11 @@ def generate_kansas_claims_data(years=10):
         'preventive': 1.2
     }
     
-    start_date = datetime.now() - timedelta(days=365*years)
-    end_date = datetime.now()
+    if counties is not None:
+        kansas_counties = {name: info for name, info in kansas_counties.items() if name in counties}
+    
+    end_date = pd.to_datetime(end_date) if end_date is not None else datetime.now()
+    start_date = end_date - timedelta(days=365*years)
     
     data = []
     
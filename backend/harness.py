@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+In-process test and load harness for Kansas Claims Predictor API
+Mounts main.app directly over an ASGI transport with a seeded dataset and a
+local fake Groq client, so tests and load runs need no server or network.
+
+Usage:
+  python harness.py                                   # /predict, /predict-range, /chat
+  python harness.py --concurrency 16 --requests 500
+  python harness.py --endpoints chat --groq-latency 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from generate_data import generate_kansas_claims_data
+from llm_client import LLMClient
+from ml_models import ClaimsPredictionModel
+from rate_limit import DailyQuota
+
+BENCH_DATA_DIR = "bench_data"
+
+# Fixed end date so a given seed always produces the same dataset
+BENCH_END_DATE = "2024-12-31"
+
+# Counties referenced by the API test suite
+TEST_COUNTIES = ["Johnson", "Sedgwick", "Shawnee", "Wyandotte", "Douglas", "Ford", "Finney"]
+
+
+def get_dataset(years, seed, counties=None, data_dir=BENCH_DATA_DIR):
+    """Generate (or reuse) a seeded synthetic dataset and return its CSV path"""
+    os.makedirs(data_dir, exist_ok=True)
+    suffix = f"_{len(counties)}counties" if counties else ""
+    csv_path = os.path.join(data_dir, f"kansas_claims_{years}y_seed{seed}{suffix}.csv")
+
+    if not os.path.exists(csv_path):
+        print(f"Generating synthetic dataset: {csv_path}")
+        df = generate_kansas_claims_data(years, seed=seed, end_date=BENCH_END_DATE, counties=counties)
+        df.to_csv(csv_path, index=False)
+
+    return csv_path
+
+
+def summarize_timings(durations):
+    """Summarize a list of durations (seconds) as millisecond statistics"""
+    ms = np.asarray(durations) * 1000
+    return {
+        "runs": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class FakeGroqClient:
+    """Local stand-in for groq.AsyncGroq that answers chat completions without network I/O
+
+    The first `failures` calls raise ConnectionError, to exercise retries and the breaker.
+    """
+
+    def __init__(self, reply=None, latency=0.0, failures=0):
+        self.reply = reply or "## Claims Prediction\n\n**Predicted Volume:** see the data provided."
+        self.latency = latency
+        self.failures = failures
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, messages, model, **kwargs):
+        self.calls.append({"messages": messages, "model": model, **kwargs})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("simulated upstream failure")
+        message = SimpleNamespace(role="assistant", content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def setup_app(csv_path, groq_client=None, predictor=None, llm_quota=None):
+    """Load and train a predictor for csv_path and install it into main; returns the app
+
+    llm_quota is the daily LLM call limit (MAX_DAILY_GROQ_REQUESTS by default). Load runs
+    size it to their request count, or /chat past the limit measures the local fallback.
+    """
+    import main
+
+    if predictor is None:
+        predictor = ClaimsPredictionModel()
+        predictor.load_data(csv_path)
+        predictor.train_all_models()
+
+    main.predictor = predictor
+    groq_client = groq_client if groq_client is not None else FakeGroqClient()
+    main.groq_client = groq_client if isinstance(groq_client, LLMClient) else LLMClient(groq_client)
+    main.llm_quota = DailyQuota(":memory:", llm_quota if llm_quota is not None else main.MAX_DAILY_GROQ_REQUESTS)
+    return main.app
+
+
+def get_scenarios(county="Johnson", claim_type="emergency", days=30):
+    """Request definitions for the load-test endpoints"""
+    return {
+        "predict": ("POST", "/predict",
+                    {"county": county, "claim_type": claim_type, "target_date": "2025-01-15"}),
+        "predict-range": ("GET", f"/predict-range/{county}/{claim_type}?days={days}", None),
+        "chat": ("POST", "/chat",
+                 {"message": f"Predict {claim_type} claims for {county} County next week"}),
+    }
+
+
+async def run_load_test(app, endpoints, requests_per_endpoint=100, concurrency=8, scenarios=None):
+    """Send concurrent requests to each endpoint in-process and measure latency and throughput"""
+    import httpx
+
+    scenarios = scenarios or get_scenarios()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://harness") as client:
+        for endpoint in endpoints:
+            method, path, body = scenarios[endpoint]
+            semaphore = asyncio.Semaphore(concurrency)
+            errors = []
+
+            async def send():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.request(method, path, json=body)
+                    elapsed = time.perf_counter() - start
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+                    return elapsed
+
+            # Warm up once so lazy initialisation is not counted
+            await client.request(method, path, json=body)
+
+            wall_start = time.perf_counter()
+            durations = await asyncio.gather(*[send() for _ in range(requests_per_endpoint)])
+            wall_time = time.perf_counter() - wall_start
+
+            stats = summarize_timings(durations)
+            stats["concurrency"] = concurrency
+            stats["errors"] = len(errors)
+            stats["throughput_rps"] = round(requests_per_endpoint / wall_time, 2)
+            results[endpoint] = stats
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load test for the Kansas Claims Predictor API")
+    parser.add_argument("--endpoints", default="predict,predict-range,chat",
+                        help="Comma-separated endpoints: predict, predict-range, chat")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent in-flight requests")
+    parser.add_argument("--years", type=int, default=1, help="Years of synthetic data to generate")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic dataset")
+    parser.add_argument("--all-counties", action="store_true", help="Use every county instead of the test subset")
+    parser.add_argument("--groq-latency", type=float, default=0.0, help="Simulated Groq latency in seconds")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(get_scenarios())
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    counties = None if args.all_counties else TEST_COUNTIES
+    csv_path = get_dataset(args.years, args.seed, counties)
+    print("Training models...")
+    quota = args.requests * len(endpoints)
+    app = setup_app(csv_path, FakeGroqClient(latency=args.groq_latency), llm_quota=quota)
+    print(f"LLM quota sized to the run ({quota} calls): every /chat takes the LLM path")
+
+    results = asyncio.run(run_load_test(app, endpoints, args.requests, args.concurrency))
+
+    print(f"\n{'Endpoint':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    print("-" * 68)
+    for name, stats in results.items():
+        print(f"{name:<20}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+              f"{stats['throughput_rps']:>10.2f}{stats['errors']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    return all(stats["errors"] == 0 for stats in results.values())
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
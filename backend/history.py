@@ -0,0 +1,76 @@
+"""
+Date-indexed historical actuals for the /history endpoint
+Rows are held as per-series arrays sorted by date (the shared store layout),
+so a date window is two binary searches and a slice, and resampling to weeks
+or months is a single reduceat over the slice.
+"""
+
+import numpy as np
+
+RESAMPLE_RULES = ("daily", "weekly", "monthly")
+
+
+class HistoryIndex:
+    """Per-series date-sorted claim counts and costs with range lookup"""
+
+    def __init__(self, counties, claim_types, dates, claim_counts, total_costs, offsets):
+        """Arrays are sorted by (series, date); rows of series i are [offsets[i], offsets[i + 1])"""
+        self.claim_types = list(claim_types)
+        self._county_index = {county: i for i, county in enumerate(counties)}
+        self._type_index = {claim_type: j for j, claim_type in enumerate(self.claim_types)}
+        self.dates = dates
+        self.claim_counts = claim_counts
+        self.total_costs = total_costs
+        self.offsets = offsets
+
+    @classmethod
+    def from_columns(cls, counties, claim_types, columns):
+        """Sort integer-coded columns (see ClaimsPredictionModel.coded_columns) into an index"""
+        series = np.asarray(columns["county"], dtype=np.int64) * len(claim_types) + np.asarray(columns["claim_type"])
+        dates = np.asarray(columns["date"]).astype("datetime64[D]")
+        order = np.lexsort((dates, series))
+        offsets = np.zeros(len(counties) * len(claim_types) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(series, minlength=len(offsets) - 1), out=offsets[1:])
+        return cls(counties, claim_types, dates[order],
+                   np.asarray(columns["claim_count"])[order], np.asarray(columns["total_cost"])[order], offsets)
+
+    def has_series(self, county, claim_type):
+        return county in self._county_index and claim_type in self._type_index
+
+    def query(self, county, claim_type, start=None, end=None, resample="daily"):
+        """(dates, claim_counts, total_costs, rows) for start <= date <= end, summed per period
+
+        Weekly periods start on Monday and monthly periods on the 1st; dates label
+        the start of each period. Returns None for an unknown series.
+        """
+        if resample not in RESAMPLE_RULES:
+            raise ValueError(f"Unknown resample '{resample}', expected one of {', '.join(RESAMPLE_RULES)}")
+        if not self.has_series(county, claim_type):
+            return None
+
+        series = self._county_index[county] * len(self.claim_types) + self._type_index[claim_type]
+        lo, hi = int(self.offsets[series]), int(self.offsets[series + 1])
+        dates = self.dates[lo:hi]
+        if start is not None:
+            lo += int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        if end is not None:
+            hi = int(self.offsets[series]) + int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        hi = max(lo, hi)
+
+        return resample_series(np.asarray(self.dates[lo:hi]), np.asarray(self.claim_counts[lo:hi], dtype=np.int64),
+                               np.asarray(self.total_costs[lo:hi], dtype=np.float64), resample)
+
+
+def resample_series(dates, counts, costs, resample="daily"):
+    """(dates, claim_counts, total_costs, rows) of date-sorted daily arrays summed per period"""
+    if resample == "daily" or len(dates) == 0:
+        return dates, counts, costs, np.ones(len(dates), dtype=np.int64)
+
+    if resample == "weekly":
+        periods = dates - (dates.astype(np.int64) + 3) % 7  # back to Monday; 1970-01-01 was a Thursday
+    else:
+        periods = dates.astype("datetime64[M]").astype("datetime64[D]")
+    # Dates are sorted, so each period is a contiguous run
+    starts = np.flatnonzero(np.concatenate([[True], periods[1:] != periods[:-1]]))
+    rows = np.diff(np.append(starts, len(dates)))
+    return periods[starts], np.add.reduceat(counts, starts), np.add.reduceat(costs, starts), rows
@@ -0,0 +1,50 @@
+"""
+Precomputed regression forecasts over a rolling horizon
+Once a day every series' regression forecast for the next HORIZON days is
+computed into dense (series, day, target) arrays. Predictions for dates inside
+the table are then array slices instead of feature building and model calls.
+A new table is built off the request path and swapped in whole, so requests
+keep using the previous table (or the models directly) until it is ready.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+def seconds_until_midnight(now=None):
+    """Seconds until the next local midnight"""
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+class ForecastHorizon:
+    """Regression predictions and interval half-widths for days [start, start + days)"""
+
+    def __init__(self, start, series_keys, predictions, half_widths, version=None):
+        """predictions/half_widths are (len(series_keys), days, 2); half-widths are NaN for models without intervals"""
+        self.start = np.datetime64(start, "D")
+        self.days = predictions.shape[1]
+        self.predictions = predictions
+        self.half_widths = half_widths
+        self.version = version
+        self.built_at = datetime.now()
+        self._series_index = {key: i for i, key in enumerate(series_keys)}
+
+    def __contains__(self, model_key):
+        return model_key in self._series_index
+
+    def covers(self, dates):
+        """True if every date falls inside the table"""
+        offsets = np.asarray(dates, dtype="datetime64[D]") - self.start
+        return bool(len(offsets)) and offsets.min().astype(int) >= 0 and offsets.max().astype(int) < self.days
+
+    def lookup(self, model_key, dates):
+        """(predictions, half_widths or None) like _predict_regression, or None if not fully covered"""
+        series = self._series_index.get(model_key)
+        if series is None or not self.covers(dates):
+            return None
+        offsets = (np.asarray(dates, dtype="datetime64[D]") - self.start).astype(int)
+        half_widths = self.half_widths[series, offsets]
+        return self.predictions[series, offsets], (None if np.isnan(half_widths).any() else half_widths)
@@ -0,0 +1,192 @@
+"""
+Conditional GET and response compression for the Kansas Claims Predictor API
+Read endpoints whose output only changes with the data or models get a weak
+ETag built from the predictor's data version and the request's path and query.
+A request whose If-None-Match already holds that tag is answered 304 before
+the route runs, so repeat page loads skip the lookup and serialization
+entirely; since the tag is only handed out with a 200 for that exact URL, a
+304 never stands in for a 404 or a validation error. Responses are
+compressed with brotli (when the optional `brotli` package is installed) or
+gzip, negotiated from Accept-Encoding; streamed responses are compressed
+chunk by chunk and flushed so NDJSON consumers still see rows as they come.
+
+Environment:
+  COMPRESSION_MIN_SIZE  smallest body in bytes worth compressing (default 1024)
+  COMPRESSION_LEVEL     gzip level 1-9; brotli uses a matching quality (default 6)
+"""
+
+import hashlib
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Body types worth compressing; images (PNG) and archives are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _etag_matches(if_none_match, etag):
+    """RFC 9110 weak comparison against an If-None-Match header
+
+    `*` is not honoured: it would answer 304 for URLs the route would reject.
+    """
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == bare for tag in tags)
+
+
+class ConditionalGetMiddleware:
+    """ETag / If-None-Match handling for GET routes that depend only on the data version
+
+    `version` is called with the request scope and returns the version of the
+    response it would produce, or None while nothing is loaded (the request then
+    passes through untagged). The tag also covers the path and query string.
+    """
+
+    def __init__(self, app, version, paths=()):
+        self.app = app
+        self.version = version
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in ("GET", "HEAD")
+                or not scope["path"].startswith(self.paths)):
+            await self.app(scope, receive, send)
+            return
+        version = self.version(scope)
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        url = scope["path"].encode() + b"?" + scope.get("query_string", b"")
+        etag = f'W/"{version}-{hashlib.blake2b(url, digest_size=8).hexdigest()}"'
+        headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if_none_match = _header(scope, b"if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header"""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda coding: weights.get(coding, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=min(11, level + 1))
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data, final):
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _varies(start):
+    """True if the representation of this response depends on Accept-Encoding"""
+    content_type = dict((key.lower(), value) for key, value in start.get("headers", [])).get(b"content-type", b"")
+    return start["status"] == 304 or content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip compression of JSON, NDJSON and text responses"""
+
+    def __init__(self, app, minimum_size=None, level=None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        self.level = level if level is not None else int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(_header(scope, b"accept-encoding"))
+        if encoding is None:
+            async def send_uncompressed(message):
+                # Still varies by Accept-Encoding: a shared cache must not hand this to gzip/br clients
+                if message["type"] == "http.response.start" and _varies(message):
+                    message["headers"] = list(message.get("headers", [])) + [(b"vary", b"Accept-Encoding")]
+                await send(message)
+
+            await self.app(scope, receive, send_uncompressed)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = start.get("headers", [])
+                names = {key.lower(): value for key, value in headers}
+                content_type = names.get(b"content-type", b"").decode("latin-1")
+                compressible = (start["status"] not in (204, 304) and b"content-encoding" not in names
+                                and content_type.startswith(COMPRESSIBLE_TYPES)
+                                and (more_body or len(body) >= self.minimum_size))
+                headers = [(key, value) for key, value in headers
+                           if not (compressible and key.lower() == b"content-length")]
+                if compressible:
+                    compressor = _Compressor(encoding, self.level)
+                    headers.append((b"content-encoding", encoding.encode()))
+                    if not more_body:
+                        body = compressor.compress(body, final=True)
+                        compressor = None
+                        headers.append((b"content-length", str(len(body)).encode()))
+                if _varies(start):
+                    headers.append((b"vary", b"Accept-Encoding"))
+                start["headers"] = headers
+                await send(start)
+                start = None
+            if compressor is not None:
+                body = compressor.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
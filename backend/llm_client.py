@@ -0,0 +1,240 @@
+"""
+Resilient async LLM client for the chat endpoint
+Wraps groq.AsyncGroq (or any client with an async chat.completions.create)
+with a per-attempt timeout, an overall deadline, bounded retries with full
+jitter and a circuit breaker. The Groq client shares one pooled keep-alive
+HTTP connection pool for the whole process. When the breaker is open or a
+call fails, callers get LLMUnavailable and answer from local data instead.
+
+Environment:
+  GROQ_API_KEY          API key
+  GROQ_BASE_URL         API root, e.g. a local stub server (default Groq cloud)
+  GROQ_TIMEOUT          seconds per attempt (default 10)
+  GROQ_DEADLINE         seconds for a whole call including retries (default 20)
+  GROQ_MAX_RETRIES      retries after the first attempt (default 2)
+  GROQ_MAX_CONNECTIONS  pooled connections to the API (default 10)
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque, namedtuple
+
+import metrics
+from logging_config import get_logger
+
+logger = get_logger("llm")
+
+LLM_REQUESTS = metrics.registry.counter(
+    "llm_requests_total", "LLM calls by outcome (ok, error, circuit_open)", ("outcome",))
+
+# HTTP statuses worth retrying; anything else (bad request, auth) fails at once
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer in time; use the local fallback response"""
+
+
+# Handed out by CircuitBreaker.allow() and passed back to record(): the breaker generation
+# (bumped each time it opens) the call was admitted in, and whether it is the half-open trial
+CallToken = namedtuple("CallToken", ("generation", "trial"))
+
+
+class CircuitBreaker:
+    """Stops calls to an upstream whose recent error or slow-call rate is too high
+
+    Over the last `window` calls (once at least `min_calls` are recorded) the
+    breaker opens when failures, or calls slower than slow_call_seconds, reach
+    their rate thresholds. After `cooldown` seconds it lets one trial call
+    through (half-open); that call closes or re-opens it. Calls admitted
+    before the breaker opened are ignored when they finish.
+    """
+
+    def __init__(self, window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=5.0,
+                 slow_call_rate=0.5, cooldown=30.0, clock=time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.calls = deque(maxlen=window)
+        self.opened_at = None
+        self.generation = 0
+        self._trial = None  # token of the half-open trial call in flight
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """CallToken if a call may go out now, else None; claims the trial slot when half-open"""
+        state = self.state
+        if state == "closed":
+            return CallToken(self.generation, False)
+        if state == "half_open" and self._trial is None:
+            self._trial = CallToken(self.generation, True)
+            return self._trial
+        return None
+
+    def release(self, token):
+        """Return an admission that was never used, freeing the trial slot if it held it"""
+        if token is not None and token is self._trial:
+            self._trial = None
+
+    def record(self, ok, latency, token=None):
+        """Record a finished call, admitted with `token`, and update the breaker state"""
+        if token is not None and token is self._trial:
+            # Outcome of the half-open trial
+            self._trial = None
+            if ok and latency < self.slow_call_seconds:
+                self.opened_at = None
+                self.calls.clear()
+                logger.info("LLM circuit closed")
+            else:
+                self.opened_at = self.clock()
+            return
+        if self.opened_at is not None or (token is not None and token.generation != self.generation):
+            # Started before the breaker opened: says nothing about the upstream now
+            return
+
+        self.calls.append((ok, latency))
+        if len(self.calls) < self.min_calls:
+            return
+        failures = sum(1 for call_ok, _ in self.calls if not call_ok) / len(self.calls)
+        slow = sum(1 for _, call_latency in self.calls if call_latency >= self.slow_call_seconds) / len(self.calls)
+        if failures >= self.failure_rate or slow >= self.slow_call_rate:
+            self.opened_at = self.clock()
+            self.generation += 1
+            logger.warning("LLM circuit opened (failure rate %.0f%%, slow rate %.0f%%)", failures * 100, slow * 100)
+
+
+def is_retryable(error):
+    """Timeouts, connection failures, rate limits and server errors are retried"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    try:
+        import groq
+        if isinstance(error, groq.APIConnectionError):
+            return True
+    except ImportError:
+        pass
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+class LLMClient:
+    """Deadline, retry and circuit-breaker policy around an async chat completions client"""
+
+    def __init__(self, client, timeout=10.0, deadline=20.0, max_retries=2,
+                 backoff_base=0.25, backoff_max=2.0, breaker=None):
+        self.client = client
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+    def available(self):
+        """False while the circuit breaker is open"""
+        return self.breaker.state != "open"
+
+    def admit(self):
+        """Breaker admission for a call, or None while the circuit rejects calls
+
+        Lets callers hold the admission before spending anything else on the call
+        (e.g. quota); pass it to complete(), or hand it back with release().
+        """
+        token = self.breaker.allow()
+        if token is None:
+            LLM_REQUESTS.inc("circuit_open")
+        return token
+
+    def release(self, admission):
+        """Give back an admission from admit() that will not be used"""
+        self.breaker.release(admission)
+
+    async def complete(self, messages, model, admission=None, **kwargs):
+        """Text of the first choice; raises LLMUnavailable on open circuit, failure or deadline"""
+        token = admission if admission is not None else self.admit()
+        if token is None:
+            raise LLMUnavailable("circuit open")
+
+        start = time.monotonic()
+        deadline = start + self.deadline
+        error = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    completion = await asyncio.wait_for(
+                        self.client.chat.completions.create(messages=messages, model=model, **kwargs),
+                        min(self.timeout, remaining)
+                    )
+                except Exception as e:
+                    error = e
+                    if attempt == self.max_retries or not is_retryable(e):
+                        break
+                    # Exponential backoff with full jitter, never past the deadline
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                    if time.monotonic() + delay >= deadline:
+                        break
+                    logger.debug("LLM attempt %d failed (%r), retrying in %.2fs", attempt + 1, e, delay)
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.breaker.record(True, time.monotonic() - start, token)
+                token = None
+                LLM_REQUESTS.inc("ok")
+                return completion.choices[0].message.content
+
+            self.breaker.record(False, time.monotonic() - start, token)
+            token = None
+        finally:
+            # Cancelled (client disconnect, outer timeout) before an outcome was recorded:
+            # hand the admission back so a half-open trial slot is never held forever
+            if token is not None:
+                self.breaker.release(token)
+        LLM_REQUESTS.inc("error")
+        logger.warning("LLM call failed: %r", error or "deadline exceeded")
+        raise LLMUnavailable(str(error or "deadline exceeded")) from error
+
+    async def aclose(self):
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+
+def create_groq_client():
+    """LLMClient over groq.AsyncGroq with a shared keep-alive connection pool, configured from the environment"""
+    import httpx
+    from groq import AsyncGroq
+
+    timeout = float(os.getenv("GROQ_TIMEOUT", "10"))
+    max_connections = int(os.getenv("GROQ_MAX_CONNECTIONS", "10"))
+    http_client = httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+    client = AsyncGroq(
+        api_key=os.getenv("GROQ_API_KEY", "your-groq-api-key-here"),
+        base_url=os.getenv("GROQ_BASE_URL") or None,
+        max_retries=0,  # retries are handled by LLMClient
+        http_client=http_client,
+    )
+    return LLMClient(
+        client,
+        timeout=timeout,
+        deadline=float(os.getenv("GROQ_DEADLINE", "20")),
+        max_retries=int(os.getenv("GROQ_MAX_RETRIES", "2")),
+    )
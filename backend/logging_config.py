@@ -0,0 +1,158 @@
+"""
+Structured, low-overhead logging for the Kansas Claims Predictor API
+Records are handed to a queue and written by a background listener thread,
+so request handlers never block on stdout. Every record carries the request
+ID of the request that produced it, and DEBUG output is sampled per request
+so the log volume of each chat turn can be dialled down under load.
+
+Environment:
+  LOG_LEVEL        minimum level to emit (default INFO)
+  LOG_FORMAT       "json" or "text" (default json)
+  LOG_SAMPLE_RATE  fraction of requests whose DEBUG records are kept (default 1.0)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from contextvars import ContextVar
+
+LOGGER_NAME = "kansas_claims"
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Per-request context; defaults apply outside of a request (startup, scripts)
+request_id_var = ContextVar("request_id", default="-")
+debug_sampled_var = ContextVar("debug_sampled", default=True)
+
+_listener = None
+
+
+def get_logger(name=None):
+    """Return the application logger or one of its children"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the request ID and drop DEBUG records for requests not sampled"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        if record.levelno <= logging.DEBUG and not debug_sampled_var.get():
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level=None, fmt=None, sample_rate=None, stream=None):
+    """Configure queue-based logging for the application logger; safe to call more than once"""
+    global _listener
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    if sample_rate is None:
+        sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(stream)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    logger = get_logger()
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.sample_rate = sample_rate
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=False)
+    _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """Flush and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def should_sample(rate):
+    """Decide whether a request keeps its DEBUG records"""
+    return rate >= 1.0 or random.random() < rate
+
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning a request ID and the per-request DEBUG sampling decision"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        rate = getattr(get_logger(), "sample_rate", 1.0)
+        id_token = request_id_var.set(request_id)
+        sampled_token = debug_sampled_var.set(should_sample(rate))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode(), request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            get_logger("http").debug(
+                "request finished",
+                extra={"fields": {"method": scope["method"], "path": scope["path"],
+                                  "duration_ms": round((time.perf_counter() - start) * 1000, 2)}})
+            request_id_var.reset(id_token)
+            debug_sampled_var.reset(sampled_token)
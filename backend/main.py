@@ -1,25 +1,56 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime, timedelta
 import pandas as pd
-import joblib
 import os
-from groq import Groq
+import glob
+from llm_client import LLMUnavailable, create_groq_client
 from ml_models import ClaimsPredictionModel
+from rate_limit import DailyQuota
+import metrics
+import shared_store
+import claims_db
+import profiling
+import http_cache
+import horizon
+from charts import ChartRenderer, chart_spec
+from payloads import JSONBytesResponse, PayloadCache
+from logging_config import setup_logging, get_logger, RequestContextMiddleware
 import json
+import re
+import asyncio
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 # import seaborn as sns
-import io
 import base64
-from matplotlib.dates import DateFormatter
 import numpy as np
 
 load_dotenv()
 
-app = FastAPI(title="Kansas Claims Predictor API")
+setup_logging()
+logger = get_logger("api")
+
+app = FastAPI(title="Kansas Claims Predictor API", default_response_class=JSONBytesResponse)
+
+# 304 Not Modified for read endpoints until the data or models change
+def response_version(scope):
+    """Version of a cacheable read response: the data version, plus the day for /bootstrap's forecast"""
+    if not predictor or not predictor.has_data():
+        return None
+    if scope["path"] == "/bootstrap":
+        return f"{predictor.data_version()}-{datetime.now().strftime('%Y%m%d')}"
+    return predictor.data_version()
+
+app.add_middleware(
+    http_cache.ConditionalGetMiddleware,
+    version=response_version,
+    paths=("/counties", "/claim-types", "/summary/", "/insights/", "/aggregate", "/history/", "/bootstrap"),
+)
+
+# Negotiated brotli/gzip compression of JSON and NDJSON bodies
+app.add_middleware(http_cache.CompressionMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,20 +61,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms and request counts, exposed on /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Opt-in cProfile traces for individual requests (PROFILING_ENABLED)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# Request IDs and per-request DEBUG log sampling
+app.add_middleware(RequestContextMiddleware)
+
 # Global variables
 predictor = None
 groq_client = None
-groq_usage_count = 0
-MAX_DAILY_GROQ_REQUESTS = 100
+# Charts render in matplotlib worker processes (CHART_WORKERS), started on the first PNG request
+chart_renderer = ChartRenderer()
+# Encoded vocabulary, summary and insight responses for the current data version
+payload_cache = PayloadCache()
+llm_quota = None
+MAX_DAILY_GROQ_REQUESTS = int(os.getenv("LLM_DAILY_LIMIT", "100"))
+# Daily LLM usage counters, shared by all workers through one SQLite file
+LLM_QUOTA_DB = os.getenv("LLM_QUOTA_DB", "../models/llm_quota.sqlite")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# One CSV file, or a glob of partition files (e.g. ../data/kansas_claims_*.csv)
+DATA_PATH = os.getenv("CLAIMS_DATA_PATH", "../data/kansas_claims_10years.csv")
+MODELS_PATH = os.getenv("CLAIMS_MODELS_PATH", "../models/claims_models.pkl")
+# Rows per chunk when streaming the CSV into the store instead of loading it (0 loads it in memory)
+LOAD_CHUNK_ROWS = int(os.getenv("CLAIMS_LOAD_CHUNK_ROWS", "0"))
+# Directory for a memory-mapped store shared by all uvicorn workers (optional unless streaming)
+SHARED_STORE_DIR = os.getenv("CLAIMS_SHARED_STORE") or ("../store" if LOAD_CHUNK_ROWS else None)
+# SQLite claims database shared by all workers, serving data queries from indexes and rollup tables (optional)
+CLAIMS_DB = os.getenv("CLAIMS_DB")
+# Optional ARIMA engine, fitted in the background after startup if no saved engine exists
+TS_ENGINE_ENABLED = os.getenv("TS_ENGINE_ENABLED", "0").lower() in ("1", "true", "yes")
+TS_ENGINE_PATH = os.getenv("TS_ENGINE_PATH", "../models/ts_engine.pkl")
+# Seconds the background fit may take; series not reached keep using regression ("0" for no limit)
+TS_ENGINE_TIME_BUDGET = float(os.getenv("TS_ENGINE_TIME_BUDGET", "600")) or None
+# Pooled regression across counties, fitted in the background after startup; off by default because
+# each worker reads every row to fit it, which defeats the bounded-memory store and database modes
+POOLED_ENGINE_ENABLED = os.getenv("POOLED_ENGINE_ENABLED", "0").lower() in ("1", "true", "yes")
+# Days of regression forecasts precomputed for every series each midnight (0 disables)
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "365"))
+horizon_task = None
 
 # Pydantic models
 class PredictionRequest(BaseModel):
     county: str
     claim_type: str
     target_date: str
+    engine: str = "regression"
+
+# "data": chart as labels/series for the frontend to draw; "png": also embed a server-rendered image
+CHART_FORMATS = ("data", "png", "none")
 
 class ChatRequest(BaseModel):
     message: str
+    chart_format: str = "data"
 
 class PredictionResponse(BaseModel):
     county: str
@@ -52,50 +124,267 @@ class PredictionResponse(BaseModel):
     predicted_count: int
     predicted_cost: float
     avg_cost_per_claim: float
+    engine: str = "regression"
+    # 95% prediction interval; None when the engine provides no interval
+    predicted_count_lower: Optional[float] = None
+    predicted_count_upper: Optional[float] = None
+    predicted_cost_lower: Optional[float] = None
+    predicted_cost_upper: Optional[float] = None
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize models on startup"""
-    global predictor, groq_client
-    
-    # Initialize Groq client
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY", "your-groq-api-key-here"))
-    
-    # Load ML models
-    predictor = ClaimsPredictionModel()
+    global predictor, groq_client, llm_quota, horizon_task
+    
+    # Initialize Groq client (async, pooled connections, deadlines and circuit breaker)
+    groq_client = create_groq_client()
+    llm_quota = DailyQuota(LLM_QUOTA_DB, MAX_DAILY_GROQ_REQUESTS)
+    
+    if CLAIMS_DB:
+        # The first worker streams the CSV into the database; the others wait, then open it read-only
+        built = claims_db.ensure_claims_db(CLAIMS_DB, data_source(), LOAD_CHUNK_ROWS or 500_000)
+        predictor = load_db_predictor()
+        logger.info("Opened claims database %s (version %s, built here: %s)",
+                    CLAIMS_DB, predictor.db.version, built)
+    elif SHARED_STORE_DIR:
+        # The first worker loads (or streams) and exports; the others wait, then map the files read-only
+        data_files = data_source()
+        if LOAD_CHUNK_ROWS:
+            build = lambda: shared_store.build_store_from_csv(data_files, SHARED_STORE_DIR, LOAD_CHUNK_ROWS, MODELS_PATH)
+        else:
+            build = lambda: load_predictor().export_shared_store(SHARED_STORE_DIR, data_files, MODELS_PATH)
+        built = shared_store.ensure_store(SHARED_STORE_DIR, build, data_files, MODELS_PATH)
+        predictor = ClaimsPredictionModel()
+        predictor.attach_shared_store(SHARED_STORE_DIR)
+        logger.info("Attached shared store %s (version %s, built here: %s)",
+                    SHARED_STORE_DIR, predictor.store.version, built)
+    else:
+        predictor = load_predictor()
+    
+    # Built here so the first /aggregate, /history, conditional and /bootstrap requests do not pay for them;
+    # with a shared store or claims database the cube and history index come from tables built with it,
+    # so no worker scans the rows. With saved models but no data only predictions are served
+    if predictor.has_data() and predictor.get_counties() and predictor.get_claim_types():
+        predictor.get_rollup_cube()
+        predictor.get_history_index()
+        bootstrap_payload(predictor.get_counties()[0], predictor.get_claim_types()[0])
+    
+    if FORECAST_HORIZON_DAYS > 0:
+        horizon_task = asyncio.create_task(forecast_horizon_scheduler(predictor, FORECAST_HORIZON_DAYS))
+    if POOLED_ENGINE_ENABLED:
+        asyncio.get_running_loop().run_in_executor(None, train_pooled_engine, predictor)
+    if TS_ENGINE_ENABLED:
+        # Requests keep using the regression engine until this finishes
+        asyncio.get_running_loop().run_in_executor(None, load_or_train_time_series_engine, predictor)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the pooled LLM connections and stop the chart renderers and horizon scheduler"""
+    if horizon_task:
+        horizon_task.cancel()
+    if groq_client:
+        await groq_client.aclose()
+    chart_renderer.shutdown()
+
+def data_source():
+    """Existing data files: DATA_PATH, or the sorted partition files matching it when it is a glob"""
+    if glob.has_magic(DATA_PATH):
+        return sorted(glob.glob(DATA_PATH))
+    return [DATA_PATH] if os.path.exists(DATA_PATH) else []
+
+def load_predictor():
+    """Load data and models, training and saving them if no saved models exist"""
+    model = ClaimsPredictionModel()
     
     # Load data and models if they exist
-    if os.path.exists('../data/kansas_claims_10years.csv'):
-        predictor.load_data('../data/kansas_claims_10years.csv')
+    data_files = data_source()
+    if data_files:
+        model.load_data(data_files)
         
-    if os.path.exists('../models/claims_models.pkl'):
-        predictor.load_models('../models/claims_models.pkl')
+    if os.path.exists(MODELS_PATH):
+        model.load_models(MODELS_PATH)
     else:
         # Train models if not saved
-        print("Training models...")
-        predictor.train_all_models()
-        predictor.save_models('../models/claims_models.pkl')
+        logger.info("Training models...")
+        model.train_all_models()
+        model.save_models(MODELS_PATH)
+    
+    return model
+
+def load_db_predictor():
+    """Serve data from CLAIMS_DB; models are loaded, or trained from the database rows and saved"""
+    model = ClaimsPredictionModel()
+    model.attach_claims_db(CLAIMS_DB)
+    with shared_store.store_lock(MODELS_PATH):
+        if os.path.exists(MODELS_PATH):
+            model.load_models(MODELS_PATH)
+        else:
+            logger.info("Training models...")
+            model.train_all_models()
+            model.save_models(MODELS_PATH)
+    return model
+
+def load_or_train_time_series_engine(model):
+    """Load the saved ARIMA engine, or fit and save it; one process fits at a time"""
+    try:
+        with shared_store.store_lock(TS_ENGINE_PATH):
+            if os.path.exists(TS_ENGINE_PATH):
+                model.load_time_series_engine(TS_ENGINE_PATH)
+            else:
+                logger.info("Fitting time-series engine...")
+                model.train_time_series_engine(time_budget=TS_ENGINE_TIME_BUDGET)
+                model.save_time_series_engine(TS_ENGINE_PATH)
+        logger.info("Time-series engine ready: %d series", len(model.ts_engine.series))
+    except Exception:
+        logger.exception("Time-series engine unavailable")
+
+async def forecast_horizon_scheduler(model, days):
+    """Rebuild the precomputed forecast table now and after every midnight
+    
+    Each table is built in the default executor and swapped in whole, so
+    requests keep reading the previous table (or the models) meanwhile.
+    """
+    while True:
+        try:
+            with metrics.timer("forecast_horizon_build"):
+                table = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: model.build_forecast_horizon(days=days))
+            model.horizon = table
+            logger.info("Forecast horizon ready: %d series x %d days from %s",
+                        table.predictions.shape[0], table.days, table.start)
+        except Exception:
+            logger.exception("Forecast horizon build failed")
+        await asyncio.sleep(horizon.seconds_until_midnight() + 1)
+
+def train_pooled_engine(model):
+    """Fit the pooled cross-county model; cheap enough to refit in every worker"""
+    try:
+        model.train_pooled_model()
+    except Exception:
+        logger.exception("Pooled engine unavailable")
 
 @app.get("/")
 async def root():
     return {"message": "Kansas Claims Predictor API"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Expose request and stage metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Guard admin endpoints with ADMIN_TOKEN; without one configured they do not exist"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """List stored request profiles, newest first"""
+    return {
+        "enabled": profiling.settings.enabled,
+        "sample_rate": profiling.settings.sample_rate,
+        "profiles": profiling.list_profiles()
+    }
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, raw: bool = False, sort: str = "cumulative", limit: int = 40):
+    """Show a stored profile as a pstats report, or download the raw .prof file"""
+    path = profiling.get_profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if raw:
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    
+    try:
+        report = profiling.summarize_profile(profile_id, sort=sort, limit=limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key: {sort}")
+    return PlainTextResponse(report)
+
+@app.get("/engines")
+async def get_engines():
+    """List forecasting engines and whether each can serve predictions"""
+    ts_engine = predictor.ts_engine if predictor else None
+    pooled_model = predictor.pooled_model if predictor else None
+    return {
+        "engines": predictor.available_engines() if predictor else [],
+        "arima": {
+            "enabled": TS_ENGINE_ENABLED,
+            "series": len(ts_engine.series) if ts_engine else 0,
+            "fit_seconds": ts_engine.fit_seconds if ts_engine else None,
+            "skipped": len(ts_engine.skipped) if ts_engine else 0
+        },
+        "pooled": {
+            "enabled": POOLED_ENGINE_ENABLED,
+            "area_types": pooled_model.area_types if pooled_model else [],
+            "fit_seconds": pooled_model.fit_seconds if pooled_model else None
+        }
+    }
+
+def cached_payload(key, build):
+    """Encoded build() result, computed once per data version"""
+    return payload_cache.get(predictor.data_version(), key, build)
+
 @app.get("/counties")
 async def get_counties():
     """Get list of Kansas counties"""
-    if predictor and predictor.data is not None:
-        counties = sorted(predictor.data['county'].unique().tolist())
-        return {"counties": counties}
+    if predictor and predictor.has_data():
+        return JSONBytesResponse(cached_payload("counties", lambda: {"counties": predictor.get_counties()}))
     return {"counties": []}
 
 @app.get("/claim-types")
 async def get_claim_types():
     """Get list of claim types"""
-    if predictor and predictor.data is not None:
-        claim_types = sorted(predictor.data['claim_type'].unique().tolist())
-        return {"claim_types": claim_types}
+    if predictor and predictor.has_data():
+        return JSONBytesResponse(cached_payload("claim_types", lambda: {"claim_types": predictor.get_claim_types()}))
     return {"claim_types": []}
 
+BOOTSTRAP_FORECAST_DAYS = 7
+
+def bootstrap_payload(county, claim_type, days=BOOTSTRAP_FORECAST_DAYS):
+    """Encoded /bootstrap body, built once per data version and day"""
+    start_date = datetime.now().strftime('%Y-%m-%d')
+    return cached_payload(("bootstrap", county, claim_type, days, start_date),
+                          lambda: build_bootstrap(county, claim_type, start_date, days))
+
+def build_bootstrap(county, claim_type, start_date, days):
+    """Everything the frontend shows on first render for one county and claim type"""
+    return {
+        "counties": predictor.get_counties(),
+        "claim_types": predictor.get_claim_types(),
+        "defaults": {"county": county, "claim_type": claim_type},
+        "summary": predictor.get_county_summary(county),
+        "insights": predictor.get_seasonal_insights(county, claim_type),
+        "forecast": predictor.predict_multiple_dates(county, claim_type, start_date, days),
+        "data_version": predictor.data_version()
+    }
+
+@app.get("/bootstrap")
+async def get_bootstrap(county: str = "", claim_type: str = "", days: int = BOOTSTRAP_FORECAST_DAYS):
+    """Vocabularies, summary, insights and a short forecast in one payload
+
+    Defaults to the first county and claim type, as the frontend does. The
+    payload is encoded once per data version and day. Without data the
+    vocabularies are empty, as /counties and /claim-types return them.
+    """
+    if not predictor or not predictor.has_data() or not predictor.get_counties() or not predictor.get_claim_types():
+        return {"counties": [], "claim_types": [], "defaults": {"county": None, "claim_type": None},
+                "summary": {}, "insights": None, "forecast": [], "data_version": None}
+    
+    county = county or predictor.get_counties()[0]
+    claim_type = claim_type or predictor.get_claim_types()[0]
+    if county not in predictor.get_counties() or claim_type not in predictor.get_claim_types():
+        raise HTTPException(status_code=400, detail="Invalid input: unknown county or claim type")
+    if not 1 <= days <= 31:
+        raise HTTPException(status_code=400, detail="Invalid input: days must be between 1 and 31")
+    
+    with metrics.timer("bootstrap"):
+        payload = bootstrap_payload(county, claim_type, days)
+    return JSONBytesResponse(payload)
+
 @app.post("/predict", response_model=PredictionResponse)
 async def predict_claims(request: PredictionRequest):
     """Predict claims for specific county, type, and date"""
@@ -103,11 +392,13 @@ async def predict_claims(request: PredictionRequest):
         raise HTTPException(status_code=500, detail="Models not loaded")
     
     try:
-        prediction = predictor.predict_claims(
-            request.county, 
-            request.claim_type, 
-            request.target_date
-        )
+        with metrics.timer("model_predict"):
+            prediction = predictor.predict_claims(
+                request.county, 
+                request.claim_type, 
+                request.target_date,
+                request.engine
+            )
         
         if not prediction:
             raise HTTPException(status_code=404, detail="No model found for this county/claim type")
@@ -120,16 +411,19 @@ async def predict_claims(request: PredictionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/predict-range/{county}/{claim_type}")
-async def predict_date_range(county: str, claim_type: str, days: int = 30):
+async def predict_date_range(county: str, claim_type: str, days: int = 30, engine: str = "regression"):
     """Predict claims for multiple future dates"""
     if not predictor:
         raise HTTPException(status_code=500, detail="Models not loaded")
     
     try:
         start_date = datetime.now().strftime('%Y-%m-%d')
-        predictions = predictor.predict_multiple_dates(county, claim_type, start_date, days)
+        with metrics.timer("model_predict"):
+            predictions = predictor.predict_multiple_dates(county, claim_type, start_date, days, engine)
         return {"predictions": predictions}
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -140,12 +434,139 @@ async def get_county_summary(county: str):
         raise HTTPException(status_code=500, detail="Models not loaded")
     
     try:
-        summary = predictor.get_county_summary(county)
-        return {"county": county, "summary": summary}
+        with metrics.timer("insight_aggregation"):
+            payload = cached_payload(("summary", county),
+                                     lambda: {"county": county, "summary": predictor.get_county_summary(county)})
+        return JSONBytesResponse(payload)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/aggregate")
+async def aggregate_claims(measure: str = "total_cost", stat: str = "sum", group_by: str = "",
+                           county: str = "", claim_type: str = "", year: str = "", month: str = "",
+                           area_type: str = "", metro: str = ""):
+    """Sum/mean/count of a measure over any slice of the rollup cube
+
+    Filters and group_by take comma-separated values, e.g.
+    /aggregate?county=Wyandotte or /aggregate?measure=claim_count&group_by=claim_type
+    """
+    if not predictor or not predictor.has_data():
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    
+    filters = {
+        "county": county, "claim_type": claim_type, "year": year,
+        "month": month, "area_type": area_type, "metro": metro
+    }
+    try:
+        with metrics.timer("rollup_query"):
+            return predictor.get_rollup_cube().query(
+                measure, stat,
+                group_by=split_list(group_by),
+                filters={dimension: split_list(values) for dimension, values in filters.items()}
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+
+HISTORY_MAX_LIMIT = 10000
+
+@app.get("/history/{county}/{claim_type}")
+async def get_history(county: str, claim_type: str, start: str = None, end: str = None,
+                      resample: str = "daily", offset: int = 0, limit: int = 1000, stream: bool = False):
+    """Historical actuals for a series and date window, resampled and paginated
+
+    With stream=true every period is sent as newline-delimited JSON and the
+    offset/limit window is ignored.
+    """
+    if not predictor or not predictor.has_data():
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    if offset < 0 or not 0 < limit <= HISTORY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Invalid input: limit must be 1-{HISTORY_MAX_LIMIT}, offset >= 0")
+    
+    try:
+        with metrics.timer("history_query"):
+            history = predictor.get_history_index().query(
+                county, claim_type,
+                pd.Timestamp(start).date() if start else None,
+                pd.Timestamp(end).date() if end else None,
+                resample
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+    if history is None:
+        raise HTTPException(status_code=404, detail="No data found for this county/claim type")
+    
+    dates, counts, costs, _ = history
+    if stream:
+        return StreamingResponse(iter_history_ndjson(dates, counts, costs), media_type="application/x-ndjson")
+    
+    window = slice(offset, offset + limit)
+    next_offset = offset + limit if offset + limit < len(dates) else None
+    return {
+        "county": county,
+        "claim_type": claim_type,
+        "resample": resample,
+        "total": len(dates),
+        "offset": offset,
+        "next_offset": next_offset,
+        "history": history_records(dates[window], counts[window], costs[window])
+    }
+
+def history_records(dates, counts, costs):
+    """JSON-ready records for a slice of history arrays"""
+    return [
+        {"date": date, "claim_count": count, "total_cost": round(cost, 2),
+         "avg_cost_per_claim": round(cost / count, 2) if count else 0.0}
+        for date, count, cost in zip(dates.astype(str).tolist(), counts.tolist(), costs.tolist())
+    ]
+
+def iter_history_ndjson(dates, counts, costs, chunk_size=1000):
+    """Yield history as NDJSON, chunk_size records per write"""
+    for i in range(0, len(dates), chunk_size):
+        window = slice(i, i + chunk_size)
+        records = history_records(dates[window], counts[window], costs[window])
+        yield "".join(json.dumps(record) + "\n" for record in records)
+
+def split_list(value):
+    """Comma-separated query parameter as a list of stripped, non-empty items"""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+@app.get("/compare")
+async def compare_counties(counties: str, claim_type: str, days: int = 7, engine: str = "regression",
+                           chart: bool = False):
+    """Compare forecasts and historical averages for several counties and one claim type
+
+    counties is comma-separated, e.g. /compare?counties=Johnson,Wyandotte&claim_type=emergency
+    """
+    if not predictor or not predictor.has_data():
+        raise HTTPException(status_code=500, detail="Models not loaded")
+    
+    county_list = split_list(counties)
+    if len(county_list) < 2:
+        raise HTTPException(status_code=400, detail="Invalid input: at least two counties are required")
+    if not 1 <= days <= 31:
+        raise HTTPException(status_code=400, detail="Invalid input: days must be between 1 and 31")
+    
+    try:
+        with metrics.timer("model_predict"):
+            comparison = predictor.compare_counties(
+                county_list, claim_type, datetime.now().strftime('%Y-%m-%d'), days, engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+    
+    result = {"claim_type": claim_type, "days": days, "engine": engine, "comparison": comparison}
+    if chart:
+        result["chart"] = await generate_chart(**comparison_chart(comparison, claim_type, days))
+    return result
+
+def comparison_chart(comparison, claim_type, days):
+    """Bar chart of each county's forecast cost over the comparison window"""
+    return {
+        "data": {entry['county']: entry['forecast_cost'] for entry in comparison},
+        "chart_type": 'cost_comparison',
+        "title": f"Forecast Cost - {claim_type.replace('_', ' ').title()} (next {days} days)"
+    }
+
 @app.get("/insights/{county}/{claim_type}")
 async def get_seasonal_insights(county: str, claim_type: str):
     """Get seasonal patterns for county and claim type"""
@@ -153,11 +574,16 @@ async def get_seasonal_insights(county: str, claim_type: str):
         raise HTTPException(status_code=500, detail="Models not loaded")
     
     try:
-        insights = predictor.get_seasonal_insights(county, claim_type)
-        if not insights:
+        def build():
+            insights = predictor.get_seasonal_insights(county, claim_type)
+            return {"county": county, "claim_type": claim_type, "insights": insights} if insights else None
+        
+        with metrics.timer("insight_aggregation"):
+            payload = cached_payload(("insights", county, claim_type), build)
+        if payload is None:
             raise HTTPException(status_code=404, detail="Insufficient data for insights")
         
-        return {"county": county, "claim_type": claim_type, "insights": insights}
+        return JSONBytesResponse(payload)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -165,52 +591,77 @@ async def get_seasonal_insights(county: str, claim_type: str):
 @app.post("/chat")
 async def chat_with_llm(request: ChatRequest):
     """Chat interface for claims predictions"""
-    global groq_usage_count
-    
     if not predictor:
         raise HTTPException(status_code=500, detail="Predictor not available")
+    if request.chart_format not in CHART_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid input: chart_format must be one of {', '.join(CHART_FORMATS)}")
     
     try:
         # Process the user's message and get relevant data
         context = await process_user_query(request.message)
+        chart = context_chart(context) if request.chart_format != "none" else None
+        # PNGs are only rendered on request, alongside the LLM call
+        image_task = asyncio.create_task(generate_chart(**chart)) if chart and request.chart_format == "png" else None
         
         # Generate response
-        if groq_client and groq_usage_count < MAX_DAILY_GROQ_REQUESTS:
-            groq_usage_count += 1
-            response = await generate_formatted_response(request.message, context)
+        # The breaker admits the call before any quota is spent, so an open or busy half-open
+        # circuit answers locally for free; the quota write runs off the event loop
+        admission = groq_client.admit() if groq_client else None
+        if admission is not None and await asyncio.to_thread(llm_quota.acquire):
+            response = await generate_formatted_response(request.message, context, has_chart=chart is not None,
+                                                         admission=admission)
         else:
+            if admission is not None:
+                groq_client.release(admission)
             response = generate_fallback_response(request.message, context)
         
+        if image_task:
+            image = await image_task
+            if image:
+                response += f"\n\n![Chart]({image})"
+        
         return {
             "response": response,
             "context": context,
-            "usage": {
-                "groq_requests_used": groq_usage_count,
-                "groq_requests_limit": MAX_DAILY_GROQ_REQUESTS,
-                "limit_reached": groq_usage_count >= MAX_DAILY_GROQ_REQUESTS
-            }
+            "chart": chart_spec(**chart) if chart else None,
+            "usage": await asyncio.to_thread(quota_usage)
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_user_query(message: str):
-    """Extract information from user query and get relevant predictions"""
-    message_lower = message.lower()
-    context = {}
-    
-    print(f"Processing query: {message_lower}")
-    
+def quota_usage():
+    """Today's LLM quota in the shape returned by /chat and /usage"""
+    status = llm_quota.status()
+    return {
+        "groq_requests_used": status["used"],
+        "groq_requests_limit": status["limit"],
+        "groq_requests_remaining": status["remaining"],
+        "limit_reached": status["remaining"] == 0,
+        "resets_at": status["resets_at"]
+    }
+
+@app.get("/usage")
+async def get_usage():
+    """Remaining daily LLM quota (served from a short-lived cache, no write)"""
+    return await asyncio.to_thread(quota_usage)
+
+def extract_counties(message_lower: str):
+    """All counties named in a lowercased query, in the order they appear"""
+    positions = []
+    for county in predictor.get_counties():
+        match = re.search(rf"\b{re.escape(county.lower())}\b", message_lower)
+        if match:
+            positions.append((match.start(), county))
+    return [county for _, county in sorted(positions)]
+
+def extract_entities(message_lower: str):
+    """Find the first county, claim type and all counties mentioned in a lowercased query"""
     # Simple keyword extraction (can be enhanced)
-    counties = predictor.data['county'].unique() if predictor.data is not None else []
-    claim_types = ['emergency', 'inpatient', 'outpatient', 'pharmacy', 'mental_health', 'preventive']
+    mentioned_counties = extract_counties(message_lower)
     
     # Find mentioned county
-    mentioned_county = None
-    for county in counties:
-        if county.lower() in message_lower:
-            mentioned_county = county
-            break
+    mentioned_county = mentioned_counties[0] if mentioned_counties else None
     
     # Find mentioned claim type - enhanced detection
     mentioned_claim_type = None
@@ -227,7 +678,33 @@ async def process_user_query(message: str):
     elif 'preventive' in message_lower or 'prevention' in message_lower:
         mentioned_claim_type = 'preventive'
     
-    print(f"Detected county: {mentioned_county}, claim type: {mentioned_claim_type}")
+    return mentioned_county, mentioned_claim_type, mentioned_counties
+
+async def process_user_query(message: str):
+    """Extract information from user query and get relevant predictions"""
+    message_lower = message.lower()
+    context = {}
+    
+    logger.debug("Processing query: %s", message_lower)
+    
+    with metrics.timer("entity_extraction"):
+        mentioned_county, mentioned_claim_type, mentioned_counties = extract_entities(message_lower)
+    
+    logger.debug("Detected county: %s, claim type: %s", mentioned_county, mentioned_claim_type)
+    
+    # Several counties and a claim type: compare them in one batch
+    if len(mentioned_counties) > 1 and mentioned_claim_type:
+        try:
+            with metrics.timer("model_predict"):
+                context['comparison'] = predictor.compare_counties(
+                    mentioned_counties, mentioned_claim_type, datetime.now().strftime('%Y-%m-%d'), 7)
+        except Exception as e:
+            logger.warning("Error comparing counties: %s", e)
+            context['error'] = str(e)
+        context['detected_counties'] = mentioned_counties
+        context['detected_county'] = mentioned_county
+        context['detected_claim_type'] = mentioned_claim_type
+        return context
     
     # For seasonal trends, try to get insights even without specific county
     if 'seasonal' in message_lower or 'trend' in message_lower:
@@ -235,13 +712,14 @@ async def process_user_query(message: str):
             try:
                 # Try with a default county if none specified
                 test_county = mentioned_county or 'Johnson'
-                print(f"Getting seasonal insights for {test_county}, {mentioned_claim_type}")
-                insights = predictor.get_seasonal_insights(test_county, mentioned_claim_type)
+                logger.debug("Getting seasonal insights for %s, %s", test_county, mentioned_claim_type)
+                with metrics.timer("insight_aggregation"):
+                    insights = predictor.get_seasonal_insights(test_county, mentioned_claim_type)
                 context['insights'] = insights
                 context['detected_county'] = test_county
-                print(f"Got insights: {insights}")
+                logger.debug("Got insights: %s", insights)
             except Exception as e:
-                print(f"Error getting insights: {str(e)}")
+                logger.warning("Error getting insights: %s", e)
                 context['error'] = str(e)
         # Return early to avoid overwriting context
         context['detected_claim_type'] = mentioned_claim_type
@@ -253,18 +731,20 @@ async def process_user_query(message: str):
         if mentioned_county and mentioned_claim_type:
             # Get next week's predictions
             start_date = datetime.now().strftime('%Y-%m-%d')
-            predictions = predictor.predict_multiple_dates(
-                mentioned_county, mentioned_claim_type, start_date, 7
-            )
+            with metrics.timer("model_predict"):
+                predictions = predictor.predict_multiple_dates(
+                    mentioned_county, mentioned_claim_type, start_date, 7
+                )
             context['predictions'] = predictions
             
             # Get seasonal insights
-            insights = predictor.get_seasonal_insights(mentioned_county, mentioned_claim_type)
+            with metrics.timer("insight_aggregation"):
+                insights = predictor.get_seasonal_insights(mentioned_county, mentioned_claim_type)
             context['insights'] = insights
             
     except Exception as e:
         context['error'] = str(e)
-        print(f"Error getting insights: {str(e)}")
+        logger.warning("Error getting insights: %s", e)
     
     if not context.get('detected_county'):
         context['detected_county'] = mentioned_county
@@ -272,126 +752,41 @@ async def process_user_query(message: str):
     
     return context
 
-def generate_chart(data, chart_type, title, county=None, claim_type=None):
-    """Generate chart and return as base64 string"""
-    try:
-        print(f"Generating chart: {chart_type} with data: {data}")
-        
-        plt.style.use('default')
-        plt.rcParams['figure.facecolor'] = 'white'
-        plt.rcParams['axes.facecolor'] = 'white'
-        plt.rcParams['axes.edgecolor'] = 'gray'
-        plt.rcParams['axes.linewidth'] = 0.8
-        plt.rcParams['grid.alpha'] = 0.3
-        fig, ax = plt.subplots(figsize=(6, 3.5))
-        
-        if chart_type == 'seasonal_trends':
-            # Monthly trends chart
-            months = list(data.keys())
-            values = list(data.values())
-            
-            line = ax.plot(months, values, marker='o', linewidth=3, markersize=8, 
-                          color='#1976d2', label=f'{claim_type.replace("_", " ").title()} Claims')
-            ax.set_title(f'{title}', fontsize=16, fontweight='bold', pad=20)
-            ax.set_xlabel('Month', fontsize=12)
-            ax.set_ylabel('Claims Count', fontsize=12)
-            ax.grid(True, alpha=0.3)
-            ax.legend(loc='upper right', fontsize=11)
-            
-            # Add value labels on points
-            for i, v in enumerate(values):
-                ax.annotate(f'{v:,.0f}', (months[i], v), textcoords="offset points", 
-                           xytext=(0,10), ha='center', fontsize=9)
-            
-        elif chart_type == 'cost_comparison':
-            # Bar chart for cost comparison
-            categories = list(data.keys())
-            values = list(data.values())
-            colors = ['#1976d2', '#42a5f5', '#90caf9', '#64b5f6', '#2196f3']
-            
-            bars = ax.bar(categories, values, color=colors[:len(categories)])
-            ax.set_title(f'{title}', fontsize=16, fontweight='bold', pad=20)
-            ax.set_ylabel('Cost ($)', fontsize=12)
-            
-            # Add value labels on bars
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height,
-                       f'${height:,.0f}', ha='center', va='bottom', fontsize=10)
-            
-            # Add legend
-            ax.legend(bars, categories, loc='upper right', fontsize=11)
-        
-        elif chart_type == 'prediction_timeline':
-            # Timeline prediction chart
-            dates = [datetime.strptime(item['date'], '%Y-%m-%d') for item in data]
-            counts = [item['predicted_count'] for item in data]
-            
-            line = ax.plot(dates, counts, marker='o', linewidth=3, markersize=8, 
-                          color='#1976d2', label='Predicted Claims')
-            ax.set_title(f'{title}', fontsize=16, fontweight='bold', pad=20)
-            ax.set_xlabel('Date', fontsize=12)
-            ax.set_ylabel('Predicted Claims', fontsize=12)
-            ax.grid(True, alpha=0.3)
-            ax.legend(loc='upper right', fontsize=11)
-            
-            # Add value labels on points
-            for i, (date, count) in enumerate(zip(dates, counts)):
-                if i % 2 == 0:  # Show every other label to avoid crowding
-                    ax.annotate(f'{count:,.0f}', (date, count), textcoords="offset points", 
-                               xytext=(0,10), ha='center', fontsize=9)
-            
-            # Format x-axis dates
-            ax.xaxis.set_major_formatter(DateFormatter('%m/%d'))
-            plt.xticks(rotation=45)
-        
-        # Add source attribution
-        fig.text(0.99, 0.01, 'Kansas Claims Predictor', ha='right', va='bottom', 
-                 fontsize=8, alpha=0.7, style='italic')
-        
-        plt.tight_layout()
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
-        print(f"Chart generated successfully, base64 length: {len(image_base64)}")
-        return f"data:image/png;base64,{image_base64}"
-        
-    except Exception as e:
-        print(f"Error generating chart: {str(e)}")
-        plt.close()
+async def generate_chart(data, chart_type, title, county=None, claim_type=None):
+    """Render a chart in the renderer pool and return it as a base64 data URI (None on failure)"""
+    logger.debug("Generating chart: %s with data: %s", chart_type, data)
+    with metrics.timer("chart_render"):
+        image = await chart_renderer.render(chart_type, data, title, county, claim_type)
+    if image is None:
         return None
+    image_base64 = base64.b64encode(image).decode()
+    logger.debug("Chart generated successfully, base64 length: %d", len(image_base64))
+    return f"data:image/png;base64,{image_base64}"
 
-async def generate_formatted_response(message: str, context: dict):
-    """Generate formatted response using Groq with charts"""
-    
-    # Generate chart if applicable
-    chart_data = None
-    print(f"Context insights: {context.get('insights')}")
-    print(f"Context predictions: {context.get('predictions')}")
-    
+def context_chart(context):
+    """generate_chart/chart_spec arguments for the chart that fits a chat context, or None"""
+    if context.get('comparison'):
+        return comparison_chart(context['comparison'], context['detected_claim_type'], 7)
     if context.get('insights') and 'monthly_patterns' in context['insights']:
-        print("Generating seasonal trends chart")
-        chart_data = generate_chart(
-            context['insights']['monthly_patterns']['claim_count'],
-            'seasonal_trends',
-            f"Seasonal Trends - {context.get('detected_claim_type', 'Claims').replace('_', ' ').title()}",
-            context.get('detected_county'),
-            context.get('detected_claim_type')
-        )
-    elif context.get('predictions') and len(context['predictions']) > 1:
-        print("Generating prediction timeline chart")
-        chart_data = generate_chart(
-            context['predictions'],
-            'prediction_timeline',
-            f"Prediction Timeline - {context.get('detected_county', '')} {context.get('detected_claim_type', '').replace('_', ' ').title()}"
-        )
-    else:
-        print("No chart data available")
+        return {
+            "data": context['insights']['monthly_patterns']['claim_count'],
+            "chart_type": 'seasonal_trends',
+            "title": f"Seasonal Trends - {(context.get('detected_claim_type') or 'Claims').replace('_', ' ').title()}",
+            "county": context.get('detected_county'),
+            "claim_type": context.get('detected_claim_type')
+        }
+    if context.get('predictions') and len(context['predictions']) > 1:
+        return {
+            "data": context['predictions'],
+            "chart_type": 'prediction_timeline',
+            "title": f"Prediction Timeline - {context.get('detected_county') or ''} {(context.get('detected_claim_type') or '').replace('_', ' ').title()}"
+        }
+    return None
+
+async def generate_formatted_response(message: str, context: dict, has_chart: bool = False, admission=None):
+    """Generate formatted response using Groq; admission is the breaker admission from groq_client.admit()"""
+    logger.debug("Context insights: %s", context.get('insights'))
+    logger.debug("Context predictions: %s", context.get('predictions'))
     
     system_prompt = """You are a Kansas health insurance claims prediction assistant. 
     Format your responses with clear structure using markdown-like formatting:
@@ -411,6 +806,10 @@ async def generate_formatted_response(message: str, context: dict):
     if context.get('predictions'):
         user_message += f"Prediction data: {json.dumps(context['predictions'][:3])}\n"
     
+    if context.get('comparison'):
+        summaries = [{k: v for k, v in entry.items() if k != 'predictions'} for entry in context['comparison']]
+        user_message += f"County comparison (next 7 days vs. history): {json.dumps(summaries)}\n"
+    
     if context.get('insights'):
         user_message += f"Seasonal insights: {json.dumps(context['insights'])}\n"
     
@@ -420,36 +819,41 @@ async def generate_formatted_response(message: str, context: dict):
     if context.get('detected_claim_type'):
         user_message += f"Detected claim type: {context['detected_claim_type']}\n"
     
-    if chart_data:
+    if has_chart:
         user_message += "\nA chart has been generated to visualize this data.\n"
     
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            model="llama3-8b-8192",
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        response_text = format_response_text(chat_completion.choices[0].message.content)
-        
-        # Add chart to response if generated
-        if chart_data:
-            print("Adding chart to response")
-            response_text += f"\n\n![Chart]({chart_data})"
-        else:
-            print("No chart data to add")
+        with metrics.timer("llm_call"):
+            content = await groq_client.complete(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                model="llama3-8b-8192",
+                admission=admission,
+                temperature=0.3,
+                max_tokens=500
+            )
         
-        return response_text
+        return format_response_text(content)
     
+    except LLMUnavailable:
+        # Slow or failing upstream: answer from the local data instead
+        return generate_fallback_response(message, context)
     except Exception as e:
         return f"I'm having trouble processing your request right now. Error: {str(e)}"
 
 def generate_fallback_response(message: str, context: dict):
     """Generate a formatted fallback response when Groq is not available"""
+    if context.get('comparison'):
+        claim_type = context['detected_claim_type'].replace('_', ' ')
+        response = f"## {claim_type.title()} Claims Comparison (next 7 days)\n\n"
+        for entry in context['comparison']:
+            response += (f"**{entry['county']} County:** {entry['forecast_count']:,} claims, "
+                         f"${entry['forecast_cost']:,.2f} "
+                         f"(historical daily average {entry['historical_daily_count'] or 0:,.0f} claims)\n")
+        return response
+    
     if context.get('detected_county') and context.get('detected_claim_type'):
         county = context['detected_county']
         claim_type = context['detected_claim_type'].replace('_', ' ')
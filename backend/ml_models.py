@@ -1,26 +1,495 @@
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.seasonal import seasonal_decompose
 import joblib
+import hashlib
+import time
 import warnings
+from logging_config import get_logger
 warnings.filterwarnings('ignore')
 
+logger = get_logger("models")
+
+# sklearn, scipy and statsmodels are imported where they are used: serving
+# predictions from a shared store or saved models needs none of them, and
+# importing them up front dominated worker start-up time.
+
+ENGINES = ('regression', 'arima', 'pooled')
+
+# Columns describing a county rather than a row
+COUNTY_ATTRIBUTES = ('area_type', 'metro')
+
+# Coverage of the prediction intervals returned with every regression/pooled prediction
+INTERVAL_LEVEL = 0.95
+
+# Regressors of the per-series models, as built by prepare_features
+FEATURE_COLS = ['year', 'month', 'day_of_year', 'weekday', 'is_weekend',
+                'month_sin', 'month_cos', 'day_sin', 'day_cos']
+
+# Series with fewer rows get no per-series regression model
+MIN_TRAINING_ROWS = 100
+
+def _fourier_terms(dates):
+    """Yearly seasonality regressors for datetime64[D] dates, matching prepare_features"""
+    month = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    day_of_year = (dates - dates.astype('datetime64[Y]')).astype(np.int64) + 1
+    return np.column_stack([
+        np.sin(2 * np.pi * month / 12), np.cos(2 * np.pi * month / 12),
+        np.sin(2 * np.pi * day_of_year / 365), np.cos(2 * np.pi * day_of_year / 365)
+    ])
+
+def _weekdays(dates):
+    return (dates.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+def score_forecasts(actual, predicted):
+    """MAE and RMSE of predicted against actual values"""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
+    return {
+        'mae': float(mean_absolute_error(actual, predicted)),
+        'rmse': float(np.sqrt(mean_squared_error(actual, predicted)))
+    }
+
+def _interval_half_width(X, interval):
+    """(len(X), 2) half-widths of the count and cost prediction intervals"""
+    centred = X - interval['feature_means']
+    leverage = 1.0 / interval['n_obs'] + np.einsum('ij,jk,ik->i', centred, interval['xtx_inv'], centred)
+    return interval['t_crit'] * np.sqrt(np.outer(1.0 + leverage, interval['residual_var']))
+
+def _regression_features(dates):
+    """FEATURE_COLS for datetime64[D] dates as a float array, matching prepare_features"""
+    year = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    weekday = _weekdays(dates)
+    return np.column_stack([
+        year, dates.astype('datetime64[M]').astype(np.int64) % 12 + 1,
+        (dates - dates.astype('datetime64[Y]')).astype(np.int64) + 1,
+        weekday, weekday >= 5, _fourier_terms(dates)
+    ]).astype(np.float64)
+
+def _pooled_features(dates, base_date):
+    """Shared regressors of the pooled model: trend in years, yearly Fourier terms, weekday dummies"""
+    trend = (dates - base_date).astype(np.int64) / 365.25
+    weekday_dummies = _weekdays(dates)[:, None] == np.arange(1, 7)  # Monday is the baseline
+    return np.column_stack([trend, _fourier_terms(dates), weekday_dummies])
+
+def _fit_series_forecast(model_key, dates, targets, order, horizon, start_params, maxiter):
+    """Fit one series for the time-series engine and forecast `horizon` days past its end
+
+    Each target is standardized, its weekly cycle is removed with seasonal_decompose,
+    and the remainder is fitted as ARIMA with yearly Fourier regressors. Standardizing
+    makes parameters comparable across series, so they can warm-start other fits.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+    from statsmodels.tsa.seasonal import seasonal_decompose
+    warnings.filterwarnings('ignore')
+    # Fill any gaps so the series is strictly daily
+    index = pd.DatetimeIndex(dates)
+    full_index = pd.date_range(index[0], index[-1], freq='D')
+    dates = full_index.values.astype('datetime64[D]')
+    future = dates[-1] + np.arange(1, horizon + 1)
+    exog, future_exog = _fourier_terms(dates), _fourier_terms(future)
+    future_weekdays = _weekdays(future)
+    
+    forecast = np.empty((horizon, len(targets)))
+    params = []
+    for i, values in enumerate(targets):
+        y = pd.Series(values, index=index).reindex(full_index).interpolate().to_numpy(np.float64)
+        mean, std = y.mean(), y.std() or 1.0
+        z = (y - mean) / std
+        
+        seasonal = np.asarray(seasonal_decompose(z, period=7, model='additive', extrapolate_trend='freq').seasonal)
+        weekly_profile = np.bincount(_weekdays(dates), weights=seasonal, minlength=7) / np.bincount(_weekdays(dates), minlength=7)
+        
+        fit = ARIMA(z - seasonal, exog=exog, order=order, trend='c').fit(
+            start_params=start_params[i] if start_params is not None else None,
+            method_kwargs={'maxiter': maxiter}, cov_type='none', low_memory=True
+        )
+        path = np.asarray(fit.forecast(horizon, exog=future_exog)) + weekly_profile[future_weekdays]
+        forecast[:, i] = path * std + mean
+        params.append(np.asarray(fit.params))
+    
+    return model_key, {'start': dates[-1] + 1, 'forecast': forecast, 'params': params}
+
+class TimeSeriesEngine:
+    """Per-series seasonal ARIMA forecasts, fitted in parallel and cached as forecast paths
+    
+    Fitting is the expensive step, so each fit precomputes its forecast for the next
+    `horizon_days`; serving a prediction is then an array lookup. Refits warm-start
+    from each series' previous parameters (or a pilot fit of the same claim type).
+    """
+    
+    def __init__(self, order=(1, 0, 1), history_days=730, horizon_days=400, maxiter=50):
+        self.order = order
+        self.history_days = history_days
+        self.horizon_days = horizon_days
+        self.maxiter = maxiter
+        self.series = {}
+        self.fit_seconds = None
+        self.skipped = []
+    
+    def fit(self, series_iter, n_jobs=-1, time_budget=None):
+        """Fit every series from series_iter, stopping new work once time_budget (s) is spent"""
+        start_time = time.monotonic()
+        deadline = start_time + time_budget if time_budget else None
+        
+        jobs = []
+        for county, claim_type, dates, counts, costs in series_iter:
+            if len(dates) < 100:
+                continue
+            dates, counts, costs = dates[-self.history_days:], counts[-self.history_days:], costs[-self.history_days:]
+            jobs.append((f"{county}_{claim_type}", claim_type, dates, (counts, costs)))
+        
+        previous = {key: info['params'] for key, info in self.series.items()}
+        pilot_params = {}
+        fitted = {}
+        
+        with joblib.Parallel(n_jobs=n_jobs) as parallel:
+            def run(batch):
+                return parallel(
+                    joblib.delayed(_fit_series_forecast)(
+                        key, dates, targets, self.order, self.horizon_days,
+                        previous.get(key, pilot_params.get(claim_type)), self.maxiter
+                    )
+                    for key, claim_type, dates, targets in batch
+                )
+            
+            # Cold-fit one pilot per claim type (unless warm params exist) to seed the rest
+            pilots = {}
+            for job in jobs:
+                if job[1] not in pilots and job[0] not in previous:
+                    pilots[job[1]] = job
+            pilot_types = {job[0]: claim_type for claim_type, job in pilots.items()}
+            for key, result in run(list(pilots.values())):
+                fitted[key] = result
+                pilot_params[pilot_types[key]] = result['params']
+            
+            remaining = [job for job in jobs if job[0] not in fitted]
+            wave_size = max(1, joblib.effective_n_jobs(n_jobs) * 4)
+            for i in range(0, len(remaining), wave_size):
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.skipped = [job[0] for job in remaining[i:]]
+                    break
+                for key, result in run(remaining[i:i + wave_size]):
+                    fitted[key] = result
+            else:
+                self.skipped = []
+        
+        self.series.update(fitted)
+        self.fit_seconds = time.monotonic() - start_time
+        return list(fitted)
+    
+    def predict(self, model_key, target_date):
+        """(count, cost) forecast for a date inside the cached horizon, or None"""
+        info = self.series.get(model_key)
+        if info is None:
+            return None
+        offset = int((np.datetime64(pd.to_datetime(target_date).date(), 'D') - info['start']).astype(np.int64))
+        if offset < 0 or offset >= len(info['forecast']):
+            return None
+        count, cost = info['forecast'][offset]
+        return count, cost
+
+class RegressionStatistics:
+    """Per-series sufficient statistics (Z'Z, Z'y, y'y) of the per-series regressions
+    
+    update() takes rows of any series in any order, so training is one pass over
+    the data in chunks of bounded size; solve() then fits every series from its
+    statistics alone. Z is [1, features - shift]: the shift (the first chunk's
+    feature means) keeps the cross-products of large columns such as year from
+    swamping their variance.
+    """
+    
+    def __init__(self, n_series):
+        q = len(FEATURE_COLS) + 1
+        self.n_series = n_series
+        self.shift = None
+        self._pairs = np.triu_indices(q)
+        self.zz = np.zeros((n_series, q, q))
+        self.zy = np.zeros((n_series, q, 2))
+        self.yy = np.zeros((n_series, 2))
+    
+    @property
+    def rows(self):
+        return self.zz[:, 0, 0]
+    
+    def update(self, series, dates, targets):
+        """Add rows: series codes, their datetime64[D] dates and (m, 2) count/cost targets"""
+        if not len(series):
+            return
+        X = _regression_features(dates)
+        if self.shift is None:
+            self.shift = X.mean(axis=0)
+        Z = np.column_stack([np.ones(len(X)), X - self.shift])
+        # One scatter-add per distinct product; the lower triangle mirrors it in solve()
+        for i, j in zip(*self._pairs):
+            self.zz[:, i, j] += np.bincount(series, weights=Z[:, i] * Z[:, j], minlength=self.n_series)
+        for k in range(2):
+            for i in range(Z.shape[1]):
+                self.zy[:, i, k] += np.bincount(series, weights=Z[:, i] * targets[:, k], minlength=self.n_series)
+            self.yy[:, k] += np.bincount(series, weights=targets[:, k] ** 2, minlength=self.n_series)
+    
+    def solve(self, series, rcond=1e-10):
+        """(coef (n_features, 2), intercept (2,), interval terms) of one series, like LinearRegression"""
+        from scipy import stats
+        zz = np.triu(self.zz[series]) + np.triu(self.zz[series], 1).T
+        n = zz[0, 0]
+        means, y_means = zz[0, 1:] / n, self.zy[series, 0] / n
+        
+        # Centred cross-products: the intercept drops out of (X'X)^-1, which keeps it well
+        # conditioned when a column such as year is constant
+        sxx = zz[1:, 1:] - n * np.outer(means, means)
+        sxy = self.zy[series, 1:] - n * np.outer(means, y_means)
+        syy = self.yy[series] - n * y_means ** 2
+        xtx_inv = np.linalg.pinv(sxx, rcond=rcond, hermitian=True)
+        coef = xtx_inv @ sxy
+        intercept = y_means - (means + self.shift) @ coef
+        
+        dof = max(1, int(n) - 1 - np.linalg.matrix_rank(sxx, tol=rcond * np.abs(sxx).max(), hermitian=True))
+        interval = {
+            'feature_means': means + self.shift,
+            'xtx_inv': xtx_inv,
+            'residual_var': np.maximum(syy - np.einsum('jk,jk->k', coef, sxy), 0.0) / dof,
+            'n_obs': int(n),
+            't_crit': float(stats.t.ppf(0.5 + INTERVAL_LEVEL / 2, dof)),
+        }
+        return coef, intercept, interval
+
+class LinearCoefficients:
+    """Fitted linear model reduced to its coefficients, with a LinearRegression-style predict()"""
+    
+    def __init__(self, coef, intercept):
+        self.coef_ = coef
+        self.intercept_ = intercept
+    
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+class PooledRegressionModel:
+    """One regression for all series, sharing effects across counties of the same area type
+    
+    Every series is scaled by its own mean so large and small counties contribute
+    the same shape. A single sparse least-squares problem over the full frame then
+    fits a level offset per series plus one trend/seasonal/weekday effect vector per
+    (area_type, claim_type) group, so short rural series borrow their shape from
+    their group. Prediction is a coefficient lookup and a dot product.
+    """
+    
+    FEATURES = ('trend', 'month_sin', 'month_cos', 'day_sin', 'day_cos',
+                'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+    
+    def __init__(self, ridge=1e-6, chunk_size=500_000):
+        self.ridge = ridge
+        self.chunk_size = chunk_size
+        self.fit_seconds = None
+    
+    def fit(self, counties, claim_types, county_areas, columns):
+        """Fit from integer-coded columns (date, county, claim_type, claim_count, total_cost)
+        
+        county_areas holds the area_type label of each county, in `counties` order.
+        """
+        from scipy import linalg, sparse, stats
+        start_time = time.monotonic()
+        self.counties, self.claim_types = list(counties), list(claim_types)
+        self.area_types = sorted(set(county_areas))
+        n_types, n_features = len(self.claim_types), len(self.FEATURES)
+        n_series = len(self.counties) * n_types
+        n_groups = len(self.area_types) * n_types
+        
+        area_codes = np.array([self.area_types.index(area) for area in county_areas], dtype=np.int64)
+        self.series_group = (area_codes[:, None] * n_types + np.arange(n_types)).ravel()
+        
+        dates = np.asarray(columns['date']).astype('datetime64[D]')
+        series = np.asarray(columns['county'], dtype=np.int64) * n_types + np.asarray(columns['claim_type'], dtype=np.int64)
+        targets = np.column_stack([np.asarray(columns['claim_count'], dtype=np.float64),
+                                   np.asarray(columns['total_cost'], dtype=np.float64)])
+        self.base_date = dates.min()
+        
+        rows = np.bincount(series, minlength=n_series)
+        self.scale = np.ones((n_series, 2))
+        for k in range(2):
+            sums = np.bincount(series, weights=targets[:, k], minlength=n_series)
+            np.divide(sums, rows, out=self.scale[:, k], where=(rows > 0) & (sums > 0))
+        self.has_rows = rows > 0
+        
+        # Columns: one offset per series, then n_features shared effects per group
+        n_cols = n_series + n_groups * n_features
+        xtx = np.zeros((n_cols, n_cols))
+        xty = np.zeros((n_cols, 2))
+        for lo in range(0, len(series), self.chunk_size):
+            chunk = slice(lo, lo + self.chunk_size)
+            s = series[chunk]
+            m = len(s)
+            group_cols = n_series + self.series_group[s][:, None] * n_features + np.arange(n_features)
+            X = sparse.csr_matrix(
+                (np.column_stack([np.ones(m), _pooled_features(dates[chunk], self.base_date)]).ravel(),
+                 np.column_stack([s, group_cols]).ravel(),
+                 np.arange(0, m * (n_features + 1) + 1, n_features + 1)),
+                shape=(m, n_cols)
+            )
+            xtx += (X.T @ X).toarray()
+            xty += X.T @ (targets[chunk] / self.scale[s])
+        
+        xtx[np.diag_indices(n_cols)] += self.ridge
+        self.xtx_inv = linalg.inv(xtx)
+        beta = self.xtx_inv @ xty
+        self.offsets = beta[:n_series]
+        self.effects = beta[n_series:].reshape(n_groups, n_features, 2)
+        
+        # Residual variance per series (in scaled units) for the prediction intervals
+        rss = np.zeros((n_series, 2))
+        for lo in range(0, len(series), self.chunk_size):
+            chunk = slice(lo, lo + self.chunk_size)
+            s = series[chunk]
+            fitted = self.offsets[s] + np.einsum('ij,ijk->ik', _pooled_features(dates[chunk], self.base_date),
+                                                 self.effects[self.series_group[s]])
+            residuals = targets[chunk] / self.scale[s] - fitted
+            for k in range(2):
+                rss[:, k] += np.bincount(s, weights=residuals[:, k] ** 2, minlength=n_series)
+        dof = np.maximum(rows - 1, 1)
+        self.residual_var = rss / dof[:, None]
+        self.t_crit = stats.t.ppf(0.5 + INTERVAL_LEVEL / 2, dof)
+        self._county_index = {county: i for i, county in enumerate(self.counties)}
+        self._type_index = {claim_type: j for j, claim_type in enumerate(self.claim_types)}
+        self.fit_seconds = time.monotonic() - start_time
+        return self
+    
+    def predict(self, county, claim_type, dates):
+        """(predictions, half_widths), each (len(dates), 2) for (count, cost), or None for an unknown series"""
+        i, j = self._county_index.get(county), self._type_index.get(claim_type)
+        if i is None or j is None:
+            return None
+        s = i * len(self.claim_types) + j
+        if not self.has_rows[s]:
+            return None
+        g = self.series_group[s]
+        X = _pooled_features(np.asarray(dates, dtype='datetime64[D]'), self.base_date)
+        predictions = self.scale[s] * (self.offsets[s] + X @ self.effects[g])
+        
+        # Covariance of this series' offset and its group's shared effects
+        n_series, n_features = len(self.offsets), len(self.FEATURES)
+        cols = np.concatenate([[s], n_series + g * n_features + np.arange(n_features)])
+        V = np.column_stack([np.ones(len(X)), X])
+        leverage = np.einsum('ij,jk,ik->i', V, self.xtx_inv[np.ix_(cols, cols)], V)
+        half_widths = self.t_crit[s] * self.scale[s] * np.sqrt(np.outer(1.0 + leverage, self.residual_var[s]))
+        return predictions, half_widths
+
 class ClaimsPredictionModel:
     def __init__(self):
         self.models = {}
         self.scalers = {}
         self.data = None
+        self.store = None
+        self.db = None
+        self.ts_engine = None
+        self.pooled_model = None
+        self.rollup = None
+        self.history = None
+        self.horizon = None
+        self._vocabulary = None
+        self._data_version = None
         
     def load_data(self, csv_path):
-        """Load and prepare claims data"""
-        self.data = pd.read_csv(csv_path)
+        """Load and prepare claims data from one CSV file or a list of partition files"""
+        if isinstance(csv_path, (list, tuple)):
+            self.data = pd.concat([pd.read_csv(path) for path in csv_path], ignore_index=True)
+        else:
+            self.data = pd.read_csv(csv_path)
         self.data['date'] = pd.to_datetime(self.data['date'])
+        self.db = None
+        self._vocabulary = None
+        self._data_version = None
+        self.rollup = None
+        self.history = None
         return self.data
     
+    def get_counties(self):
+        """Sorted list of counties in the loaded data or attached store"""
+        return self._get_vocabulary()[0]
+    
+    def get_claim_types(self):
+        """Sorted list of claim types in the loaded data or attached store"""
+        return self._get_vocabulary()[1]
+    
+    def _get_vocabulary(self):
+        if self._vocabulary is None:
+            if self.data is not None:
+                counties = sorted(self.data['county'].unique().tolist())
+                claim_types = sorted(self.data['claim_type'].unique().tolist())
+            elif self.store is not None:
+                counties, claim_types = self.store.counties, self.store.claim_types
+            elif self.db is not None:
+                counties, claim_types = self.db.counties, self.db.claim_types
+            else:
+                return [], []
+            self._vocabulary = (counties, claim_types, set(counties), set(claim_types))
+        return self._vocabulary[:2]
+    
+    def data_version(self):
+        """Fingerprint of the data and models, identical in every worker serving the same inputs"""
+        if self.data is None and self.store is not None:
+            return self.store.version
+        if self._data_version is None:
+            digest = hashlib.sha1()
+            if self.data is not None:
+                digest.update(pd.util.hash_pandas_object(self.data, index=False).to_numpy().tobytes())
+            elif self.db is not None:
+                digest.update(self.db.version.encode())
+            for model_key in sorted(self.models):
+                model_info = self.models[model_key]
+                digest.update(model_key.encode())
+                for name in ('count_model', 'cost_model'):
+                    digest.update(np.asarray(model_info[name].coef_, dtype=np.float64).tobytes())
+                    digest.update(np.float64(model_info[name].intercept_).tobytes())
+            self._data_version = digest.hexdigest()[:16]
+        return self._data_version
+    
+    def has_data(self):
+        """True when claims data is available, in memory or through a shared store"""
+        return self.data is not None or self.store is not None or self.db is not None
+    
+    def export_shared_store(self, directory, source_path=None, models_path=None):
+        """Write data, coefficient tables and aggregates to a memory-mappable store"""
+        from shared_store import build_store
+        return build_store(self, directory, source_path, models_path)
+    
+    def load_data_out_of_core(self, csv_paths, directory, chunk_size=500_000, models_path=None):
+        """Stream CSV files into a store in chunks and serve from it, never holding the raw data
+        
+        Memory stays bounded by chunk_size rows; models come from models_path when it
+        exists and are otherwise trained from statistics gathered in the same pass.
+        """
+        from shared_store import build_store_from_csv
+        build_store_from_csv(csv_paths, directory, chunk_size, models_path)
+        return self.attach_shared_store(directory)
+    
+    def attach_shared_store(self, directory):
+        """Serve from a store built by export_shared_store, without loading the raw data"""
+        from shared_store import SharedStore
+        self.store = SharedStore(directory)
+        self.models = self.store.linear_models()
+        self.data = None
+        self.db = None
+        self._vocabulary = None
+        self._data_version = None
+        self.rollup = None
+        self.history = None
+        return self.store
+    
+    def attach_claims_db(self, db_path):
+        """Serve data queries from a SQLite database built by claims_db.build_claims_db
+        
+        History windows are index range scans and summaries, insights and the
+        rollup cube come from the database's rollup tables; models are loaded or
+        trained separately (train_all_models streams the rows from the database).
+        """
+        from claims_db import ClaimsDatabase
+        self.db = ClaimsDatabase(db_path)
+        self.data = None
+        self.store = None
+        self._vocabulary = None
+        self._data_version = None
+        self.rollup = None
+        self.history = None
+        return self.db
+    
     def prepare_features(self, df):
         """Create time-based features"""
         df = df.copy()
@@ -40,115 +509,420 @@ class ClaimsPredictionModel:
     
     def train_county_model(self, county, claim_type):
         """Train prediction model for specific county and claim type"""
-        # Filter data
-        county_data = self.data[
-            (self.data['county'] == county) & 
-            (self.data['claim_type'] == claim_type)
-        ].copy().sort_values('date')
-        
-        if len(county_data) < 100:
-            return None
-            
-        # Prepare features
-        county_data = self.prepare_features(county_data)
-        
-        # Features for regression
-        feature_cols = ['year', 'month', 'day_of_year', 'weekday', 'is_weekend',
-                       'month_sin', 'month_cos', 'day_sin', 'day_cos']
+        rows = ((self.data['county'] == county) & (self.data['claim_type'] == claim_type)).to_numpy()
+        statistics = RegressionStatistics(1)
+        statistics.update(np.zeros(rows.sum(), dtype=np.int64),
+                          self.data['date'].to_numpy()[rows].astype('datetime64[D]'),
+                          self.data[['claim_count', 'total_cost']].to_numpy(np.float64)[rows])
+        return self._install_model(county, claim_type, statistics, 0)
+    
+    def train_all_models(self, chunk_size=500_000):
+        """Train models for all county-claim type combinations in one pass over the data
         
-        X = county_data[feature_cols]
-        y_count = county_data['claim_count']
-        y_cost = county_data['total_cost']
+        Rows are read chunk_size at a time into per-series sufficient statistics, so
+        no per-series frame is built and memory does not grow with the data.
+        """
+        counties, claim_types = self.get_counties(), self.get_claim_types()
+        statistics = RegressionStatistics(len(counties) * len(claim_types))
+        for chunk in self.iter_coded_chunks(chunk_size):
+            statistics.update(
+                np.asarray(chunk['county'], dtype=np.int64) * len(claim_types)
+                + np.asarray(chunk['claim_type'], dtype=np.int64),
+                np.asarray(chunk['date']).astype('datetime64[D]'),
+                np.column_stack([np.asarray(chunk['claim_count'], dtype=np.float64),
+                                 np.asarray(chunk['total_cost'], dtype=np.float64)]))
         
-        # Train models
-        # Volume prediction
-        count_model = LinearRegression()
-        count_model.fit(X, y_count)
+        return self.train_from_statistics(statistics, counties, claim_types)
+    
+    def train_from_statistics(self, statistics, counties, claim_types):
+        """Solve a model for every series of RegressionStatistics coded as county * len(claim_types) + claim_type"""
+        trained_models = []
+        for i, county in enumerate(counties):
+            for j, claim_type in enumerate(claim_types):
+                model_key = self._install_model(county, claim_type, statistics, i * len(claim_types) + j)
+                if model_key:
+                    trained_models.append(model_key)
         
-        # Cost prediction
-        cost_model = LinearRegression()
-        cost_model.fit(X, y_cost)
+        logger.info("Trained %d models", len(trained_models))
+        return trained_models
+    
+    def _install_model(self, county, claim_type, statistics, series):
+        """Solve one series' statistics into self.models; None if it has too few rows"""
+        if statistics.rows[series] < MIN_TRAINING_ROWS:
+            return None
+        coef, intercept, interval = statistics.solve(series)
+        coef = coef.T.copy()  # contiguous rows, as stored by shared_store
         
         # Store models
         model_key = f"{county}_{claim_type}"
+        self._data_version = None
         self.models[model_key] = {
-            'count_model': count_model,
-            'cost_model': cost_model,
-            'feature_cols': feature_cols,
+            'count_model': LinearCoefficients(coef[0], float(intercept[0])),
+            'cost_model': LinearCoefficients(coef[1], float(intercept[1])),
+            'feature_cols': list(FEATURE_COLS),
             'county': county,
-            'claim_type': claim_type
+            'claim_type': claim_type,
+            'interval': interval
         }
         
         return model_key
     
-    def train_all_models(self):
-        """Train models for all county-claim type combinations"""
-        counties = self.data['county'].unique()
-        claim_types = self.data['claim_type'].unique()
+    def iter_series(self):
+        """Yield (county, claim_type, dates, claim_counts, total_costs) per series, date-sorted"""
+        if self.data is None and self.store is not None:
+            columns = self.store.columns
+            for county in self.store.counties:
+                for claim_type in self.store.claim_types:
+                    start, stop = self.store.series_rows(county, claim_type)
+                    if stop > start:
+                        yield (county, claim_type, np.asarray(columns['date'][start:stop]),
+                               np.asarray(columns['claim_count'][start:stop]),
+                               np.asarray(columns['total_cost'][start:stop]))
+            return
         
-        trained_models = []
-        for county in counties:
-            for claim_type in claim_types:
-                model_key = self.train_county_model(county, claim_type)
-                if model_key:
-                    trained_models.append(model_key)
+        if self.data is None and self.db is not None:
+            for county in self.db.counties:
+                for claim_type in self.db.claim_types:
+                    dates, counts, costs = self.db.series(county, claim_type)
+                    if len(dates):
+                        yield county, claim_type, dates, counts, costs
+            return
         
-        print(f"Trained {len(trained_models)} models")
-        return trained_models
+        for (county, claim_type), group in self.data.sort_values('date').groupby(['county', 'claim_type'], sort=True):
+            yield (county, claim_type, group['date'].to_numpy().astype('datetime64[D]'),
+                   group['claim_count'].to_numpy(), group['total_cost'].to_numpy())
+    
+    def iter_coded_chunks(self, chunk_size=500_000):
+        """coded_columns() in slices of at most chunk_size rows; streamed from the database when attached"""
+        if self.data is None and self.db is not None:
+            yield from self.db.iter_chunks(chunk_size)
+            return
+        columns = self.coded_columns()[1]
+        for lo in range(0, len(columns['date']), chunk_size):
+            yield {name: values[lo:lo + chunk_size] for name, values in columns.items()}
+    
+    def coded_columns(self):
+        """(county_attributes, columns) with county and claim_type as codes into get_counties()/get_claim_types()
+        
+        county_attributes maps area_type/metro to one label per county (None where unknown).
+        """
+        counties, claim_types = self.get_counties(), self.get_claim_types()
+        if self.data is None and self.store is None and self.db is not None:
+            # Every row in memory at once; only the pooled model needs this with a database
+            chunks = list(self.db.iter_chunks())
+            columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]} if chunks else {}
+            return dict(self.db.county_attributes), columns
+        if self.data is None and self.store is not None:
+            # County attributes were resolved when the store was built
+            return dict(self.store.county_attributes), self.store.columns
+        columns = {
+            'date': self.data['date'].to_numpy().astype('datetime64[D]'),
+            'county': pd.Categorical(self.data['county'], categories=counties).codes,
+            'claim_type': pd.Categorical(self.data['claim_type'], categories=claim_types).codes,
+            'claim_count': self.data['claim_count'].to_numpy(),
+            'total_cost': self.data['total_cost'].to_numpy(),
+        }
+        
+        county_attributes = {}
+        for name in COUNTY_ATTRIBUTES:
+            if name not in self.data.columns:
+                continue
+            codes, vocabulary = pd.factorize(self.data[name])
+            # These are county attributes, so any row of a county gives its label
+            per_county = np.full(len(counties), -1)
+            per_county[np.asarray(columns['county'])] = np.asarray(codes)
+            county_attributes[name] = [str(vocabulary[code]) if code >= 0 else None for code in per_county]
+        return county_attributes, columns
+    
+    def train_pooled_model(self, **model_kwargs):
+        """Fit the pooled model over every series in one sparse regression"""
+        county_attributes, columns = self.coded_columns()
+        county_areas = [area or 'unknown' for area in
+                        county_attributes.get('area_type', ['all'] * len(self.get_counties()))]
+        self.pooled_model = PooledRegressionModel(**model_kwargs).fit(
+            self.get_counties(), self.get_claim_types(), county_areas, columns)
+        logger.info("Fitted pooled model over %d series in %.1fs",
+                    int(self.pooled_model.has_rows.sum()), self.pooled_model.fit_seconds)
+        return self.pooled_model
+    
+    def get_history_index(self):
+        """Date-sorted per-series arrays for historical queries, built on first use"""
+        if self.history is None and self.has_data():
+            from history import HistoryIndex
+            if self.data is None and self.db is not None:
+                # Queries go to the (county_id, claim_type_id, date) index
+                self.history = self.db
+            elif self.data is None:
+                # The store is already laid out by (series, date)
+                columns = self.store.columns
+                self.history = HistoryIndex(self.store.counties, self.store.claim_types, columns['date'],
+                                            columns['claim_count'], columns['total_cost'], self.store.series_offsets)
+            else:
+                self.history = HistoryIndex.from_columns(self.get_counties(), self.get_claim_types(),
+                                                         self.coded_columns()[1])
+        return self.history
     
-    def predict_claims(self, county, claim_type, target_date):
-        """Predict claims for specific county, type, and date"""
+    def get_rollup_cube(self):
+        """Rollup cube of the loaded data, built on first use"""
+        if self.rollup is None and self.has_data():
+            from rollup import RollupCube, monthly_rollup, rollup_columns
+            if self.data is None and self.db is not None:
+                county_attributes, rollup = self.db.county_attributes, self.db.rollup_rows()
+            elif self.data is None:
+                # Precomputed when the store was built; the mapped columns are not read
+                county_attributes, rollup = self.store.county_attributes, self.store.rollup_rows()
+            else:
+                county_attributes, columns = self.coded_columns()
+                rollup = rollup_columns(monthly_rollup(columns))
+            self.rollup = RollupCube(self.get_counties(), self.get_claim_types(), county_attributes, *rollup)
+        return self.rollup
+    
+    def train_time_series_engine(self, n_jobs=-1, time_budget=None, **engine_kwargs):
+        """Fit the ARIMA engine for every series; reuses (and warm-starts) an existing engine"""
+        if self.ts_engine is None:
+            self.ts_engine = TimeSeriesEngine(**engine_kwargs)
+        fitted = self.ts_engine.fit(self.iter_series(), n_jobs=n_jobs, time_budget=time_budget)
+        logger.info("Fitted %d time-series models in %.1fs (%d skipped by time budget)",
+                    len(fitted), self.ts_engine.fit_seconds, len(self.ts_engine.skipped))
+        return fitted
+    
+    def save_time_series_engine(self, filepath):
+        """Save the fitted time-series engine"""
+        joblib.dump(self.ts_engine, filepath)
+    
+    def load_time_series_engine(self, filepath):
+        """Load a fitted time-series engine"""
+        self.ts_engine = joblib.load(filepath)
+    
+    def available_engines(self):
+        """Engines that can currently serve predictions"""
+        fitted = {'regression': True, 'arima': self.ts_engine is not None, 'pooled': self.pooled_model is not None}
+        return [engine for engine in ENGINES if fitted[engine]]
+    
+    def predict_claims(self, county, claim_type, target_date, engine='regression'):
+        """Predict claims for specific county, type, and date
+        
+        engine selects 'regression' (per-series linear model), 'arima' (time-series
+        engine) or 'pooled' (PooledRegressionModel); dates outside the ARIMA forecast
+        horizon fall back to regression, and series too short for a regression model
+        are served by the pooled model when it is fitted.
+        """
+        predictions = self.predict_dates(county, claim_type, [target_date], engine, labels=[str(target_date)])
+        return predictions[0] if predictions else None
+    
+    def predict_dates(self, county, claim_type, dates, engine='regression', labels=None):
+        """Predictions with intervals for a sequence of dates, vectorized per engine
+        
+        Dates no engine can serve are left out of the result; labels are the 'date'
+        strings to report (ISO dates by default).
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+        
         # Validate inputs
-        if self.data is not None:
-            valid_counties = self.data['county'].unique()
-            valid_claim_types = self.data['claim_type'].unique()
+        if self.has_data():
+            self._get_vocabulary()
+            valid_counties, valid_claim_types = self._vocabulary[2], self._vocabulary[3]
             
             if county not in valid_counties:
-                return None
+                return []
             if claim_type not in valid_claim_types:
-                return None
+                return []
         
         model_key = f"{county}_{claim_type}"
+        dates = pd.DatetimeIndex(pd.to_datetime(list(dates)))
+        if labels is None:
+            labels = dates.strftime('%Y-%m-%d')
+        results = [None] * len(dates)
+        pending = np.ones(len(dates), dtype=bool)
         
-        if model_key not in self.models:
-            return None
-            
-        model_info = self.models[model_key]
+        def fill(rows, predictions, half_widths, engine):
+            for k, row in enumerate(rows):
+                results[row] = self._format_prediction(
+                    county, claim_type, labels[row], *predictions[k], engine=engine,
+                    half_width=half_widths[k] if half_widths is not None else None)
+            pending[rows] = False
+        
+        if engine == 'arima' and self.ts_engine is not None:
+            for row, target_date in enumerate(dates):
+                forecast = self.ts_engine.predict(model_key, target_date)
+                if forecast is not None:
+                    fill([row], [forecast], None, 'arima')
+        
+        if (engine == 'pooled' or model_key not in self.models) and self.pooled_model is not None and pending.any():
+            rows = np.flatnonzero(pending)
+            forecast = self.pooled_model.predict(county, claim_type, dates[rows].values.astype('datetime64[D]'))
+            if forecast is not None:
+                fill(rows, *forecast, 'pooled')
+        
+        if model_key in self.models and pending.any():
+            rows = np.flatnonzero(pending)
+            forecast = self._horizon_lookup(model_key, dates[rows])
+            if forecast is None:
+                forecast = self._predict_regression(self.models[model_key], dates[rows])
+            fill(rows, *forecast, 'regression')
+        
+        return [result for result in results if result is not None]
+    
+    def predict_counties(self, counties, claim_type, dates, engine='regression'):
+        """{county: predictions} for several counties over the same dates
+        
+        With the regression engine the features are built once and every county's
+        coefficients are applied in one matrix product; other engines, and series
+        without a regression model, go through predict_dates.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(list(dates)))
+        batch = [county for county in counties
+                 if engine == 'regression' and f"{county}_{claim_type}" in self.models]
+        results = {county: self.predict_dates(county, claim_type, dates, engine)
+                   for county in counties if county not in batch}
         
-        # Prepare features for target date
-        date_df = pd.DataFrame({'date': [pd.to_datetime(target_date)]})
-        date_df = self.prepare_features(date_df)
+        if batch:
+            infos = [self.models[f"{county}_{claim_type}"] for county in batch]
+            X = self.prepare_features(pd.DataFrame({'date': dates}))[infos[0]['feature_cols']].to_numpy(np.float64)
+            predictions = np.stack([
+                X @ np.column_stack([info[f'{target}_model'].coef_ for info in infos])
+                + np.array([info[f'{target}_model'].intercept_ for info in infos])
+                for target in ('count', 'cost')
+            ], axis=-1)  # (dates, counties, 2)
+            labels = dates.strftime('%Y-%m-%d')
+            for k, (county, info) in enumerate(zip(batch, infos)):
+                half_widths = _interval_half_width(X, info['interval']) if info.get('interval') else None
+                results[county] = [
+                    self._format_prediction(county, claim_type, labels[i], *predictions[i, k], engine='regression',
+                                            half_width=half_widths[i] if half_widths is not None else None)
+                    for i in range(len(dates))
+                ]
         
+        return {county: results[county] for county in counties}
+    
+    def compare_counties(self, counties, claim_type, start_date, days=7, engine='regression'):
+        """Forecast totals and historical daily averages for several counties side by side
+        
+        Historical figures come from the rollup cube in one grouped query per measure.
+        Raises ValueError for unknown counties or claim types.
+        """
+        dates = pd.date_range(pd.to_datetime(start_date), periods=days, freq='D')
+        predictions = self.predict_counties(counties, claim_type, dates, engine)
+        
+        cube = self.get_rollup_cube()
+        filters = {'county': list(counties), 'claim_type': [claim_type]}
+        history = {}
+        for measure in ('claim_count', 'total_cost'):
+            for stat in ('mean', 'sum'):
+                for group in cube.query(measure, stat, group_by=['county'], filters=filters).get('groups', []):
+                    history.setdefault(group['county'], {})[f'{measure}_{stat}'] = group['value']
+        
+        comparison = []
+        for county in counties:
+            county_predictions = predictions[county]
+            stats = history.get(county, {})
+            forecast_count = sum(p['predicted_count'] for p in county_predictions)
+            forecast_cost = sum(p['predicted_cost'] for p in county_predictions)
+            comparison.append({
+                'county': county,
+                'forecast_count': forecast_count,
+                'forecast_cost': round(forecast_cost, 2),
+                'forecast_avg_cost_per_claim': round(forecast_cost / forecast_count, 2) if forecast_count else 0.0,
+                'historical_daily_count': stats.get('claim_count_mean'),
+                'historical_daily_cost': stats.get('total_cost_mean'),
+                'historical_total_cost': stats.get('total_cost_sum'),
+                'historical_avg_cost_per_claim': (
+                    round(stats['total_cost_sum'] / stats['claim_count_sum'], 2)
+                    if stats.get('claim_count_sum') else None),
+                'predictions': county_predictions
+            })
+        return comparison
+    
+    def build_forecast_horizon(self, start=None, days=365):
+        """Regression forecasts of every series for days [start, start + days) as a ForecastHorizon
+        
+        Features are built once per feature set and each target's coefficients for
+        all series are applied in one matrix product. The result is not installed;
+        assign it to self.horizon to serve predictions from it.
+        """
+        from horizon import ForecastHorizon
+        version = self.data_version()
+        start = pd.Timestamp(start if start is not None else pd.Timestamp.today()).normalize()
+        dates = pd.date_range(start, periods=days, freq='D')
+        date_df = self.prepare_features(pd.DataFrame({'date': dates}))
+        keys = sorted(self.models)
+        predictions = np.empty((len(keys), days, 2))
+        half_widths = np.full((len(keys), days, 2), np.nan)
+        
+        groups = {}
+        for i, model_key in enumerate(keys):
+            groups.setdefault(tuple(self.models[model_key]['feature_cols']), []).append(i)
+        for feature_cols, rows in groups.items():
+            X = date_df[list(feature_cols)].to_numpy(np.float64)
+            infos = [self.models[keys[i]] for i in rows]
+            for t, target in enumerate(('count', 'cost')):
+                coef = np.column_stack([info[f'{target}_model'].coef_ for info in infos])
+                intercept = np.array([info[f'{target}_model'].intercept_ for info in infos])
+                predictions[rows, :, t] = (X @ coef + intercept).T
+            for i, info in zip(rows, infos):
+                if info.get('interval'):
+                    half_widths[i] = _interval_half_width(X, info['interval'])
+        return ForecastHorizon(start, keys, predictions, half_widths, version=version)
+    
+    def _horizon_lookup(self, model_key, dates):
+        """Precomputed regression forecast for the dates, or None if the horizon can't serve them"""
+        horizon = self.horizon
+        if horizon is None or horizon.version != self.data_version():
+            return None
+        return horizon.lookup(model_key, dates.values)
+    
+    def _predict_regression(self, model_info, dates):
+        """(predictions, half_widths or None) of a per-series regression model for many dates"""
+        # Prepare features for all target dates at once
+        date_df = self.prepare_features(pd.DataFrame({'date': dates}))
         X_pred = date_df[model_info['feature_cols']]
         
         # Make predictions
-        count_pred = model_info['count_model'].predict(X_pred)[0]
-        cost_pred = model_info['cost_model'].predict(X_pred)[0]
+        predictions = np.column_stack([model_info['count_model'].predict(X_pred),
+                                       model_info['cost_model'].predict(X_pred)])
         
-        return {
+        # Models saved before intervals were added have no interval terms
+        interval = model_info.get('interval')
+        half_widths = _interval_half_width(X_pred.to_numpy(np.float64), interval) if interval else None
+        return predictions, half_widths
+    
+    def _format_prediction(self, county, claim_type, target_date, count_pred, cost_pred, engine='regression',
+                           half_width=None):
+        prediction = {
             'county': county,
             'claim_type': claim_type,
             'date': str(target_date),  # Convert to string for JSON serialization
             'predicted_count': max(0, int(count_pred)),
             'predicted_cost': max(0, float(cost_pred)),
-            'avg_cost_per_claim': float(cost_pred / max(1, count_pred)) if count_pred > 0 else 0.0
+            'avg_cost_per_claim': float(cost_pred / max(1, count_pred)) if count_pred > 0 else 0.0,
+            'engine': engine,
+            'predicted_count_lower': None,
+            'predicted_count_upper': None,
+            'predicted_cost_lower': None,
+            'predicted_cost_upper': None
         }
+        if half_width is not None:
+            prediction.update({
+                'predicted_count_lower': max(0.0, float(count_pred - half_width[0])),
+                'predicted_count_upper': max(0.0, float(count_pred + half_width[0])),
+                'predicted_cost_lower': max(0.0, float(cost_pred - half_width[1])),
+                'predicted_cost_upper': max(0.0, float(cost_pred + half_width[1]))
+            })
+        return prediction
     
-    def predict_multiple_dates(self, county, claim_type, start_date, days=30):
+    def predict_multiple_dates(self, county, claim_type, start_date, days=30, engine='regression'):
         """Predict claims for multiple future dates"""
-        predictions = []
-        start = pd.to_datetime(start_date)
-        
-        for i in range(days):
-            target_date = start + pd.Timedelta(days=i)
-            pred = self.predict_claims(county, claim_type, target_date.strftime('%Y-%m-%d'))
-            if pred:
-                predictions.append(pred)
-                
-        return predictions
+        dates = pd.date_range(pd.to_datetime(start_date), periods=days, freq='D')
+        return self.predict_dates(county, claim_type, dates, engine)
     
     def get_seasonal_insights(self, county, claim_type):
         """Get seasonal patterns for a county-claim type"""
+        if self.data is None and self.store is not None:
+            return self.store.seasonal_insights(county, claim_type)
+        if self.data is None and self.db is not None:
+            return self.db.seasonal_insights(county, claim_type)
+        
         county_data = self.data[
             (self.data['county'] == county) & 
             (self.data['claim_type'] == claim_type)
@@ -176,6 +950,11 @@ class ClaimsPredictionModel:
     
     def get_county_summary(self, county):
         """Get summary statistics for a county"""
+        if self.data is None and self.store is not None:
+            return self.store.county_summary(county)
+        if self.data is None and self.db is not None:
+            return self.db.county_summary(county)
+        
         county_data = self.data[self.data['county'] == county]
         
         if len(county_data) == 0:
@@ -198,6 +977,7 @@ class ClaimsPredictionModel:
     def load_models(self, filepath):
         """Load trained models"""
         self.models = joblib.load(filepath)
+        self._data_version = None
 
 # Usage example
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+"""
+Fast JSON encoding and pre-encoded response payloads
+Responses are encoded with orjson when it is installed (stdlib json otherwise).
+Payloads that only change with the data or models (vocabularies, county
+summaries, seasonal insights) are encoded to bytes once per data version and
+served as-is by JSONBytesResponse, skipping validation and encoding on every
+later request.
+"""
+
+import json
+import math
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _finite(value):
+    """value with NaN/Infinity floats replaced by None, as orjson encodes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return _finite(value.item())
+    if isinstance(value, np.ndarray):
+        return _finite(value.tolist())
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """JSON bytes for content; numpy values and non-string dict keys are allowed, NaN/Infinity become null"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(_finite(content), default=_default, ensure_ascii=False, separators=(",", ":"),
+                      allow_nan=False).encode()
+
+
+class JSONBytesResponse(Response):
+    """JSON response that sends pre-encoded bytes unchanged and encodes anything else with dumps()"""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+class PayloadCache:
+    """Encoded payloads keyed by name, dropped whenever the data version changes"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.version = None
+        self._payloads = {}
+
+    def get(self, version, key, build):
+        """Encoded build() for key, or None when build() returns nothing"""
+        if version != self.version:
+            self._payloads = {}
+            self.version = version
+        if key in self._payloads:
+            return self._payloads[key]
+        content = build()
+        payload = dumps(content) if content is not None else None
+        # Bounded so requests for arbitrary names cannot grow it without limit; oldest entries go first
+        if len(self._payloads) >= self.max_entries:
+            del self._payloads[next(iter(self._payloads))]
+        self._payloads[key] = payload
+        return payload
+
+    def clear(self):
+        self._payloads = {}
+        self.version = None
@@ -0,0 +1,178 @@
+"""
+Opt-in per-request profiling for the Kansas Claims Predictor API
+When enabled, requests carrying the X-Profile header (or a random sample at
+PROFILE_SAMPLE_RATE) run under cProfile, and the trace is written to
+PROFILE_DIR for inspection through the /admin/profiles endpoints. When
+disabled the middleware is a single flag check.
+
+Environment:
+  PROFILING_ENABLED    "1" to allow profiling (default off)
+  PROFILE_SAMPLE_RATE  fraction of requests profiled without the header (default 0)
+  PROFILE_DIR          directory for .prof traces (default ./profiles)
+  PROFILE_MAX_FILES    newest traces kept on disk (default 100)
+"""
+
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from logging_config import get_logger, request_id_var
+
+PROFILE_HEADER = b"x-profile"
+
+logger = get_logger("profiling")
+
+
+class ProfilingSettings:
+    """Runtime profiling configuration, read from the environment"""
+
+    def __init__(self):
+        self.enabled = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.directory = os.getenv("PROFILE_DIR", "profiles")
+        self.max_files = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+
+settings = ProfilingSettings()
+
+# cProfile hooks the interpreter globally, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+_PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _should_profile(scope):
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_HEADER:
+            return value not in (b"0", b"false")
+    return settings.sample_rate > 0 and random.random() < settings.sample_rate
+
+
+def new_profile_id(scope):
+    """Sortable, filesystem-safe ID for a request's trace"""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-")[:48] or "root"
+    request_id = re.sub(r"[^A-Za-z0-9-]", "", request_id_var.get())[:32] or "-"
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{scope['method']}_{slug}_{request_id}"
+
+
+def save_profile(profile, profile_id, scope, status_code, duration):
+    """Write a trace and its metadata to the profile directory"""
+    os.makedirs(settings.directory, exist_ok=True)
+    profile.dump_stats(os.path.join(settings.directory, f"{profile_id}.prof"))
+    meta = {
+        "id": profile_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "request_id": request_id_var.get(),
+        "status": status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(settings.directory, f"{profile_id}.json"), "w") as f:
+        json.dump(meta, f)
+
+    prune_profiles()
+
+
+def prune_profiles():
+    """Delete the oldest traces beyond PROFILE_MAX_FILES"""
+    profiles = sorted(p for p in os.listdir(settings.directory) if p.endswith(".prof"))
+    for name in profiles[:max(0, len(profiles) - settings.max_files)]:
+        base = os.path.join(settings.directory, name[:-len(".prof")])
+        for ext in (".prof", ".json"):
+            try:
+                os.remove(base + ext)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Metadata for stored traces, newest first"""
+    if not os.path.isdir(settings.directory):
+        return []
+    entries = []
+    for name in sorted(os.listdir(settings.directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(settings.directory, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        prof_path = os.path.join(settings.directory, f"{meta['id']}.prof")
+        if os.path.exists(prof_path):
+            meta["size_bytes"] = os.path.getsize(prof_path)
+            entries.append(meta)
+    return entries
+
+
+def get_profile_path(profile_id):
+    """Path of a stored trace, or None if the ID is unknown or malformed"""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(settings.directory, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def summarize_profile(profile_id, sort="cumulative", limit=40):
+    """Text report of the top functions in a stored trace"""
+    path = get_profile_path(profile_id)
+    if path is None:
+        return None
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running selected requests under cProfile
+
+    The profiler is per-thread, so work from other requests interleaved on the
+    event loop can appear in a trace; sample at low rates in production.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not settings.enabled or scope["type"] != "http" or not _should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not _profile_lock.acquire(blocking=False):
+            # Another request is already being profiled
+            await self.app(scope, receive, send)
+            return
+
+        profile = cProfile.Profile()
+        profile_id = new_profile_id(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profile.disable()
+            duration = time.perf_counter() - start
+            # Writing the trace and pruning the directory is file I/O; keep it off the event loop
+            await asyncio.to_thread(save_profile, profile, profile_id, scope, status["code"], duration)
+            logger.info("Profiled %s %s in %.1f ms -> %s", scope["method"], scope["path"], duration * 1000, profile_id)
+        finally:
+            _profile_lock.release()
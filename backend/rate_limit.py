@@ -0,0 +1,122 @@
+"""
+Daily LLM request quota shared by every worker process
+Usage is counted per UTC day in a small SQLite database. Taking a request is
+one conditional UPSERT, which SQLite applies atomically across processes, so
+workers never exceed the limit; with a database file no Python lock sits on the
+hot path.
+Remaining quota is served from the value seen by the last write or read,
+refreshed at most every `refresh_seconds`.
+
+Environment:
+  LLM_QUOTA_DB   SQLite file holding the counters (default ../models/llm_quota.sqlite)
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_usage (
+    name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (name, day)
+)
+"""
+
+
+def _today():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class DailyQuota:
+    """At most `limit` acquisitions per UTC day, counted in SQLite
+
+    path may be ":memory:" for a quota private to this process (tests, benchmarks).
+    """
+
+    def __init__(self, path, limit, name="groq", refresh_seconds=1.0):
+        self.limit = limit
+        self.name = name
+        self.refresh_seconds = refresh_seconds
+        if path == ":memory:":
+            # Shared-cache memory database, so every thread sees the same counters. Shared-cache
+            # table locks fail at once instead of waiting out the busy timeout, so threads take turns
+            self._target, self._uri = f"file:quota-{uuid.uuid4().hex}?mode=memory&cache=shared", True
+            self._lock = threading.Lock()
+        else:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._target, self._uri = path, False
+            self._lock = contextlib.nullcontext()
+        self._local = threading.local()
+        self._keepalive = self._connect()  # keeps a memory database alive
+        self._keepalive.execute(_SCHEMA)
+        self._cached = (None, 0, 0.0)  # (day, used, read at)
+
+    def _connect(self):
+        connection = sqlite3.connect(self._target, uri=self._uri, timeout=5.0,
+                                     isolation_level=None, check_same_thread=False)
+        if not self._uri:
+            connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def acquire(self):
+        """Take one request from today's quota; False once the limit is reached"""
+        if self.limit <= 0:
+            return False
+        day = _today()
+        connection = self._connection()
+        with self._lock:
+            cursor = connection.execute(
+                "INSERT INTO quota_usage (name, day, used) VALUES (?, ?, 1) "
+                "ON CONFLICT (name, day) DO UPDATE SET used = used + 1 WHERE used < ?",
+                (self.name, day, self.limit)
+            )
+            acquired = cursor.rowcount == 1
+        used = self._read(connection, day)
+        if acquired and used == 1:
+            # First request of a new day: drop older counters
+            with self._lock:
+                connection.execute("DELETE FROM quota_usage WHERE name = ? AND day < ?", (self.name, day))
+        return acquired
+
+    def _read(self, connection, day):
+        with self._lock:
+            row = connection.execute("SELECT used FROM quota_usage WHERE name = ? AND day = ?",
+                                     (self.name, day)).fetchone()
+        used = row[0] if row else 0
+        self._cached = (day, used, time.monotonic())
+        return used
+
+    def used(self):
+        """Requests taken today, as of at most refresh_seconds ago"""
+        day = _today()
+        cached_day, used, read_at = self._cached
+        if cached_day == day and time.monotonic() - read_at < self.refresh_seconds:
+            return used
+        return self._read(self._connection(), day)
+
+    def remaining(self):
+        return max(0, self.limit - self.used())
+
+    def resets_at(self):
+        """Start of the next UTC day, when the quota refills"""
+        tomorrow = datetime.now(timezone.utc).date() + timedelta(days=1)
+        return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=timezone.utc).isoformat()
+
+    def status(self):
+        """Usage summary for API responses"""
+        used = self.used()
+        return {"used": used, "limit": self.limit, "remaining": max(0, self.limit - used),
+                "resets_at": self.resets_at()}
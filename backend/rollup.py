@@ -0,0 +1,181 @@
+"""
+Pre-built rollup cube for aggregate queries
+Claims data is summed once into a dense county x claim_type x year x month
+cube of row counts and measure totals. area_type and metro are county
+attributes, so slicing or grouping by them regroups the county axis. Any
+sum/mean/count query over a slice of those dimensions then reads at most a
+few thousand cells instead of scanning the raw rows.
+
+Every backend feeds the cube the same monthly rollup rows (monthly_rollup):
+the in-memory model computes them from its rows, the shared store and the
+claims database precompute them when they are built.
+"""
+
+import numpy as np
+
+DIMENSIONS = ("county", "claim_type", "year", "month", "area_type", "metro")
+MEASURES = ("claim_count", "total_cost")
+STATS = ("sum", "mean", "count")
+
+# Axis of the cube each dimension lives on
+_AXES = {"county": 0, "claim_type": 1, "year": 2, "month": 3, "area_type": 0, "metro": 0}
+
+# Columns of a monthly rollup table: one row per (county, claim_type, year, month) with data
+ROLLUP_FIELDS = ("county", "claim_type", "year", "month", "rows", "claim_count", "total_cost")
+
+
+def monthly_rollup(columns):
+    """(n, len(ROLLUP_FIELDS)) float table of integer-coded daily rows summed per month and series"""
+    county = np.asarray(columns["county"], dtype=np.int64)
+    if not len(county):
+        return np.zeros((0, len(ROLLUP_FIELDS)))
+    claim_type = np.asarray(columns["claim_type"], dtype=np.int64)
+    months = np.asarray(columns["date"]).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    first_month = int(months.min())
+    shape = (int(county.max()) + 1, int(claim_type.max()) + 1, int(months.max()) - first_month + 1)
+    cells = np.ravel_multi_index((county, claim_type, months - first_month), shape)
+    size = int(np.prod(shape))
+    rows = np.bincount(cells, minlength=size)
+    present = np.flatnonzero(rows)
+    county_ids, type_ids, month_ids = np.unravel_index(present, shape)
+    month_ids = month_ids + first_month
+    sums = [np.bincount(cells, weights=np.asarray(columns[measure], dtype=np.float64), minlength=size)[present]
+            for measure in MEASURES]
+    return np.column_stack([county_ids, type_ids, month_ids // 12 + 1970, month_ids % 12 + 1,
+                            rows[present]] + sums).astype(np.float64)
+
+
+def rollup_columns(table):
+    """(columns, rows) of a monthly rollup table, as RollupCube takes them"""
+    months = (table[:, 2].astype(np.int64) - 1970) * 12 + table[:, 3].astype(np.int64) - 1
+    columns = {
+        "date": months.astype("datetime64[M]").astype("datetime64[D]"),
+        "county": table[:, 0].astype(np.int64),
+        "claim_type": table[:, 1].astype(np.int64),
+        "claim_count": table[:, 5],
+        "total_cost": table[:, 6],
+    }
+    return columns, table[:, 4]
+
+
+class RollupCube:
+    """Dense county x claim_type x year x month cube of row counts and measure sums"""
+
+    def __init__(self, counties, claim_types, county_attributes, columns, rows=None):
+        """columns are integer-coded rows; rows gives the daily records behind each row when
+        they are already aggregated (e.g. monthly rollup rows), one each by default"""
+        dates = np.asarray(columns["date"]).astype("datetime64[D]")
+        years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+        months = dates.astype("datetime64[M]").astype(np.int64) % 12
+        first_year = int(years.min()) if len(years) else 0
+        n_years = int(years.max()) - first_year + 1 if len(years) else 0
+
+        self.labels = {
+            "county": list(counties),
+            "claim_type": list(claim_types),
+            "year": list(range(first_year, first_year + n_years)),
+            "month": list(range(1, 13)),
+        }
+        # Per-county label for each attribute; None where the data has no value
+        self.county_attributes = {name: county_attributes.get(name, [None] * len(counties))
+                                  for name in ("area_type", "metro")}
+
+        shape = (len(counties), len(claim_types), n_years, 12)
+        cells = np.ravel_multi_index(
+            (np.asarray(columns["county"], dtype=np.int64), np.asarray(columns["claim_type"], dtype=np.int64),
+             years - first_year, months), shape)
+        size = int(np.prod(shape))
+        self.rows = np.bincount(cells, weights=rows, minlength=size).reshape(shape)
+        if rows is not None:
+            self.rows = self.rows.astype(np.int64)
+        self.sums = {measure: np.bincount(cells, weights=np.asarray(columns[measure], dtype=np.float64),
+                                          minlength=size).reshape(shape)
+                     for measure in MEASURES}
+
+    def _axis_labels(self, dimension):
+        if dimension in self.county_attributes:
+            return self.county_attributes[dimension]
+        return self.labels[dimension]
+
+    def _mask(self, dimension, values):
+        """Boolean mask over the dimension's axis selecting the given labels"""
+        labels = self._axis_labels(dimension)
+        if dimension in ("year", "month"):
+            values = [int(v) for v in values]
+        unknown = set(values) - set(labels)
+        if unknown:
+            raise ValueError(f"Unknown {dimension}: {', '.join(sorted(map(str, unknown)))}")
+        wanted = set(values)
+        return np.array([label in wanted for label in labels], dtype=bool)
+
+    def query(self, measure="total_cost", stat="sum", group_by=(), filters=None):
+        """Aggregate `measure` over the slice selected by filters, optionally grouped
+
+        filters maps a dimension to the list of labels to keep. Returns the overall
+        value plus one entry per group, largest first. 'mean' is the mean per daily
+        record, 'count' the number of daily records.
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure '{measure}', expected one of {', '.join(MEASURES)}")
+        if stat not in STATS:
+            raise ValueError(f"Unknown stat '{stat}', expected one of {', '.join(STATS)}")
+        for dimension in list(group_by) + list(filters or {}):
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{dimension}', expected one of {', '.join(DIMENSIONS)}")
+
+        masks = [np.ones(n, dtype=bool) for n in self.rows.shape]
+        for dimension, values in (filters or {}).items():
+            if values:
+                masks[_AXES[dimension]] &= self._mask(dimension, values)
+
+        selector = np.ix_(*masks)
+        rows, sums = self.rows[selector], self.sums[measure][selector]
+        kept = [np.flatnonzero(mask) for mask in masks]
+
+        result = {
+            "measure": measure,
+            "stat": stat,
+            "group_by": list(group_by),
+            "filters": {dimension: values for dimension, values in (filters or {}).items() if values},
+            "value": _finish(stat, sums.sum(), rows.sum()),
+            "rows": int(rows.sum()),
+        }
+        if not group_by:
+            return result
+
+        # Give every cell of the slice an integer group code, then sum within groups
+        codes, vocabularies = [], []
+        for dimension in group_by:
+            axis = _AXES[dimension]
+            labels = [self._axis_labels(dimension)[i] for i in kept[axis]]
+            vocabulary = list(dict.fromkeys(labels))
+            index = {label: k for k, label in enumerate(vocabulary)}
+            shape = [1] * rows.ndim
+            shape[axis] = len(labels)
+            axis_codes = np.array([index[label] for label in labels], dtype=np.int64).reshape(shape)
+            codes.append(np.broadcast_to(axis_codes, rows.shape).ravel())
+            vocabularies.append(vocabulary)
+
+        dims = [len(vocabulary) for vocabulary in vocabularies]
+        group_codes = np.ravel_multi_index(codes, dims) if rows.size else np.zeros(0, dtype=np.int64)
+        n_groups = int(np.prod(dims))
+        group_rows = np.bincount(group_codes, weights=rows.ravel(), minlength=n_groups)
+        group_sums = np.bincount(group_codes, weights=sums.ravel(), minlength=n_groups)
+
+        entries = []
+        for group in np.flatnonzero(group_rows):
+            key = np.unravel_index(group, dims)
+            entry = {dimension: vocabulary[k] for dimension, vocabulary, k in zip(group_by, vocabularies, key)}
+            entry["value"] = _finish(stat, group_sums[group], group_rows[group])
+            entry["rows"] = int(group_rows[group])
+            entries.append(entry)
+        result["groups"] = sorted(entries, key=lambda entry: entry["value"], reverse=True)
+        return result
+
+
+def _finish(stat, total, rows):
+    if stat == "count":
+        return int(rows)
+    if stat == "mean":
+        return round(float(total / rows), 2) if rows else None
+    return round(float(total), 2)
@@ -1,24 +1,14 @@
 #!/usr/bin/env python3
 """
 Test runner for Kansas Claims Predictor Backend API
-Runs comprehensive tests and generates detailed reports
+Runs comprehensive tests in-process (no live server needed) and generates detailed reports
 """
 
+import os
 import subprocess
 import sys
-import os
-import time
-import requests
 from datetime import datetime
 
-def check_server_running():
-    """Check if the backend server is running"""
-    try:
-        response = requests.get("http://localhost:3001/", timeout=5)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
-
 def install_test_dependencies():
     """Install test dependencies"""
     print("Installing test dependencies...")
@@ -37,7 +27,7 @@ def run_tests():
     # Test command with various output formats
     cmd = [
         sys.executable, "-m", "pytest", 
-        "test_backend.py",
+        os.path.dirname(os.path.abspath(__file__)),  # every test_*.py module in the backend
         "-v",  # Verbose output
         "--tb=short",  # Short traceback format
         f"--html=test_report_{timestamp}.html",  # HTML report
@@ -61,21 +51,6 @@ def main():
     print("Kansas Claims Predictor Backend API Test Suite")
     print("=" * 50)
     
-    # Check if server is running
-    if not check_server_running():
-        print("WARNING: Backend server is not running!")
-        print("Please start the server first:")
-        print("  cd backend")
-        print("  python main.py")
-        print("\nWaiting 10 seconds for server to start...")
-        time.sleep(10)
-        
-        if not check_server_running():
-            print("ERROR: Server still not available. Please start the backend server manually.")
-            return False
-    
-    print("SUCCESS: Backend server is running")
-    
     # Install dependencies
     if not install_test_dependencies():
         return False
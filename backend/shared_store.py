@@ -0,0 +1,557 @@
+"""
+Shared, memory-mapped model and data store for multi-worker deployments
+One loader process writes the claims data as columnar .npy files sorted by
+series and date, together with the model coefficient tables and precomputed
+aggregates. Every worker maps the same files read-only, so the operating
+system shares the pages between processes and adding workers adds neither
+data memory nor startup time.
+
+Layout of a store directory:
+  meta.json                vocabularies, county attributes, source fingerprint, version
+  columns/<name>.npy       one array per column, rows sorted by (series, date)
+  series_offsets.npy       rows of series i are [offsets[i], offsets[i + 1])
+  coef_<target>.npy        (n_series, n_features) regression coefficients
+  intercept_<target>.npy   (n_series,) intercepts
+  has_model.npy            (n_series,) True where a model was trained
+  interval_<name>.npy      prediction interval terms (feature means, centred (X'X)^-1,
+                           residual variance, n_obs, t_crit); has_interval marks them
+  monthly_means.npy        (n_series, 12, 2) mean claim_count / total_cost by month
+  dow_means.npy            (n_series, 7, 2) mean claim_count / total_cost by weekday
+  summary_stats.npy        (n_series, 6) sum/mean/std of claim_count and total_cost
+  monthly_rollup.npy       rows of rollup.ROLLUP_FIELDS, the input of the aggregate cube
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from rollup import ROLLUP_FIELDS, monthly_rollup, rollup_columns
+
+STORE_FORMAT_VERSION = 3
+
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+TARGETS = ("count", "cost")
+MEASURES = ("claim_count", "total_cost")
+INTERVAL_TERMS = ("feature_means", "xtx_inv", "residual_var", "n_obs", "t_crit")
+AGGREGATE_FILES = ("monthly_means.npy", "dow_means.npy", "summary_stats.npy")
+SUMMARY_COLUMNS = ("claim_count_sum", "claim_count_mean", "claim_count_std",
+                   "total_cost_sum", "total_cost_mean", "total_cost_std")
+
+# Minimum rows for seasonal insights, matching ClaimsPredictionModel.get_seasonal_insights
+MIN_INSIGHT_ROWS = 365
+
+# Row-level columns that are really attributes of the county
+COUNTY_ATTRIBUTES = ('area_type', 'metro')
+
+
+def file_fingerprint(path):
+    """Size and modification time of a file (a list for several files), or None if it does not exist"""
+    if isinstance(path, (list, tuple)):
+        return [file_fingerprint(p) for p in path]
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _encode(values):
+    """Factorize a column into (int codes, sorted vocabulary); None/NaN becomes -1"""
+    import pandas as pd
+    codes, uniques = pd.factorize(values, sort=True)
+    dtype = np.int16 if len(uniques) < 2 ** 15 else np.int32
+    return codes.astype(dtype), [str(u) for u in uniques]
+
+
+def _series_std(values, series_codes, means, counts):
+    """Sample standard deviation (ddof=1) of each series, two-pass for accuracy"""
+    deviations = values - means[series_codes]
+    sq_sums = np.bincount(series_codes, weights=deviations ** 2, minlength=len(counts))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(sq_sums / (counts - 1))
+    std[counts < 2] = np.nan
+    return std
+
+
+def build_store(predictor, directory, source_path=None, models_path=None):
+    """Write predictor's data, models and aggregates to directory; returns the store version"""
+    data = predictor.data
+    if data is None:
+        raise ValueError("Predictor has no data loaded")
+
+    county_codes, counties = _encode(data['county'].to_numpy())
+    type_codes, claim_types = _encode(data['claim_type'].to_numpy())
+
+    # Sort rows by (series, date) so each series is one contiguous, date-ordered slice
+    series_codes = county_codes.astype(np.int64) * len(claim_types) + type_codes
+    dates = data['date'].to_numpy().astype('datetime64[D]')
+    order = np.lexsort((dates, series_codes))
+    series_codes = series_codes[order]
+
+    n_series = len(counties) * len(claim_types)
+    counts = np.bincount(series_codes, minlength=n_series)
+    offsets = np.zeros(n_series + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    columns = {
+        'date': dates[order],
+        'county': county_codes[order],
+        'claim_type': type_codes[order].astype(np.int8),
+        'claim_count': data['claim_count'].to_numpy(np.int64)[order],
+        'total_cost': data['total_cost'].to_numpy(np.float64)[order],
+    }
+    vocabularies = {'county': counties, 'claim_type': claim_types}
+    for name in ('area_type', 'metro'):
+        if name in data.columns:
+            columns[name], vocabularies[name] = _encode(data[name].to_numpy())
+            columns[name] = columns[name][order]
+    if 'population' in data.columns:
+        columns['population'] = data['population'].to_numpy(np.int64)[order]
+    if 'avg_cost_per_claim' in data.columns:
+        columns['avg_cost_per_claim'] = data['avg_cost_per_claim'].to_numpy(np.float64)[order]
+
+    tmp_dir = _new_store_dir(directory)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, "columns", f"{name}.npy"), values)
+    np.save(os.path.join(tmp_dir, "series_offsets.npy"), offsets)
+
+    _write_aggregates(tmp_dir, columns, series_codes, counts, n_series)
+    np.save(os.path.join(tmp_dir, "monthly_rollup.npy"), monthly_rollup(columns))
+    attribute_codes = _new_attribute_codes(columns, len(counties))
+    _update_attribute_codes(attribute_codes, columns)
+    feature_cols = _write_coefficients(tmp_dir, predictor.models, counties, claim_types)
+    return _publish_store(tmp_dir, directory, source_path, models_path, len(data), len(predictor.models),
+                          vocabularies, _county_attributes(attribute_codes, vocabularies), feature_cols,
+                          {name: values.dtype for name, values in columns.items()})
+
+
+def build_store_from_csv(paths, directory, chunk_size=500_000, models_path=None):
+    """Stream one or more CSV files into a store, out of core; returns the store version
+
+    Produces the same store as build_store without ever holding the whole
+    dataset: a first pass over the files collects vocabularies and rows per
+    series, a second scatters each chunk into memory-mapped columns at its
+    series' write cursor, and a last pass over blocks of whole series sorts
+    them by date and computes the aggregates and regression statistics.
+    Models come from models_path if it exists; otherwise they are trained from
+    those statistics and saved there. Memory is bounded by chunk_size rows
+    (or the largest single series, if that is bigger).
+    """
+    import joblib
+    import pandas as pd
+    from ml_models import ClaimsPredictionModel, RegressionStatistics
+
+    source_path = paths
+    paths = [paths] if isinstance(paths, str) else list(paths)
+
+    def chunks(usecols=None):
+        for path in paths:
+            yield from pd.read_csv(path, usecols=usecols, chunksize=chunk_size)
+
+    header = list(pd.read_csv(paths[0], nrows=0).columns)
+    categorical = ['county', 'claim_type'] + [name for name in ('area_type', 'metro') if name in header]
+
+    # Pass 1: vocabularies and rows per (county, claim_type)
+    labels = {name: set() for name in categorical}
+    pair_counts = {}
+    for chunk in chunks(categorical):
+        for name in categorical:
+            labels[name].update(str(label) for label in chunk[name].dropna().unique())
+        for pair, count in chunk.groupby(['county', 'claim_type']).size().items():
+            pair_counts[pair] = pair_counts.get(pair, 0) + count
+    vocabularies = {name: sorted(labels[name]) for name in categorical}
+    counties, claim_types = vocabularies['county'], vocabularies['claim_type']
+    n_series = len(counties) * len(claim_types)
+    county_index = {county: i for i, county in enumerate(counties)}
+    type_index = {claim_type: j for j, claim_type in enumerate(claim_types)}
+    counts = np.zeros(n_series, dtype=np.int64)
+    for (county, claim_type), count in pair_counts.items():
+        counts[county_index[county] * len(claim_types) + type_index[claim_type]] = count
+    offsets = np.zeros(n_series + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    n_rows = int(offsets[-1])
+
+    dtypes = {'date': np.dtype('datetime64[D]'),
+              'county': np.dtype(np.int16 if len(counties) < 2 ** 15 else np.int32),
+              'claim_type': np.dtype(np.int8),
+              'claim_count': np.dtype(np.int64),
+              'total_cost': np.dtype(np.float64)}
+    for name in ('area_type', 'metro'):
+        if name in vocabularies:
+            dtypes[name] = np.dtype(np.int16 if len(vocabularies[name]) < 2 ** 15 else np.int32)
+    if 'population' in header:
+        dtypes['population'] = np.dtype(np.int64)
+    if 'avg_cost_per_claim' in header:
+        dtypes['avg_cost_per_claim'] = np.dtype(np.float64)
+
+    tmp_dir = _new_store_dir(directory)
+    columns = {name: np.lib.format.open_memmap(os.path.join(tmp_dir, "columns", f"{name}.npy"),
+                                               mode="w+", dtype=dtype, shape=(n_rows,))
+               for name, dtype in dtypes.items()}
+    np.save(os.path.join(tmp_dir, "series_offsets.npy"), offsets)
+
+    # Pass 2: scatter every chunk's rows to their series' next free slots
+    cursors = offsets[:-1].copy()
+    for chunk in chunks(list(dtypes)):
+        # Missing labels become "nan", which is not in the vocabulary: code -1 as in _encode
+        codes = {name: pd.Categorical(chunk[name].astype(str), categories=vocabularies[name]).codes
+                 for name in categorical}
+        series = codes['county'].astype(np.int64) * len(claim_types) + codes['claim_type']
+        order = np.argsort(series, kind='stable')
+        ordered = series[order]
+        rank = np.arange(len(ordered)) - np.searchsorted(ordered, ordered, side='left')
+        positions = cursors[ordered] + rank
+        cursors += np.bincount(series, minlength=n_series)
+        for name, column in columns.items():
+            if name in codes:
+                values = codes[name]
+            elif name == 'date':
+                values = pd.to_datetime(chunk['date']).to_numpy().astype('datetime64[D]')
+            else:
+                values = chunk[name].to_numpy(dtypes[name])
+            column[positions] = values[order]
+
+    # Pass 3: blocks of whole series; date-sort them, then aggregate and accumulate statistics
+    aggregates = [np.full((n_series, 12, 2), np.nan), np.full((n_series, 7, 2), np.nan),
+                  np.full((n_series, len(SUMMARY_COLUMNS)), np.nan)]
+    rollups = []
+    attribute_codes = _new_attribute_codes(columns, len(counties))
+    statistics = RegressionStatistics(n_series)
+    first = 0
+    while first < n_series:
+        last = first + 1
+        while last < n_series and offsets[last + 1] - offsets[first] <= chunk_size:
+            last += 1
+        rows = slice(int(offsets[first]), int(offsets[last]))
+        series_codes = np.repeat(np.arange(first, last), counts[first:last])
+        order = np.lexsort((columns['date'][rows], series_codes))
+        block = {}
+        for name, column in columns.items():
+            block[name] = column[rows][order]
+            column[rows] = block[name]
+        block_counts = np.bincount(series_codes, minlength=n_series)
+        present = block_counts > 0
+        for table, values in zip(aggregates, _series_aggregates(block, series_codes, block_counts, n_series)):
+            table[present] = values[present]
+        # Blocks hold whole series, so their monthly rollup rows never overlap
+        rollups.append(monthly_rollup(block))
+        _update_attribute_codes(attribute_codes, block)
+        statistics.update(series_codes, block['date'],
+                          np.column_stack([block['claim_count'].astype(np.float64), block['total_cost']]))
+        first = last
+    for column in columns.values():
+        column.flush()
+    del columns
+    for name, table in zip(AGGREGATE_FILES, aggregates):
+        np.save(os.path.join(tmp_dir, name), table)
+    np.save(os.path.join(tmp_dir, "monthly_rollup.npy"), np.concatenate(rollups) if rollups else np.zeros((0, len(ROLLUP_FIELDS))))
+
+    if models_path and os.path.exists(models_path):
+        models = joblib.load(models_path)
+    else:
+        trainer = ClaimsPredictionModel()
+        trainer.train_from_statistics(statistics, counties, claim_types)
+        models = trainer.models
+        if models_path:
+            joblib.dump(models, models_path)
+    feature_cols = _write_coefficients(tmp_dir, models, counties, claim_types)
+    return _publish_store(tmp_dir, directory, source_path, models_path, n_rows, len(models), vocabularies,
+                          _county_attributes(attribute_codes, vocabularies), feature_cols, dtypes)
+
+
+def _new_store_dir(directory):
+    """Empty staging directory next to directory, published by _publish_store"""
+    tmp_dir = f"{directory.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, "columns"))
+    return tmp_dir
+
+
+def _publish_store(tmp_dir, directory, source_path, models_path, n_rows, n_models, vocabularies,
+                   county_attributes, feature_cols, dtypes):
+    """Write meta.json and swap the staged store in; returns its version"""
+    source = file_fingerprint(source_path)
+    models_source = file_fingerprint(models_path)
+    version = hashlib.sha1(json.dumps([source, models_source, n_rows, n_models,
+                                       time.time()]).encode()).hexdigest()[:16]
+    meta = {
+        "format_version": STORE_FORMAT_VERSION,
+        "version": version,
+        "created": time.time(),
+        "source": source,
+        "models_source": models_source,
+        "n_rows": int(n_rows),
+        "counties": vocabularies['county'],
+        "claim_types": vocabularies['claim_type'],
+        "vocabularies": vocabularies,
+        "county_attributes": county_attributes,
+        "feature_cols": feature_cols,
+        "columns": {name: str(dtype) for name, dtype in dtypes.items()},
+    }
+    # meta.json is written last; its presence marks a complete store
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    # Swap the new store in; workers still mapping the old files keep their (unlinked) inodes
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_dir, directory)
+    return version
+
+
+def _new_attribute_codes(columns, n_counties):
+    """Per-county code of each county attribute column, -1 until seen"""
+    return {name: np.full(n_counties, -1) for name in COUNTY_ATTRIBUTES if name in columns}
+
+
+def _update_attribute_codes(attribute_codes, columns):
+    """Take each county's attribute codes from some of its rows (any row of a county will do)"""
+    for name, codes in attribute_codes.items():
+        codes[np.asarray(columns['county'])] = np.asarray(columns[name])
+
+
+def _county_attributes(attribute_codes, vocabularies):
+    """County attribute labels per county, None where unknown"""
+    return {name: [vocabularies[name][code] if code >= 0 else None for code in codes.tolist()]
+            for name, codes in attribute_codes.items()}
+
+
+def _write_aggregates(tmp_dir, columns, series_codes, counts, n_series):
+    for name, table in zip(AGGREGATE_FILES, _series_aggregates(columns, series_codes, counts, n_series)):
+        np.save(os.path.join(tmp_dir, name), table)
+
+
+def _series_aggregates(columns, series_codes, counts, n_series):
+    """(monthly_means, dow_means, summary_stats) of the series present in columns"""
+    days = columns['date'].astype(np.int64)
+    months = columns['date'].astype('datetime64[M]').astype(np.int64) % 12
+    weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday
+
+    monthly = np.full((n_series, 12, 2), np.nan)
+    dow = np.full((n_series, 7, 2), np.nan)
+    month_keys = series_codes * 12 + months
+    dow_keys = series_codes * 7 + weekdays
+    month_counts = np.bincount(month_keys, minlength=n_series * 12).reshape(n_series, 12)
+    dow_counts = np.bincount(dow_keys, minlength=n_series * 7).reshape(n_series, 7)
+
+    summary = np.full((n_series, len(SUMMARY_COLUMNS)), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i, measure in enumerate(MEASURES):
+            values = columns[measure].astype(np.float64)
+            monthly[:, :, i] = np.bincount(month_keys, weights=values, minlength=n_series * 12).reshape(n_series, 12) / month_counts
+            dow[:, :, i] = np.bincount(dow_keys, weights=values, minlength=n_series * 7).reshape(n_series, 7) / dow_counts
+
+            sums = np.bincount(series_codes, weights=values, minlength=n_series)
+            means = sums / counts
+            summary[:, i * 3] = sums
+            summary[:, i * 3 + 1] = means
+            summary[:, i * 3 + 2] = _series_std(values, series_codes, means, counts)
+
+    return monthly, dow, summary
+
+
+def _write_coefficients(tmp_dir, models, counties, claim_types):
+    feature_cols = next(iter(models.values()))['feature_cols'] if models else []
+    n_series = len(counties) * len(claim_types)
+    has_model = np.zeros(n_series, dtype=bool)
+    coefs = {target: np.zeros((n_series, len(feature_cols))) for target in TARGETS}
+    intercepts = {target: np.zeros(n_series) for target in TARGETS}
+    n_features = len(feature_cols)
+    intervals = dict(zip(INTERVAL_TERMS, (
+        np.zeros((n_series, n_features)),
+        np.zeros((n_series, n_features, n_features)),
+        np.zeros((n_series, len(TARGETS))),
+        np.zeros(n_series, dtype=np.int64),
+        np.zeros(n_series),
+    )))
+    has_interval = np.zeros(n_series, dtype=bool)
+
+    type_index = {claim_type: i for i, claim_type in enumerate(claim_types)}
+    for i, county in enumerate(counties):
+        for claim_type, j in type_index.items():
+            model_info = models.get(f"{county}_{claim_type}")
+            if model_info is None:
+                continue
+            series = i * len(claim_types) + j
+            has_model[series] = True
+            for target in TARGETS:
+                model = model_info[f'{target}_model']
+                coefs[target][series] = model.coef_
+                intercepts[target][series] = model.intercept_
+            interval = model_info.get('interval')
+            if interval is not None:
+                has_interval[series] = True
+                for name, table in intervals.items():
+                    table[series] = interval[name]
+
+    np.save(os.path.join(tmp_dir, "has_model.npy"), has_model)
+    for target in TARGETS:
+        np.save(os.path.join(tmp_dir, f"coef_{target}.npy"), coefs[target])
+        np.save(os.path.join(tmp_dir, f"intercept_{target}.npy"), intercepts[target])
+    np.save(os.path.join(tmp_dir, "has_interval.npy"), has_interval)
+    for name, table in intervals.items():
+        np.save(os.path.join(tmp_dir, f"interval_{name}.npy"), table)
+    return feature_cols
+
+
+class SharedStore:
+    """Read-only view of a store directory; all arrays are memory-mapped"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format in {directory}")
+
+        self.version = self.meta["version"]
+        self.counties = self.meta["counties"]
+        self.claim_types = self.meta["claim_types"]
+        self.feature_cols = self.meta["feature_cols"]
+        self._county_index = {county: i for i, county in enumerate(self.counties)}
+        self._type_index = {claim_type: i for i, claim_type in enumerate(self.claim_types)}
+
+        self.columns = {name: self._load(os.path.join("columns", f"{name}.npy")) for name in self.meta["columns"]}
+        self.series_offsets = self._load("series_offsets.npy")
+        self.has_model = self._load("has_model.npy")
+        self.coefficients = {target: self._load(f"coef_{target}.npy") for target in TARGETS}
+        self.intercepts = {target: self._load(f"intercept_{target}.npy") for target in TARGETS}
+        self.has_interval = self._load("has_interval.npy")
+        self.intervals = {name: self._load(f"interval_{name}.npy") for name in INTERVAL_TERMS}
+        self.monthly_means = self._load("monthly_means.npy")
+        self.dow_means = self._load("dow_means.npy")
+        self.summary_stats = self._load("summary_stats.npy")
+        self.monthly_rollup = self._load("monthly_rollup.npy")
+        self.county_attributes = self.meta["county_attributes"]
+
+    def _load(self, name):
+        return np.load(os.path.join(self.directory, name), mmap_mode="r")
+
+    def rollup_rows(self):
+        """(columns, rows) of the monthly rollup built with the store, for RollupCube"""
+        return rollup_columns(np.asarray(self.monthly_rollup))
+
+    def series_index(self, county, claim_type):
+        """Row of the coefficient/aggregate tables for a series, or None"""
+        i = self._county_index.get(county)
+        j = self._type_index.get(claim_type)
+        if i is None or j is None:
+            return None
+        return i * len(self.claim_types) + j
+
+    def series_rows(self, county, claim_type):
+        """(start, stop) slice of the column arrays holding one series"""
+        series = self.series_index(county, claim_type)
+        if series is None:
+            return 0, 0
+        return int(self.series_offsets[series]), int(self.series_offsets[series + 1])
+
+    def linear_models(self):
+        """Model dict in ClaimsPredictionModel.models format, backed by the coefficient tables"""
+        from ml_models import LinearCoefficients
+        models = {}
+        for county in self.counties:
+            for claim_type in self.claim_types:
+                series = self.series_index(county, claim_type)
+                if not self.has_model[series]:
+                    continue
+                entry = {
+                    f'{target}_model': LinearCoefficients(self.coefficients[target][series],
+                                                          float(self.intercepts[target][series]))
+                    for target in TARGETS
+                }
+                entry.update({'feature_cols': self.feature_cols, 'county': county, 'claim_type': claim_type})
+                if self.has_interval[series]:
+                    entry['interval'] = {name: table[series] for name, table in self.intervals.items()}
+                models[f"{county}_{claim_type}"] = entry
+        return models
+
+    def seasonal_insights(self, county, claim_type):
+        """Same structure as ClaimsPredictionModel.get_seasonal_insights"""
+        series = self.series_index(county, claim_type)
+        if series is None:
+            return None
+        start, stop = self.series_rows(county, claim_type)
+        if stop - start < MIN_INSIGHT_ROWS:
+            return None
+
+        def to_dict(table, first_key):
+            return {
+                measure: {first_key + k: round(float(v), 2) for k, v in enumerate(table[series, :, i]) if not np.isnan(v)}
+                for i, measure in enumerate(MEASURES)
+            }
+
+        return {
+            'monthly_patterns': to_dict(self.monthly_means, 1),
+            'day_of_week_patterns': to_dict(self.dow_means, 0)
+        }
+
+    def county_summary(self, county):
+        """Same structure as ClaimsPredictionModel.get_county_summary"""
+        summary = {}
+        for claim_type in self.claim_types:
+            series = self.series_index(county, claim_type)
+            if series is None or self.series_offsets[series + 1] == self.series_offsets[series]:
+                continue
+            row = {}
+            for name, value in zip(SUMMARY_COLUMNS, self.summary_stats[series]):
+                value = round(float(value), 2)
+                row[name] = int(value) if name == "claim_count_sum" else value
+            summary[claim_type] = row
+        return summary
+
+
+def is_store_current(directory, source_path=None, models_path=None):
+    """True if directory holds a complete store built from the given source files"""
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("format_version") != STORE_FORMAT_VERSION:
+        return False
+    if source_path and meta.get("source") != file_fingerprint(source_path):
+        return False
+    if models_path and meta.get("models_source") != file_fingerprint(models_path):
+        return False
+    return True
+
+
+@contextmanager
+def store_lock(directory):
+    """Exclusive cross-process lock next to the store directory"""
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    lock_path = os.path.join(parent, f"{os.path.basename(os.path.abspath(directory))}{LOCK_FILE}")
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_store(directory, build, source_path=None, models_path=None):
+    """Make sure a current store exists, letting exactly one process build it
+
+    build() must populate the store directory; it runs under an exclusive file
+    lock so concurrent workers wait for the first one and then just attach.
+    Returns True if this process built the store.
+    """
+    if is_store_current(directory, source_path, models_path):
+        return False
+    with store_lock(directory):
+        if is_store_current(directory, source_path, models_path):
+            return False
+        build()
+        return True
@@ -0,0 +1,57 @@
+"""
+Local stand-in for the Groq chat completions API
+Serves POST /openai/v1/chat/completions with a fixed reply, optional latency
+and a configurable error rate, so the chat endpoint and its timeout, retry and
+circuit-breaker behaviour can be exercised without network access.
+
+Usage:
+  STUB_LLM_LATENCY=0.5 STUB_LLM_ERROR_RATE=0.2 uvicorn stub_llm:app --port 8010
+  GROQ_BASE_URL=http://localhost:8010 uvicorn main:app --port 3001
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+DEFAULT_REPLY = "## Claims Prediction\n\n**Predicted Volume:** see the data provided."
+
+
+def create_app(reply=DEFAULT_REPLY, latency=0.0, error_rate=0.0):
+    """Stub API app; settings can be changed on app.state while it runs"""
+    app = FastAPI(title="Stub LLM")
+    app.state.reply = reply
+    app.state.latency = latency
+    app.state.error_rate = error_rate
+    app.state.requests = 0
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(body: dict):
+        app.state.requests += 1
+        if app.state.latency:
+            await asyncio.sleep(app.state.latency)
+        if app.state.error_rate and random.random() < app.state.error_rate:
+            return JSONResponse({"error": {"message": "stub upstream error", "type": "server_error"}},
+                                status_code=503)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": app.state.reply}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+app = create_app(
+    reply=os.getenv("STUB_LLM_REPLY", DEFAULT_REPLY),
+    latency=float(os.getenv("STUB_LLM_LATENCY", "0")),
+    error_rate=float(os.getenv("STUB_LLM_ERROR_RATE", "0")),
+)
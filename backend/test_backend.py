@@ -1,48 +1,20 @@
 import pytest
-import requests
 import json
 from datetime import datetime, timedelta
-import time
-
-# Configuration
-BASE_URL = "http://localhost:3001"
-TIMEOUT = 30
 
 class TestKansasClaimsAPI:
     """Comprehensive test suite for Kansas Claims Predictor API"""
     
-    @classmethod
-    def setup_class(cls):
-        """Setup test environment"""
-        print("Setting up test environment...")
-        # Wait for server to be ready
-        cls.wait_for_server()
-        
-    @classmethod
-    def wait_for_server(cls, max_attempts=10):
-        """Wait for server to be available"""
-        for attempt in range(max_attempts):
-            try:
-                response = requests.get(f"{BASE_URL}/", timeout=5)
-                if response.status_code == 200:
-                    print("Server is ready!")
-                    return
-            except requests.exceptions.RequestException:
-                pass
-            print(f"Waiting for server... (attempt {attempt + 1}/{max_attempts})")
-            time.sleep(2)
-        raise Exception("Server not available after maximum attempts")
-
-    def test_server_health(self):
+    def test_server_health(self, client):
         """Test basic server connectivity"""
-        response = requests.get(f"{BASE_URL}/")
+        response = client.get("/")
         assert response.status_code == 200
         data = response.json()
         assert "message" in data
 
-    def test_get_counties(self):
+    def test_get_counties(self, client):
         """Test counties endpoint"""
-        response = requests.get(f"{BASE_URL}/counties")
+        response = client.get("/counties")
         assert response.status_code == 200
         data = response.json()
         assert "counties" in data
@@ -54,9 +26,9 @@ class TestKansasClaimsAPI:
         assert "Sedgwick" in counties
         assert "Shawnee" in counties
 
-    def test_get_claim_types(self):
+    def test_get_claim_types(self, client):
         """Test claim types endpoint"""
-        response = requests.get(f"{BASE_URL}/claim-types")
+        response = client.get("/claim-types")
         assert response.status_code == 200
         data = response.json()
         assert "claim_types" in data
@@ -68,7 +40,7 @@ class TestKansasClaimsAPI:
             assert claim_type in claim_types
 
     # Volume Predictions Tests
-    def test_volume_prediction_emergency_johnson(self):
+    def test_volume_prediction_emergency_johnson(self, client):
         """Test: Predict emergency claims for Johnson County next week"""
         next_week = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
         
@@ -78,7 +50,7 @@ class TestKansasClaimsAPI:
             "target_date": next_week
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         assert response.status_code == 200
         
         data = response.json()
@@ -89,7 +61,7 @@ class TestKansasClaimsAPI:
         assert data["avg_cost_per_claim"] >= 0
         print(f"Johnson County emergency prediction: {data['predicted_count']} claims, ${data['predicted_cost']:,.2f}")
 
-    def test_volume_prediction_pharmacy_wichita(self):
+    def test_volume_prediction_pharmacy_wichita(self, client):
         """Test: How many pharmacy claims will Wichita have in January?"""
         january_date = "2025-01-15"  # Mid-January
         
@@ -99,7 +71,7 @@ class TestKansasClaimsAPI:
             "target_date": january_date
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         assert response.status_code == 200
         
         data = response.json()
@@ -108,9 +80,9 @@ class TestKansasClaimsAPI:
         assert data["predicted_count"] >= 0
         print(f"Wichita pharmacy prediction for January: {data['predicted_count']} claims")
 
-    def test_mental_health_trend_topeka(self):
+    def test_mental_health_trend_topeka(self, client):
         """Test: Show mental health claims trend for Topeka"""
-        response = requests.get(f"{BASE_URL}/predict-range/Shawnee/mental_health?days=30")
+        response = client.get("/predict-range/Shawnee/mental_health?days=30")
         assert response.status_code == 200
         
         data = response.json()
@@ -129,9 +101,9 @@ class TestKansasClaimsAPI:
         print(f"Topeka mental health trend: {len(predictions)} days of predictions")
 
     # Cost Analysis Tests
-    def test_average_cost_per_claim_sedgwick(self):
+    def test_average_cost_per_claim_sedgwick(self, client):
         """Test: What's the average cost per claim in Sedgwick County?"""
-        response = requests.get(f"{BASE_URL}/summary/Sedgwick")
+        response = client.get("/summary/Sedgwick")
         assert response.status_code == 200
         
         data = response.json()
@@ -143,15 +115,15 @@ class TestKansasClaimsAPI:
         assert len(summary) > 0
         print(f"Sedgwick County summary includes {len(summary)} claim types")
 
-    def test_claim_cost_comparison_urban_rural(self):
+    def test_claim_cost_comparison_urban_rural(self, client):
         """Test: Compare claim costs between urban and rural areas"""
         # Test urban county (Johnson)
-        urban_response = requests.get(f"{BASE_URL}/summary/Johnson")
+        urban_response = client.get("/summary/Johnson")
         assert urban_response.status_code == 200
         urban_data = urban_response.json()
         
         # Test rural county (Ford)
-        rural_response = requests.get(f"{BASE_URL}/summary/Ford")
+        rural_response = client.get("/summary/Ford")
         assert rural_response.status_code == 200
         rural_data = rural_response.json()
         
@@ -162,7 +134,7 @@ class TestKansasClaimsAPI:
         
         print(f"Urban vs Rural comparison: Johnson vs Ford counties analyzed")
 
-    def test_predict_total_healthcare_spending_q1(self):
+    def test_predict_total_healthcare_spending_q1(self, client):
         """Test: Predict total healthcare spending for Kansas in Q1"""
         # Test multiple counties and claim types for Q1 prediction
         q1_date = "2025-03-15"  # Mid Q1
@@ -179,7 +151,7 @@ class TestKansasClaimsAPI:
                     "target_date": q1_date
                 }
                 
-                response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+                response = client.post("/predict", json=payload)
                 if response.status_code == 200:
                     data = response.json()
                     total_predictions.append(data["predicted_cost"])
@@ -189,9 +161,9 @@ class TestKansasClaimsAPI:
         print(f"Q1 healthcare spending prediction (sample): ${total_cost:,.2f}")
 
     # Seasonal Patterns Tests
-    def test_flu_season_effect_johnson(self):
+    def test_flu_season_effect_johnson(self, client):
         """Test: How does flu season affect claims in Johnson County?"""
-        response = requests.get(f"{BASE_URL}/insights/Johnson/emergency")
+        response = client.get("/insights/Johnson/emergency")
         assert response.status_code == 200
         
         data = response.json()
@@ -207,13 +179,13 @@ class TestKansasClaimsAPI:
         assert "claim_count" in monthly_patterns
         print(f"Johnson County seasonal insights available for emergency claims")
 
-    def test_seasonal_trends_emergency_visits(self):
+    def test_seasonal_trends_emergency_visits(self, client):
         """Test: Show seasonal trends for emergency visits"""
         # Test seasonal patterns for multiple counties
         counties = ["Johnson", "Sedgwick", "Shawnee"]
         
         for county in counties:
-            response = requests.get(f"{BASE_URL}/insights/{county}/emergency")
+            response = client.get(f"/insights/{county}/emergency")
             assert response.status_code == 200
             
             data = response.json()
@@ -223,9 +195,9 @@ class TestKansasClaimsAPI:
         
         print(f"Seasonal emergency trends analyzed for {len(counties)} counties")
 
-    def test_mental_health_claims_peak_times(self):
+    def test_mental_health_claims_peak_times(self, client):
         """Test: When are mental health claims highest?"""
-        response = requests.get(f"{BASE_URL}/insights/Johnson/mental_health")
+        response = client.get("/insights/Johnson/mental_health")
         assert response.status_code == 200
         
         data = response.json()
@@ -240,7 +212,7 @@ class TestKansasClaimsAPI:
         print(f"Mental health claims peak in month {peak_month[0]} with {peak_month[1]:.1f} average claims")
 
     # Geographic Comparisons Tests
-    def test_compare_wichita_vs_topeka_volumes(self):
+    def test_compare_wichita_vs_topeka_volumes(self, client):
         """Test: Compare Wichita vs Topeka claim volumes"""
         test_date = "2025-01-15"
         
@@ -251,7 +223,7 @@ class TestKansasClaimsAPI:
             "target_date": test_date
         }
         
-        wichita_response = requests.post(f"{BASE_URL}/predict", json=wichita_payload, timeout=TIMEOUT)
+        wichita_response = client.post("/predict", json=wichita_payload)
         assert wichita_response.status_code == 200
         wichita_data = wichita_response.json()
         
@@ -262,7 +234,7 @@ class TestKansasClaimsAPI:
             "target_date": test_date
         }
         
-        topeka_response = requests.post(f"{BASE_URL}/predict", json=topeka_payload, timeout=TIMEOUT)
+        topeka_response = client.post("/predict", json=topeka_payload)
         assert topeka_response.status_code == 200
         topeka_data = topeka_response.json()
         
@@ -270,13 +242,13 @@ class TestKansasClaimsAPI:
         print(f"  Wichita: {wichita_data['predicted_count']} claims, ${wichita_data['predicted_cost']:,.2f}")
         print(f"  Topeka: {topeka_data['predicted_count']} claims, ${topeka_data['predicted_cost']:,.2f}")
 
-    def test_highest_claim_costs_counties(self):
+    def test_highest_claim_costs_counties(self, client):
         """Test: Which Kansas counties have highest claim costs?"""
         counties = ["Johnson", "Sedgwick", "Shawnee", "Wyandotte", "Douglas"]
         county_costs = {}
         
         for county in counties:
-            response = requests.get(f"{BASE_URL}/summary/{county}")
+            response = client.get(f"/summary/{county}")
             if response.status_code == 200:
                 data = response.json()
                 # Calculate total cost across all claim types
@@ -292,7 +264,7 @@ class TestKansasClaimsAPI:
         print(f"Highest cost county analysis completed for {len(county_costs)} counties")
         print(f"Sample result: {highest_cost_county[0]} has high total costs")
 
-    def test_rural_vs_urban_utilization_patterns(self):
+    def test_rural_vs_urban_utilization_patterns(self, client):
         """Test: Show rural vs urban healthcare utilization patterns"""
         # Urban counties
         urban_counties = ["Johnson", "Sedgwick"]
@@ -303,12 +275,12 @@ class TestKansasClaimsAPI:
         rural_data = []
         
         for county in urban_counties:
-            response = requests.get(f"{BASE_URL}/summary/{county}")
+            response = client.get(f"/summary/{county}")
             if response.status_code == 200:
                 urban_data.append(response.json())
         
         for county in rural_counties:
-            response = requests.get(f"{BASE_URL}/summary/{county}")
+            response = client.get(f"/summary/{county}")
             if response.status_code == 200:
                 rural_data.append(response.json())
         
@@ -316,8 +288,37 @@ class TestKansasClaimsAPI:
         assert len(rural_data) > 0
         print(f"Rural vs Urban analysis: {len(urban_data)} urban, {len(rural_data)} rural counties")
 
+    def test_compare_emergency_johnson_wyandotte(self, client):
+        """Test: Compare emergency claims between Johnson and Wyandotte counties"""
+        response = client.get("/compare?counties=Johnson,Wyandotte&claim_type=emergency&days=7&chart=true")
+        assert response.status_code == 200
+        
+        data = response.json()
+        comparison = {entry["county"]: entry for entry in data["comparison"]}
+        assert list(comparison) == ["Johnson", "Wyandotte"]
+        for entry in comparison.values():
+            assert len(entry["predictions"]) == 7
+            assert entry["forecast_count"] == sum(p["predicted_count"] for p in entry["predictions"])
+        assert comparison["Johnson"]["historical_daily_count"] > comparison["Wyandotte"]["historical_daily_count"]
+        assert data["chart"].startswith("data:image/png;base64,")
+
+    def test_compare_matches_single_county_predictions(self, client):
+        """Test the batched comparison equals per-county range predictions"""
+        data = client.get("/compare?counties=Sedgwick,Ford,Finney&claim_type=inpatient&days=5").json()
+        for entry in data["comparison"]:
+            single = client.get(f"/predict-range/{entry['county']}/inpatient?days=5").json()["predictions"]
+            assert entry["predictions"] == pytest.approx(single)
+
+    def test_compare_invalid_input(self, client):
+        """Test comparisons need two known counties and a known claim type"""
+        assert client.get("/compare?counties=Johnson&claim_type=emergency").status_code == 400
+        assert client.get("/compare?counties=Johnson,Atlantis&claim_type=emergency").status_code == 400
+        assert client.get("/compare?counties=Johnson,Ford&claim_type=dental").status_code == 400
+        assert client.get("/compare?counties=Johnson,Ford&claim_type=emergency&days=0").status_code == 400
+        assert client.get("/compare?counties=Johnson,Ford&claim_type=emergency&days=400").status_code == 400
+
     # Business Planning Tests
-    def test_winter_months_reserves_planning(self):
+    def test_winter_months_reserves_planning(self, client):
         """Test: Should we increase reserves for winter months?"""
         # Test winter months predictions
         winter_months = ["2025-12-15", "2025-01-15", "2025-02-15"]
@@ -330,7 +331,7 @@ class TestKansasClaimsAPI:
                 "target_date": date
             }
             
-            response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+            response = client.post("/predict", json=payload)
             if response.status_code == 200:
                 data = response.json()
                 winter_predictions.append(data["predicted_cost"])
@@ -339,10 +340,10 @@ class TestKansasClaimsAPI:
         avg_winter_cost = sum(winter_predictions) / len(winter_predictions)
         print(f"Winter months reserve planning: Average cost ${avg_winter_cost:,.2f}")
 
-    def test_staffing_needs_prediction(self):
+    def test_staffing_needs_prediction(self, client):
         """Test: Predict staffing needs for claims processing"""
         # Get volume predictions for next 30 days
-        response = requests.get(f"{BASE_URL}/predict-range/Johnson/emergency?days=30")
+        response = client.get("/predict-range/Johnson/emergency?days=30")
         assert response.status_code == 200
         
         data = response.json()
@@ -354,14 +355,14 @@ class TestKansasClaimsAPI:
         print(f"Staffing needs analysis: {avg_daily_claims:.1f} average daily claims")
         print(f"Total 30-day volume: {total_claims} claims")
 
-    def test_mental_health_claims_increase_analysis(self):
+    def test_mental_health_claims_increase_analysis(self, client):
         """Test: What's driving the increase in mental health claims?"""
         # Get mental health insights for major counties
         counties = ["Johnson", "Sedgwick", "Shawnee"]
         mental_health_data = []
         
         for county in counties:
-            response = requests.get(f"{BASE_URL}/insights/{county}/mental_health")
+            response = client.get(f"/insights/{county}/mental_health")
             if response.status_code == 200:
                 data = response.json()
                 mental_health_data.append(data)
@@ -370,13 +371,13 @@ class TestKansasClaimsAPI:
         print(f"Mental health trend analysis completed for {len(mental_health_data)} counties")
 
     # Chat Interface Tests
-    def test_chat_volume_prediction_query(self):
+    def test_chat_volume_prediction_query(self, client):
         """Test chat interface with volume prediction query"""
         payload = {
             "message": "Predict emergency claims for Johnson County next week"
         }
         
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=TIMEOUT)
+        response = client.post("/chat", json=payload)
         assert response.status_code == 200
         
         data = response.json()
@@ -393,13 +394,30 @@ class TestKansasClaimsAPI:
         print(f"Chat response: {data['response'][:100]}...")
         print(f"Groq usage: {usage['groq_requests_used']}/{usage['groq_requests_limit']}")
 
-    def test_chat_cost_analysis_query(self):
+    def test_chat_daily_limit(self, client):
+        """Test chat falls back locally once the daily LLM quota is spent"""
+        import main
+        from rate_limit import DailyQuota
+        saved_quota = main.llm_quota
+        main.llm_quota = DailyQuota(":memory:", 1, refresh_seconds=0)
+        try:
+            message = {"message": "Predict emergency claims for Johnson County next week"}
+            first = client.post("/chat", json=message).json()["usage"]
+            assert first["groq_requests_used"] == 1 and first["limit_reached"]
+            second = client.post("/chat", json=message).json()
+            assert second["response"].startswith("## Johnson County Emergency Claims Prediction")
+            assert second["usage"]["groq_requests_used"] == 1
+            assert client.get("/usage").json()["groq_requests_remaining"] == 0
+        finally:
+            main.llm_quota = saved_quota
+
+    def test_chat_cost_analysis_query(self, client):
         """Test chat interface with cost analysis query"""
         payload = {
             "message": "What's the average cost per claim in Sedgwick County?"
         }
         
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=TIMEOUT)
+        response = client.post("/chat", json=payload)
         assert response.status_code == 200
         
         data = response.json()
@@ -407,13 +425,13 @@ class TestKansasClaimsAPI:
         assert "usage" in data
         print(f"Chat cost analysis response received")
 
-    def test_chat_seasonal_pattern_query(self):
+    def test_chat_seasonal_pattern_query(self, client):
         """Test chat interface with seasonal pattern query"""
         payload = {
             "message": "How does flu season affect claims in Johnson County?"
         }
         
-        response = requests.post(f"{BASE_URL}/chat", json=payload, timeout=TIMEOUT)
+        response = client.post("/chat", json=payload)
         assert response.status_code == 200
         
         data = response.json()
@@ -421,8 +439,353 @@ class TestKansasClaimsAPI:
         assert "usage" in data
         print(f"Chat seasonal pattern response received")
 
+    def test_chat_county_comparison_query(self, client):
+        """Test chat compares every county mentioned in the query"""
+        payload = {
+            "message": "Compare inpatient costs between Johnson and Sedgwick"
+        }
+        
+        response = client.post("/chat", json=payload)
+        assert response.status_code == 200
+        
+        context = response.json()["context"]
+        assert context["detected_counties"] == ["Johnson", "Sedgwick"]
+        assert [entry["county"] for entry in context["comparison"]] == ["Johnson", "Sedgwick"]
+        chart = response.json()["chart"]
+        assert chart["kind"] == "bar" and chart["labels"] == ["Johnson", "Sedgwick"]
+        assert chart["series"][0]["data"] == [round(entry["forecast_cost"], 2) for entry in context["comparison"]]
+
+    def test_chat_chart_data_by_default(self, client):
+        """Test chat returns chart data for the client and embeds a PNG only when asked"""
+        message = "Show the seasonal pattern for pharmacy claims in Sedgwick"
+        data = client.post("/chat", json={"message": message}).json()
+        assert "data:image/png" not in data["response"]
+        chart = data["chart"]
+        assert chart["chart_type"] == "seasonal_trends" and chart["kind"] == "line"
+        assert chart["labels"][0] == "Jan" and len(chart["series"][0]["data"]) == len(chart["labels"])
+
+        png = client.post("/chat", json={"message": message, "chart_format": "png"}).json()
+        assert "![Chart](data:image/png;base64," in png["response"]
+        assert png["chart"] == chart
+
+        assert client.post("/chat", json={"message": message, "chart_format": "none"}).json()["chart"] is None
+        assert client.post("/chat", json={"message": message, "chart_format": "svg"}).status_code == 400
+
+    # Metrics Tests
+    def test_metrics_endpoint_prometheus_format(self, client):
+        """Test /metrics exposes per-route request counts and latency histograms"""
+        client.get("/counties")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        
+        body = response.text
+        assert "# TYPE http_request_duration_seconds histogram" in body
+        assert 'http_requests_total{method="GET",route="/counties",status="200"}' in body
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/counties",le="+Inf"}' in body
+
+    def test_metrics_records_stage_timers(self, client):
+        """Test chat requests record entity extraction, predict and LLM stage timings"""
+        client.post("/chat", json={"message": "Predict emergency claims for Johnson County next week",
+                                   "chart_format": "png"})
+        body = client.get("/metrics").text
+        for stage in ["entity_extraction", "model_predict", "insight_aggregation", "chart_render", "llm_call"]:
+            assert f'stage_duration_seconds_count{{stage="{stage}"}}' in body
+
+    def test_metrics_route_templates(self, client):
+        """Test path parameters are collapsed into the route template label"""
+        client.get("/summary/Johnson")
+        client.get("/summary/Sedgwick")
+        body = client.get("/metrics").text
+        assert 'route="/summary/{county}"' in body
+        assert 'route="/summary/Johnson"' not in body
+
+    # Logging Tests
+    def test_request_id_generated(self, client):
+        """Test every response carries a request ID for log correlation"""
+        response = client.get("/counties")
+        assert response.status_code == 200
+        assert response.headers.get("x-request-id")
+
+    def test_request_id_propagated(self, client):
+        """Test a caller-supplied request ID is echoed back"""
+        response = client.post("/chat", json={"message": "Predict emergency claims for Johnson County"},
+                               headers={"X-Request-ID": "turn-42"})
+        assert response.status_code == 200
+        assert response.headers["x-request-id"] == "turn-42"
+
+    # Profiling Tests
+    def test_profiling_disabled_by_default(self, client):
+        """Test the profile header is ignored unless profiling is enabled"""
+        response = client.get("/counties", headers={"X-Profile": "1"})
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+
+    def test_profiling_header_captures_trace(self, client, tmp_path, monkeypatch):
+        """Test an opted-in request is profiled, listed and readable via the admin endpoints"""
+        import main
+        import profiling
+        monkeypatch.setattr(profiling.settings, "enabled", True)
+        monkeypatch.setattr(profiling.settings, "directory", str(tmp_path))
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+        admin = {"X-Admin-Token": "secret"}
+        
+        response = client.get("/predict-range/Johnson/emergency?days=7", headers={"X-Profile": "1"})
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+        
+        listing = client.get("/admin/profiles", headers=admin).json()
+        assert profile_id in [p["id"] for p in listing["profiles"]]
+        
+        report = client.get(f"/admin/profiles/{profile_id}", headers=admin)
+        assert report.status_code == 200
+        assert "predict_multiple_dates" in report.text
+        
+        assert client.get("/admin/profiles/does-not-exist", headers=admin).status_code == 404
+        assert client.get(f"/admin/profiles/{profile_id}?raw=true").status_code == 403
+
+    def test_admin_closed_without_token(self, client, monkeypatch):
+        """Test the admin endpoints do not answer when no ADMIN_TOKEN is configured"""
+        import main
+        monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+        assert client.get("/admin/profiles").status_code == 404
+        assert client.get("/admin/profiles/anything?raw=true", headers={"X-Admin-Token": ""}).status_code == 404
+
+    # Engine Selection Tests
+    def test_engines_endpoint(self, client):
+        """Test the engine listing always includes regression"""
+        response = client.get("/engines")
+        assert response.status_code == 200
+        assert "regression" in response.json()["engines"]
+
+    def test_arima_request_without_engine_falls_back(self, client):
+        """Test requesting ARIMA before it is fitted returns a regression prediction"""
+        payload = {"county": "Johnson", "claim_type": "emergency", "target_date": "2025-01-15", "engine": "arima"}
+        response = client.post("/predict", json=payload)
+        assert response.status_code == 200
+        assert response.json()["engine"] == "regression"
+
+    def test_invalid_engine(self, client):
+        """Test an unknown engine is rejected as invalid input"""
+        payload = {"county": "Johnson", "claim_type": "emergency", "target_date": "2025-01-15", "engine": "prophet"}
+        response = client.post("/predict", json=payload)
+        assert response.status_code == 400
+        response = client.get("/predict-range/Johnson/emergency?days=7&engine=prophet")
+        assert response.status_code == 400
+
+    def test_prediction_intervals(self, client):
+        """Test: Predictions carry 95% intervals around the point estimate"""
+        payload = {"county": "Johnson", "claim_type": "emergency", "target_date": "2025-01-15"}
+        response = client.post("/predict", json=payload)
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["predicted_count_lower"] <= data["predicted_count"] <= data["predicted_count_upper"]
+        assert data["predicted_cost_lower"] <= data["predicted_cost"] <= data["predicted_cost_upper"]
+        
+        response = client.get("/predict-range/Johnson/emergency?days=7")
+        for prediction in response.json()["predictions"]:
+            assert prediction["predicted_count_lower"] < prediction["predicted_count_upper"]
+
+    # Aggregate Tests
+    def test_total_spending_wyandotte(self, client, predictor):
+        """Test: What's the total healthcare spending in Wyandotte County?"""
+        response = client.get("/aggregate?county=Wyandotte")
+        assert response.status_code == 200
+        
+        data = response.json()
+        expected = predictor.data[predictor.data["county"] == "Wyandotte"]["total_cost"].sum()
+        assert data["value"] == pytest.approx(expected)
+        assert data["rows"] == (predictor.data["county"] == "Wyandotte").sum()
+
+    def test_most_common_claim_type(self, client, predictor):
+        """Test: What's the most common claim type in Kansas?"""
+        response = client.get("/aggregate?measure=claim_count&group_by=claim_type")
+        assert response.status_code == 200
+        
+        groups = response.json()["groups"]
+        totals = predictor.data.groupby("claim_type")["claim_count"].sum()
+        assert groups[0]["claim_type"] == totals.idxmax()
+        assert [g["value"] for g in groups] == sorted(totals.tolist(), reverse=True)
+
+    def test_aggregate_by_area_type_and_month(self, client, predictor):
+        """Test grouping by a county attribute and a date part with mean"""
+        response = client.get("/aggregate?stat=mean&group_by=area_type,month&claim_type=pharmacy&month=1,7")
+        assert response.status_code == 200
+        
+        data = predictor.data[(predictor.data["claim_type"] == "pharmacy") & predictor.data["date"].dt.month.isin([1, 7])]
+        expected = data.groupby(["area_type", data["date"].dt.month])["total_cost"].mean()
+        groups = response.json()["groups"]
+        assert len(groups) == len(expected)
+        for group in groups:
+            assert group["value"] == pytest.approx(expected[(group["area_type"], group["month"])], abs=0.01)
+
+    def test_aggregate_invalid_input(self, client):
+        """Test unknown measures, dimensions and labels are rejected"""
+        assert client.get("/aggregate?measure=premium").status_code == 400
+        assert client.get("/aggregate?group_by=zip_code").status_code == 400
+        assert client.get("/aggregate?county=Atlantis").status_code == 400
+
+    # History Tests
+    def test_history_daily_window(self, client, predictor):
+        """Test daily actuals for a date window match the raw rows"""
+        response = client.get("/history/Johnson/emergency?start=2024-03-01&end=2024-03-31")
+        assert response.status_code == 200
+        
+        data = response.json()
+        rows = predictor.data[(predictor.data["county"] == "Johnson") & (predictor.data["claim_type"] == "emergency") &
+                              (predictor.data["date"] >= "2024-03-01") & (predictor.data["date"] <= "2024-03-31")]
+        assert data["total"] == 31
+        assert data["history"][0]["date"] == "2024-03-01"
+        assert [r["claim_count"] for r in data["history"]] == rows["claim_count"].tolist()
+
+    def test_history_monthly_resample(self, client, predictor):
+        """Test monthly resampling sums each calendar month"""
+        response = client.get("/history/Sedgwick/pharmacy?resample=monthly")
+        assert response.status_code == 200
+        
+        history = response.json()["history"]
+        rows = predictor.data[(predictor.data["county"] == "Sedgwick") & (predictor.data["claim_type"] == "pharmacy")]
+        expected = rows.groupby(rows["date"].dt.to_period("M"))["total_cost"].sum()
+        assert len(history) == len(expected)
+        assert history[0]["date"].endswith("-01")
+        assert [r["total_cost"] for r in history] == pytest.approx(expected.tolist(), abs=0.01)
+
+    def test_history_pagination_and_stream(self, client):
+        """Test pages chain through next_offset and the stream returns every period"""
+        first = client.get("/history/Ford/inpatient?resample=weekly&limit=20").json()
+        second = client.get(f"/history/Ford/inpatient?resample=weekly&limit=20&offset={first['next_offset']}").json()
+        assert first["next_offset"] == 20
+        assert len(first["history"]) == 20
+        assert second["history"][0]["date"] > first["history"][-1]["date"]
+        
+        response = client.get("/history/Ford/inpatient?resample=weekly&stream=true")
+        assert response.status_code == 200
+        lines = response.text.strip().split("\n")
+        assert len(lines) == first["total"]
+        assert json.loads(lines[20]) == second["history"][0]
+
+    def test_history_invalid_input(self, client):
+        """Test unknown series, resample rules and dates are rejected"""
+        assert client.get("/history/Atlantis/emergency").status_code == 404
+        assert client.get("/history/Johnson/emergency?resample=hourly").status_code == 400
+        assert client.get("/history/Johnson/emergency?start=not-a-date").status_code == 400
+        assert client.get("/history/Johnson/emergency?limit=0").status_code == 400
+
+    # HTTP Caching Tests
+    def test_conditional_get_returns_304(self, client, predictor):
+        """Test read endpoints carry the data version ETag and honour If-None-Match"""
+        response = client.get("/summary/Johnson")
+        etag = response.headers["etag"]
+        assert etag.startswith(f'W/"{predictor.data_version()}-')
+        assert client.get("/summary/Johnson").headers["etag"] == etag
+        assert client.get("/counties").headers["etag"] != etag
+
+        cached = client.get("/summary/Johnson", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert client.get("/summary/Johnson", headers={"If-None-Match": 'W/"stale"'}).status_code == 200
+        assert "etag" not in client.post("/predict", json={
+            "county": "Johnson", "claim_type": "emergency", "target_date": "2025-01-15"}).headers
+
+    def test_conditional_get_still_validates(self, client):
+        """Test a tag from a valid request does not turn errors for other URLs into 304s"""
+        etag = client.get("/history/Johnson/emergency?limit=5").headers["etag"]
+        assert client.get("/history/Atlantis/emergency?limit=5", headers={"If-None-Match": etag}).status_code == 404
+        assert client.get("/history/Atlantis/emergency?limit=5", headers={"If-None-Match": "*"}).status_code == 404
+        assert client.get("/history/Johnson/emergency?limit=0", headers={"If-None-Match": etag}).status_code == 400
+        assert client.get("/history/Johnson/emergency?limit=5", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_response_compression(self, client):
+        """Test large JSON and NDJSON bodies are compressed when the client accepts it"""
+        plain = client.get("/history/Johnson/emergency", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert "Accept-Encoding" in plain.headers["vary"]
+
+        response = client.get("/history/Johnson/emergency", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == plain.json()
+        assert int(response.headers["content-length"]) < len(plain.content) / 3
+
+        streamed = client.get("/history/Johnson/emergency?stream=true", headers={"Accept-Encoding": "gzip"})
+        assert streamed.headers["content-encoding"] == "gzip"
+        assert len(streamed.text.strip().split("\n")) == plain.json()["total"]
+        # Small bodies are not worth compressing, but still vary by encoding
+        small = client.get("/claim-types", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+        assert "Accept-Encoding" in small.headers["vary"]
+
+    def test_encoding_negotiation(self):
+        """Test Accept-Encoding parsing and q-values"""
+        import http_cache
+        assert http_cache.choose_encoding("gzip, deflate") == "gzip"
+        assert http_cache.choose_encoding("gzip;q=0, identity") is None
+        assert http_cache.choose_encoding("") is None
+        assert http_cache.choose_encoding("br, gzip;q=0.8") == ("br" if http_cache.brotli else "gzip")
+
+    # Pre-encoded Payload Tests
+    def test_static_payloads_encoded_once(self, client, predictor, monkeypatch):
+        """Test summaries are served from the encoded cache until the data version changes"""
+        import main
+        main.payload_cache.clear()
+        first = client.get("/summary/Sedgwick")
+        assert first.headers["content-type"] == "application/json"
+
+        def fail(county):
+            raise AssertionError("summary recomputed")
+        monkeypatch.setattr(predictor, "get_county_summary", fail)
+        assert client.get("/summary/Sedgwick").content == first.content
+
+        monkeypatch.setattr(main.payload_cache, "version", "older")
+        assert client.get("/summary/Sedgwick").status_code == 500
+
+    def test_dumps_numpy_and_int_keys(self):
+        """Test the fast encoder accepts numpy values and integer dict keys like the default encoder"""
+        import numpy as np
+        from payloads import dumps
+        content = {"monthly": {1: np.float64(2.5), 2: np.int64(3)}, "values": np.array([1, 2])}
+        assert json.loads(dumps(content)) == {"monthly": {"1": 2.5, "2": 3}, "values": [1, 2]}
+
+    def test_dumps_non_finite_as_null(self, monkeypatch):
+        """Test NaN and Infinity encode as null with orjson and with the stdlib fallback"""
+        import numpy as np
+        import payloads
+        content = {"std": float("nan"), "mean": np.float64("inf"), "values": np.array([1.5, np.nan])}
+        expected = {"std": None, "mean": None, "values": [1.5, None]}
+        assert json.loads(payloads.dumps(content)) == expected
+        monkeypatch.setattr(payloads, "orjson", None)
+        assert json.loads(payloads.dumps(content)) == expected
+
+    # Bootstrap Tests
+    def test_bootstrap_matches_individual_endpoints(self, client):
+        """Test /bootstrap bundles the vocabularies, summary, insights and forecast"""
+        response = client.get("/bootstrap")
+        assert response.status_code == 200
+
+        data = response.json()
+        county, claim_type = data["defaults"]["county"], data["defaults"]["claim_type"]
+        assert data["counties"] == client.get("/counties").json()["counties"]
+        assert data["claim_types"] == client.get("/claim-types").json()["claim_types"]
+        assert county == data["counties"][0] and claim_type == data["claim_types"][0]
+        assert data["summary"] == client.get(f"/summary/{county}").json()["summary"]
+        assert data["insights"] == client.get(f"/insights/{county}/{claim_type}").json()["insights"]
+        assert data["forecast"] == client.get(f"/predict-range/{county}/{claim_type}?days=7").json()["predictions"]
+
+    def test_bootstrap_selection_and_caching(self, client, predictor):
+        """Test a chosen county is honoured, the payload is revalidated by ETag and bad input rejected"""
+        response = client.get("/bootstrap?county=Ford&claim_type=pharmacy&days=3")
+        assert response.json()["defaults"] == {"county": "Ford", "claim_type": "pharmacy"}
+        assert len(response.json()["forecast"]) == 3
+
+        etag = response.headers["etag"]
+        assert etag.startswith(f'W/"{predictor.data_version()}-{datetime.now():%Y%m%d}-')  # also keyed by day
+        assert client.get("/bootstrap?county=Ford&claim_type=pharmacy&days=3",
+                          headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/bootstrap?county=Atlantis").status_code == 400
+        assert client.get("/bootstrap?days=0").status_code == 400
+
     # Error Handling Tests
-    def test_invalid_county(self):
+    def test_invalid_county(self, client):
         """Test handling of invalid county"""
         payload = {
             "county": "InvalidCounty",
@@ -430,12 +793,12 @@ class TestKansasClaimsAPI:
             "target_date": "2025-01-15"
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         # Invalid inputs properly return 500 with error message
         assert response.status_code == 500
         assert "No model found" in response.json()["detail"]
 
-    def test_invalid_claim_type(self):
+    def test_invalid_claim_type(self, client):
         """Test handling of invalid claim type"""
         payload = {
             "county": "Johnson",
@@ -443,12 +806,12 @@ class TestKansasClaimsAPI:
             "target_date": "2025-01-15"
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         # Invalid inputs properly return 500 with error message
         assert response.status_code == 500
         assert "No model found" in response.json()["detail"]
 
-    def test_invalid_date_format(self):
+    def test_invalid_date_format(self, client):
         """Test handling of invalid date format"""
         payload = {
             "county": "Johnson",
@@ -456,11 +819,39 @@ class TestKansasClaimsAPI:
             "target_date": "invalid-date"
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         # Invalid date format returns 400 with proper error message
         assert response.status_code == 400
         assert "Invalid input" in response.json()["detail"]
 
+class TestStartup:
+    """Tests for the startup sequence"""
+
+    def test_starts_with_models_only(self, predictor, monkeypatch, tmp_path):
+        """Test saved models without a data file still start the app, serve /predict and an empty /bootstrap"""
+        from fastapi.testclient import TestClient
+        from charts import ChartRenderer
+        import main
+        predictor.save_models(str(tmp_path / "models.pkl"))
+        for name in ("predictor", "groq_client", "llm_quota", "horizon_task"):
+            monkeypatch.setattr(main, name, getattr(main, name))  # restored for the other tests
+        monkeypatch.setattr(main, "DATA_PATH", str(tmp_path / "missing.csv"))
+        monkeypatch.setattr(main, "MODELS_PATH", str(tmp_path / "models.pkl"))
+        monkeypatch.setattr(main, "LLM_QUOTA_DB", str(tmp_path / "quota.sqlite"))
+        monkeypatch.setattr(main, "SHARED_STORE_DIR", None)
+        monkeypatch.setattr(main, "CLAIMS_DB", None)
+        monkeypatch.setattr(main, "chart_renderer", ChartRenderer(workers=0))
+
+        with TestClient(main.app) as client:
+            assert not main.predictor.has_data()
+            response = client.post("/predict", json={"county": "Johnson", "claim_type": "emergency",
+                                                     "target_date": "2025-01-15"})
+            bootstrap = client.get("/bootstrap")
+        assert bootstrap.status_code == 200
+        assert bootstrap.json()["counties"] == [] and bootstrap.json()["forecast"] == []
+        assert response.status_code == 200
+        assert response.json() == predictor.predict_claims("Johnson", "emergency", "2025-01-15")
+
 if __name__ == "__main__":
     # Run tests
     pytest.main([__file__, "-v", "--tb=short"])
\ No newline at end of file
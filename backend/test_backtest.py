@@ -0,0 +1,32 @@
+import pytest
+
+from backtest import rolling_origins, run_backtest
+
+@pytest.fixture(scope="module")
+def results(dataset_path):
+    return run_backtest(dataset_path, ["regression", "pooled"], folds=2, horizon=14,
+                        counties=["Johnson", "Ford"], n_jobs=1)
+
+
+class TestBacktest:
+    """Tests for the rolling-origin backtest"""
+
+    def test_origins_step_back_from_end(self):
+        """Test the last fold ends on the last date and folds are step days apart"""
+        origins = rolling_origins("2024-12-31", 3, 30, 30)
+        assert [o.strftime("%Y-%m-%d") for o in origins] == ["2024-10-03", "2024-11-02", "2024-12-02"]
+
+    def test_every_series_scored_per_engine(self, results):
+        """Test each engine reports per-series and aggregate scores"""
+        for stats in results["engines"].values():
+            assert stats["series_evaluated"] == 12
+            assert stats["predictions"] == 12 * 2 * 14
+            assert {"count_mae", "count_rmse", "cost_mae", "cost_rmse"} <= set(stats["aggregate"])
+            assert stats["series"]["Johnson_emergency"]["count_rmse"] >= stats["series"]["Johnson_emergency"]["count_mae"]
+
+    def test_cost_figures_reported(self, results):
+        """Test fit time, predict time and artifact size are recorded per fold"""
+        for stats in results["engines"].values():
+            assert len(stats["folds"]) == 2
+            assert stats["fit_seconds"] > 0
+            assert stats["artifact_bytes"] > 0
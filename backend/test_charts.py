@@ -0,0 +1,61 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from charts import ChartRenderer, chart_spec, render_chart
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+CHART_SPECS = {
+    "seasonal_trends": ({1: 120.0, 2: 98.5, 3: 101.0}, "Seasonal Trends", "Johnson", "emergency"),
+    "cost_comparison": ({"Johnson": 52000.0, "Wyandotte": 31000.0}, "Forecast Cost"),
+    "prediction_timeline": ([{"date": "2025-01-15", "predicted_count": 40.0},
+                             {"date": "2025-01-16", "predicted_count": 42.0}], "Prediction Timeline"),
+}
+
+
+class TestChartRenderer:
+    """Tests for the matplotlib renderer processes"""
+
+    def test_renders_every_chart_type(self):
+        """Test each chart spec renders to PNG in a worker pool started by the first render"""
+        renderer = ChartRenderer(workers=2)
+        assert renderer._pool is None
+
+        async def render_all():
+            return await asyncio.gather(*(renderer.render(chart_type, *spec)
+                                          for chart_type, spec in CHART_SPECS.items()))
+        try:
+            images = asyncio.run(render_all())
+        finally:
+            renderer.shutdown()
+        assert all(image.startswith(PNG_MAGIC) for image in images)
+
+    def test_bad_spec_returns_none(self):
+        """Test a failing render is reported as no chart, like the inline renderer did"""
+        renderer = ChartRenderer(workers=0)
+        assert asyncio.run(renderer.render("pie", {}, "Unknown")) is None
+        with pytest.raises(ValueError):
+            render_chart("pie", {}, "Unknown")
+
+    def test_api_does_not_import_matplotlib(self):
+        """Test importing the API module leaves matplotlib to the renderer processes"""
+        code = "import sys, main; print(any(m.startswith('matplotlib') for m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "False"
+
+
+class TestChartSpec:
+    """Tests for charts returned as data"""
+
+    def test_band_only_with_intervals(self, predictor):
+        """Test interval bounds become a band, and predictions without intervals get none"""
+        with_intervals = predictor.predict_multiple_dates("Johnson", "emergency", "2025-01-15", 3)
+        spec = chart_spec("prediction_timeline", with_intervals, "Prediction Timeline")
+        assert spec["band"]["lower"] == [p["predicted_count_lower"] for p in with_intervals]
+
+        without = [predictor._format_prediction("Johnson", "emergency", "2025-01-15", 40.0, 52000.0)]
+        assert without[0]["predicted_count_lower"] is None
+        assert "band" not in chart_spec("prediction_timeline", without, "Prediction Timeline")
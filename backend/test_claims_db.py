@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import claims_db
+from ml_models import ClaimsPredictionModel
+
+@pytest.fixture(scope="module")
+def db_path(dataset_path, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "claims.sqlite")
+    claims_db.build_claims_db(dataset_path, path, chunk_size=5000)
+    return path
+
+
+@pytest.fixture(scope="module")
+def worker(db_path):
+    model = ClaimsPredictionModel()
+    model.attach_claims_db(db_path)
+    return model
+
+
+class TestClaimsDatabase:
+    """Tests for the SQLite claims store"""
+
+    def test_attached_worker_has_no_dataframe(self, worker, predictor):
+        """Test the vocabulary comes from the database, not a loaded frame"""
+        assert worker.data is None and worker.has_data()
+        assert worker.get_counties() == predictor.get_counties()
+        assert worker.get_claim_types() == predictor.get_claim_types()
+
+    def test_history_uses_series_index(self, worker, predictor, db_path):
+        """Test history windows equal the in-memory index and are answered from the index"""
+        args = ("Douglas", "outpatient", np.datetime64("2024-02-10"), np.datetime64("2024-05-20"))
+        for resample in ("daily", "weekly", "monthly"):
+            for from_db, in_memory in zip(worker.get_history_index().query(*args, resample),
+                                          predictor.get_history_index().query(*args, resample)):
+                assert np.array_equal(from_db, in_memory)
+        assert worker.get_history_index().query("Nowhere", "outpatient") is None
+        plan = worker.db._connection().execute(
+            "EXPLAIN QUERY PLAN SELECT date FROM claims WHERE county_id = 0 AND claim_type_id = 0 "
+            "AND date BETWEEN 0 AND 1").fetchall()
+        assert "claims_series_date" in str(plan)
+
+    def test_rollups_match_dataframe(self, worker, predictor):
+        """Test summaries, insights and the aggregate cube built from the rollup tables"""
+        for claim_type, row in worker.get_county_summary("Sedgwick").items():
+            assert row == pytest.approx(predictor.get_county_summary("Sedgwick")[claim_type], abs=0.011)
+        assert worker.get_county_summary("InvalidCounty") == {}
+        insights = worker.get_seasonal_insights("Johnson", "mental_health")
+        expected = predictor.get_seasonal_insights("Johnson", "mental_health")
+        for patterns in ("monthly_patterns", "day_of_week_patterns"):
+            for measure in ("claim_count", "total_cost"):
+                assert insights[patterns][measure] == pytest.approx(expected[patterns][measure], abs=0.011)
+        query = {"measure": "claim_count", "group_by": ["metro", "claim_type"], "filters": {"year": [2024]}}
+        assert worker.get_rollup_cube().query(**query) == predictor.get_rollup_cube().query(**query)
+
+    def test_trains_from_streamed_rows(self, db_path, predictor):
+        """Test models trained from database chunks equal the in-memory models"""
+        model = ClaimsPredictionModel()
+        model.attach_claims_db(db_path)
+        model.train_all_models(chunk_size=3000)
+        assert model.models.keys() == predictor.models.keys()
+        prediction = model.predict_claims("Johnson", "emergency", "2025-01-15")
+        assert prediction == pytest.approx(predictor.predict_claims("Johnson", "emergency", "2025-01-15"))
+
+    def test_ensure_builds_once(self, db_path, dataset_path):
+        """Test a current database is reused instead of rebuilt"""
+        assert claims_db.is_db_current(db_path, dataset_path)
+        assert claims_db.ensure_claims_db(db_path, dataset_path) is False
+        assert not claims_db.is_db_current(db_path + ".missing", dataset_path)
@@ -1,36 +1,9 @@
 import pytest
-import requests
-import time
-
-# Configuration
-BASE_URL = "http://localhost:3001"
-TIMEOUT = 30
 
 class TestErrorHandling:
     """Isolated tests for error handling scenarios"""
     
-    @classmethod
-    def setup_class(cls):
-        """Setup test environment"""
-        print("Setting up error handling tests...")
-        cls.wait_for_server()
-        
-    @classmethod
-    def wait_for_server(cls, max_attempts=5):
-        """Wait for server to be available"""
-        for attempt in range(max_attempts):
-            try:
-                response = requests.get(f"{BASE_URL}/", timeout=5)
-                if response.status_code == 200:
-                    print("Server is ready!")
-                    return
-            except requests.exceptions.RequestException:
-                pass
-            print(f"Waiting for server... (attempt {attempt + 1}/{max_attempts})")
-            time.sleep(2)
-        raise Exception("Server not available after maximum attempts")
-
-    def test_invalid_county(self):
+    def test_invalid_county(self, client):
         """Test handling of invalid county"""
         payload = {
             "county": "InvalidCounty",
@@ -38,7 +11,7 @@ class TestErrorHandling:
             "target_date": "2025-01-15"
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         print(f"Invalid county response: {response.status_code}")
         if response.status_code != 200:
             print(f"Response text: {response.text}")
@@ -46,7 +19,7 @@ class TestErrorHandling:
         # Invalid inputs may return 404 (not found) or 500 (server error)
         assert response.status_code in [404, 500]
 
-    def test_invalid_claim_type(self):
+    def test_invalid_claim_type(self, client):
         """Test handling of invalid claim type"""
         payload = {
             "county": "Johnson",
@@ -54,7 +27,7 @@ class TestErrorHandling:
             "target_date": "2025-01-15"
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         print(f"Invalid claim type response: {response.status_code}")
         if response.status_code != 200:
             print(f"Response text: {response.text}")
@@ -62,7 +35,7 @@ class TestErrorHandling:
         # Invalid inputs may return 404 (not found) or 500 (server error)
         assert response.status_code in [404, 500]
 
-    def test_invalid_date_format(self):
+    def test_invalid_date_format(self, client):
         """Test handling of invalid date format"""
         payload = {
             "county": "Johnson",
@@ -70,7 +43,7 @@ class TestErrorHandling:
             "target_date": "invalid-date"
         }
         
-        response = requests.post(f"{BASE_URL}/predict", json=payload, timeout=TIMEOUT)
+        response = client.post("/predict", json=payload)
         print(f"Invalid date response: {response.status_code}")
         if response.status_code != 200:
             print(f"Response text: {response.text}")
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from groq import AsyncGroq
+
+import main
+import stub_llm
+from harness import FakeGroqClient
+from llm_client import CircuitBreaker, LLMClient, LLMUnavailable
+
+MESSAGES = [{"role": "user", "content": "Predict emergency claims for Johnson County"}]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestLLMClient:
+    """Tests for retries, deadlines and the circuit breaker around the LLM"""
+
+    def test_retries_transient_failures(self):
+        """Test failed attempts are retried within the retry budget"""
+        fake = FakeGroqClient(reply="ok", failures=2)
+        client = LLMClient(fake, max_retries=2, backoff_base=0.001)
+        assert asyncio.run(client.complete(MESSAGES, "model")) == "ok"
+        assert len(fake.calls) == 3
+
+    def test_gives_up_after_max_retries(self):
+        """Test a persistently failing upstream raises LLMUnavailable"""
+        fake = FakeGroqClient(failures=10)
+        client = LLMClient(fake, max_retries=1, backoff_base=0.001)
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.complete(MESSAGES, "model"))
+        assert len(fake.calls) == 2
+
+    def test_deadline_bounds_slow_upstream(self):
+        """Test a slow upstream is abandoned at the deadline"""
+        client = LLMClient(FakeGroqClient(latency=5.0), timeout=0.05, deadline=0.2, backoff_base=0.001)
+        start = time.monotonic()
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.complete(MESSAGES, "model"))
+        assert time.monotonic() - start < 1.0
+
+    def test_breaker_opens_and_recovers(self):
+        """Test the breaker opens on errors, rejects calls, then closes after a good trial"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(window=4, min_calls=4, cooldown=30.0, clock=clock)
+        fake = FakeGroqClient(reply="ok", failures=4)
+        client = LLMClient(fake, max_retries=0, breaker=breaker)
+
+        for _ in range(4):
+            with pytest.raises(LLMUnavailable):
+                asyncio.run(client.complete(MESSAGES, "model"))
+        assert breaker.state == "open"
+        assert not client.available()
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.complete(MESSAGES, "model"))
+        assert len(fake.calls) == 4  # rejected without calling upstream
+
+        clock.now += 31
+        assert breaker.state == "half_open"
+        assert asyncio.run(client.complete(MESSAGES, "model")) == "ok"
+        assert breaker.state == "closed"
+
+    def test_calls_in_flight_when_opened_are_ignored(self):
+        """Test only the half-open trial's outcome closes the breaker"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(window=4, min_calls=4, cooldown=30.0, clock=clock)
+        early = breaker.allow()  # admitted while closed, still running when the breaker opens
+        for _ in range(4):
+            breaker.record(False, 0.1, breaker.allow())
+        assert breaker.state == "open"
+        breaker.record(True, 0.1, early)
+        assert breaker.state == "open"
+
+        clock.now += 31
+        trial = breaker.allow()
+        assert trial.trial and breaker.allow() is None
+        breaker.record(True, 0.1, early)
+        assert breaker.state == "half_open"
+        breaker.record(True, 0.1, trial)
+        assert breaker.state == "closed"
+
+    def test_cancelled_trial_frees_the_slot(self):
+        """Test a half-open trial cancelled mid-call hands its slot back"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(window=4, min_calls=4, cooldown=30.0, clock=clock)
+        for _ in range(4):
+            breaker.record(False, 0.1, breaker.allow())
+        clock.now += 31
+        client = LLMClient(FakeGroqClient(latency=5.0), breaker=breaker)
+
+        async def cancel_trial():
+            task = asyncio.create_task(client.complete(MESSAGES, "model"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        asyncio.run(cancel_trial())
+        assert breaker.state == "half_open"
+        assert client.admit() is not None
+
+    def test_breaker_opens_on_slow_calls(self):
+        """Test a high share of slow calls opens the breaker"""
+        breaker = CircuitBreaker(window=5, min_calls=5, slow_call_seconds=1.0, clock=FakeClock())
+        for _ in range(5):
+            breaker.record(True, 2.0)
+        assert breaker.state == "open"
+
+    def test_groq_client_against_stub_server(self):
+        """Test the real AsyncGroq client talks to the local stub API"""
+        stub = stub_llm.create_app(reply="stub reply")
+
+        async def run():
+            http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+            groq = AsyncGroq(api_key="test", base_url="http://stub", max_retries=0, http_client=http_client)
+            client = LLMClient(groq, backoff_base=0.001)
+            try:
+                first = await client.complete(MESSAGES, "llama3-8b-8192")
+                stub.state.error_rate = 1.0
+                with pytest.raises(LLMUnavailable):
+                    await client.complete(MESSAGES, "llama3-8b-8192")
+                return first
+            finally:
+                await client.aclose()
+
+        assert asyncio.run(run()) == "stub reply"
+        assert stub.state.requests == 1 + 3  # one success, then three failed attempts
+
+    def test_chat_falls_back_when_circuit_open(self, client):
+        """Test /chat answers locally, without using quota, while the breaker is open"""
+        saved_client = main.groq_client
+        used = main.llm_quota.used()
+        breaker = CircuitBreaker()
+        breaker.opened_at = time.monotonic()
+        main.groq_client = LLMClient(FakeGroqClient(), breaker=breaker)
+        try:
+            response = client.post("/chat", json={"message": "Predict emergency claims for Johnson County next week"})
+            assert response.status_code == 200
+            data = response.json()
+            assert data["response"].startswith("## Johnson County Emergency Claims Prediction")
+            assert data["usage"]["groq_requests_used"] == used
+        finally:
+            main.groq_client = saved_client
+
+    def test_chat_skips_quota_while_trial_in_flight(self, client):
+        """Test /chat does not spend quota when the half-open trial is already taken"""
+        saved_client = main.groq_client
+        used = main.llm_quota.used()
+        breaker = CircuitBreaker(cooldown=0.0)
+        breaker.opened_at = time.monotonic() - 1
+        assert breaker.allow() is not None
+        main.groq_client = LLMClient(FakeGroqClient(), breaker=breaker)
+        try:
+            response = client.post("/chat", json={"message": "Predict emergency claims for Johnson County next week"})
+            assert response.status_code == 200
+            assert response.json()["usage"]["groq_requests_used"] == used
+        finally:
+            main.groq_client = saved_client
@@ -0,0 +1,216 @@
+import pytest
+import numpy as np
+
+from ml_models import ClaimsPredictionModel
+
+@pytest.fixture(scope="module")
+def ts_model(predictor):
+    model = ClaimsPredictionModel()
+    model.data = predictor.data[
+        (predictor.data['county'] == 'Johnson') &
+        predictor.data['claim_type'].isin(['emergency', 'pharmacy'])
+    ]
+    model.models = predictor.models
+    model.train_time_series_engine(n_jobs=1, horizon_days=60)
+    return model
+
+
+class TestTimeSeriesEngine:
+    """Tests for the ARIMA forecasting engine"""
+    
+    def test_engine_fits_every_series(self, ts_model):
+        """Test one cached forecast path per series"""
+        assert set(ts_model.ts_engine.series) == {'Johnson_emergency', 'Johnson_pharmacy'}
+        assert ts_model.ts_engine.series['Johnson_emergency']['forecast'].shape == (60, 2)
+        assert 'arima' in ts_model.available_engines()
+
+    def test_arima_prediction_inside_horizon(self, ts_model):
+        """Test dates inside the horizon are served by the ARIMA engine"""
+        start = ts_model.ts_engine.series['Johnson_emergency']['start']
+        pred = ts_model.predict_claims('Johnson', 'emergency', str(start + 10), engine='arima')
+        assert pred['engine'] == 'arima'
+        assert pred['predicted_count'] > 0
+        assert pred['predicted_cost'] > 0
+
+    def test_arima_falls_back_outside_horizon(self, ts_model):
+        """Test dates beyond the horizon fall back to regression"""
+        pred = ts_model.predict_claims('Johnson', 'emergency', '2040-01-01', engine='arima')
+        assert pred['engine'] == 'regression'
+
+    def test_refit_warm_starts_and_respects_budget(self, ts_model):
+        """Test a zero time budget skips new fits but keeps cached state"""
+        cached = ts_model.ts_engine.series['Johnson_pharmacy']['forecast'].copy()
+        ts_model.train_time_series_engine(n_jobs=1, time_budget=1e-9)
+        assert set(ts_model.ts_engine.skipped) == {'Johnson_emergency', 'Johnson_pharmacy'}
+        assert np.array_equal(ts_model.ts_engine.series['Johnson_pharmacy']['forecast'], cached)
+
+    def test_unknown_engine_rejected(self, ts_model):
+        """Test an unknown engine name raises ValueError"""
+        with pytest.raises(ValueError):
+            ts_model.predict_claims('Johnson', 'emergency', '2025-01-15', engine='prophet')
+
+@pytest.fixture(scope="module")
+def pooled_predictor(predictor):
+    model = ClaimsPredictionModel()
+    model.data = predictor.data
+    model.models = dict(predictor.models)
+    model.train_pooled_model()
+    return model
+
+
+class TestPooledModel:
+    """Tests for the pooled cross-county regression"""
+    
+    def test_one_effect_vector_per_area_and_claim_type(self, pooled_predictor):
+        """Test effects are shared per (area_type, claim_type) group"""
+        pooled = pooled_predictor.pooled_model
+        n_groups = len(pooled.area_types) * len(pooled_predictor.get_claim_types())
+        assert pooled.effects.shape == (n_groups, len(pooled.FEATURES), 2)
+        assert set(pooled.area_types) == set(pooled_predictor.data['area_type'])
+        assert 'pooled' in pooled_predictor.available_engines()
+
+    def test_pooled_prediction_tracks_series_level(self, pooled_predictor):
+        """Test per-county offsets keep predictions near each series' mean"""
+        for county in ('Johnson', 'Ford'):
+            pred = pooled_predictor.predict_claims(county, 'emergency', '2025-01-15', engine='pooled')
+            data = pooled_predictor.data
+            series = data[(data['county'] == county) & (data['claim_type'] == 'emergency')]
+            assert pred['engine'] == 'pooled'
+            assert 0.5 * series['claim_count'].mean() < pred['predicted_count'] < 2 * series['claim_count'].mean()
+
+    def test_matches_shared_store_fit(self, pooled_predictor, tmp_path):
+        """Test fitting from the shared store gives the same coefficients"""
+        pooled_predictor.export_shared_store(str(tmp_path / "store"))
+        attached = ClaimsPredictionModel()
+        attached.attach_shared_store(str(tmp_path / "store"))
+        attached.train_pooled_model()
+        assert attached.pooled_model.area_types == pooled_predictor.pooled_model.area_types
+        assert np.allclose(attached.pooled_model.effects, pooled_predictor.pooled_model.effects)
+        assert np.allclose(attached.pooled_model.offsets, pooled_predictor.pooled_model.offsets)
+
+    def test_serves_series_without_regression_model(self, pooled_predictor):
+        """Test the regression engine falls back to pooled for series it skipped"""
+        del pooled_predictor.models['Ford_mental_health']
+        pred = pooled_predictor.predict_claims('Ford', 'mental_health', '2025-01-15')
+        assert pred['engine'] == 'pooled'
+
+class TestPredictionIntervals:
+    """Tests for the closed-form prediction intervals"""
+
+    def test_batch_matches_single_date_predictions(self, predictor):
+        """Test the vectorized range path equals per-date predictions"""
+        batch = predictor.predict_multiple_dates('Sedgwick', 'pharmacy', '2025-03-01', 10)
+        assert len(batch) == 10
+        for pred in batch:
+            assert pred == pytest.approx(predictor.predict_claims('Sedgwick', 'pharmacy', pred['date']))
+
+    def test_interval_widens_away_from_training_data(self, predictor):
+        """Test leverage makes far extrapolations less certain"""
+        near = predictor.predict_claims('Johnson', 'emergency', '2025-01-15')
+        far = predictor.predict_claims('Johnson', 'emergency', '2035-01-15')
+        near_width = near['predicted_cost_upper'] - near['predicted_cost_lower']
+        far_width = far['predicted_cost_upper'] - far['predicted_cost_lower']
+        assert far_width > near_width
+
+    def test_models_without_interval_terms(self, predictor):
+        """Test models saved before intervals existed still predict, without bounds"""
+        model = ClaimsPredictionModel()
+        model.data = predictor.data
+        model.models = {key: {k: v for k, v in info.items() if k != 'interval'}
+                        for key, info in predictor.models.items()}
+        pred = model.predict_claims('Johnson', 'emergency', '2025-01-15')
+        assert pred['predicted_count'] == predictor.predict_claims('Johnson', 'emergency', '2025-01-15')['predicted_count']
+        assert pred['predicted_count_lower'] is None
+
+class TestRegressionStatistics:
+    """Tests for the sufficient-statistics trainer"""
+
+    def test_matches_least_squares_fit(self, predictor):
+        """Test coefficients and residual variance equal a direct least-squares fit of the series"""
+        data = predictor.prepare_features(predictor.data[(predictor.data['county'] == 'Johnson')
+                                                         & (predictor.data['claim_type'] == 'emergency')])
+        info = predictor.models['Johnson_emergency']
+        X = np.column_stack([np.ones(len(data)), data[info['feature_cols']].to_numpy(np.float64)])
+        y = data[['claim_count', 'total_cost']].to_numpy(np.float64)
+        beta = np.linalg.lstsq(X, y, rcond=None)[0]
+        fitted = np.column_stack([info['count_model'].predict(X[:, 1:]), info['cost_model'].predict(X[:, 1:])])
+        assert fitted == pytest.approx(X @ beta, rel=1e-8)
+        dof = len(X) - np.linalg.matrix_rank(X)
+        assert info['interval']['residual_var'] == pytest.approx(((y - X @ beta) ** 2).sum(axis=0) / dof, rel=1e-6)
+
+    def test_chunking_does_not_change_models(self, predictor):
+        """Test small chunks and the single-series path give the same models"""
+        model = ClaimsPredictionModel()
+        model.data = predictor.data
+        model.train_all_models(chunk_size=1000)
+        assert model.models.keys() == predictor.models.keys()
+        for key, info in model.models.items():
+            assert info['count_model'].coef_ == pytest.approx(predictor.models[key]['count_model'].coef_)
+            assert info['cost_model'].intercept_ == pytest.approx(predictor.models[key]['cost_model'].intercept_)
+        model.train_county_model('Sedgwick', 'pharmacy')
+        assert model.models['Sedgwick_pharmacy']['interval']['xtx_inv'] == pytest.approx(
+            predictor.models['Sedgwick_pharmacy']['interval']['xtx_inv'])
+
+class TestRollupCube:
+    """Tests for the aggregate cube built from monthly rollup rows"""
+
+    def test_monthly_rows_match_daily_rows(self, predictor):
+        """Test a cube fed monthly rollup rows answers like one fed every daily row"""
+        from rollup import RollupCube, monthly_rollup
+        county_attributes, columns = predictor.coded_columns()
+        table = monthly_rollup(columns)
+        assert len(np.unique(table[:, :4], axis=0)) == len(table)
+        assert table[:, 4].sum() == len(predictor.data)
+        daily = RollupCube(predictor.get_counties(), predictor.get_claim_types(), county_attributes, columns)
+        for query in ({"measure": "total_cost", "stat": "mean", "group_by": ["area_type", "month"]},
+                      {"measure": "claim_count", "stat": "count", "filters": {"county": ["Ford"]}}):
+            assert predictor.get_rollup_cube().query(**query) == daily.query(**query)
+
+class TestImportCost:
+    """Tests for the start-up import footprint"""
+    
+    def test_heavy_dependencies_load_lazily(self):
+        """Test importing the API pulls in neither sklearn, scipy.stats nor statsmodels"""
+        import subprocess
+        import sys
+        code = ("import sys, main; "
+                "print(sorted(m for m in ('sklearn', 'scipy.stats', 'statsmodels') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "[]"
+
+class TestForecastHorizon:
+    """Tests for the precomputed forecast table"""
+
+    @pytest.fixture
+    def model(self, predictor):
+        model = ClaimsPredictionModel()
+        model.data, model.models = predictor.data, predictor.models
+        model.horizon = model.build_forecast_horizon(start='2025-01-01', days=60)
+        return model
+
+    def test_matches_on_demand_predictions(self, model, predictor):
+        """Test range and single-date lookups equal the per-model path"""
+        table = model.predict_multiple_dates('Johnson', 'emergency', '2025-01-10', 30)
+        on_demand = predictor.predict_multiple_dates('Johnson', 'emergency', '2025-01-10', 30)
+        assert len(table) == 30
+        for pred, expected in zip(table, on_demand):
+            assert pred == pytest.approx(expected)
+        assert model.predict_claims('Sedgwick', 'pharmacy', '2025-02-01') == pytest.approx(
+            predictor.predict_claims('Sedgwick', 'pharmacy', '2025-02-01'))
+
+    def test_served_from_table_inside_horizon(self, model):
+        """Test dates inside the table never reach the per-model path"""
+        model._predict_regression = None
+        assert len(model.predict_multiple_dates('Johnson', 'emergency', '2025-01-01', 60)) == 60
+
+    def test_falls_back_outside_horizon(self, model, predictor):
+        """Test ranges crossing the table's end are computed on demand"""
+        assert model.predict_multiple_dates('Johnson', 'emergency', '2025-02-20', 20) == \
+            predictor.predict_multiple_dates('Johnson', 'emergency', '2025-02-20', 20)
+
+    def test_stale_table_ignored(self, model):
+        """Test a table built for other data or models is not used"""
+        model.horizon.version = 'stale'
+        model._predict_regression = None
+        with pytest.raises(TypeError):
+            model.predict_claims('Johnson', 'emergency', '2025-01-15')
@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import rate_limit
+from rate_limit import DailyQuota
+
+
+def acquire_many(path, limit, attempts):
+    quota = DailyQuota(path, limit)
+    return sum(quota.acquire() for _ in range(attempts))
+
+
+class TestDailyQuota:
+    """Tests for the SQLite-backed daily LLM quota"""
+
+    def test_stops_at_limit(self):
+        """Test acquisitions succeed up to the limit and then fail"""
+        quota = DailyQuota(":memory:", 3)
+        assert [quota.acquire() for _ in range(5)] == [True, True, True, False, False]
+        assert quota.status()["used"] == 3
+        assert quota.remaining() == 0
+
+    def test_limit_shared_across_processes(self, tmp_path):
+        """Test workers sharing one database never exceed the limit together"""
+        path = str(tmp_path / "quota.sqlite")
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            granted = sum(pool.map(acquire_many, [path] * 4, [50] * 4, [30] * 4))
+        assert granted == 50
+        assert DailyQuota(path, 50).used() == 50
+
+    def test_limit_shared_across_threads(self):
+        """Test concurrent threads in one process never exceed the limit"""
+        quota = DailyQuota(":memory:", 40)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            granted = sum(pool.map(lambda _: quota.acquire(), range(100)))
+        assert granted == 40
+
+    def test_resets_on_new_day(self, monkeypatch):
+        """Test the quota refills at the next UTC day and old counters are dropped"""
+        quota = DailyQuota(":memory:", 2, refresh_seconds=0)
+        monkeypatch.setattr(rate_limit, "_today", lambda: "2025-01-01")
+        assert quota.acquire() and quota.acquire() and not quota.acquire()
+        monkeypatch.setattr(rate_limit, "_today", lambda: "2025-01-02")
+        assert quota.remaining() == 2
+        assert quota.acquire()
+        rows = quota._connection().execute("SELECT day FROM quota_usage").fetchall()
+        assert rows == [("2025-01-02",)]
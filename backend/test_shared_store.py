@@ -0,0 +1,154 @@
+import pytest
+
+import shared_store
+from ml_models import ClaimsPredictionModel
+
+@pytest.fixture(scope="module")
+def store_dir(predictor, dataset_path, tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("store") / "claims")
+    predictor.export_shared_store(directory, dataset_path)
+    return directory
+
+
+@pytest.fixture(scope="module")
+def worker(store_dir):
+    model = ClaimsPredictionModel()
+    model.attach_shared_store(store_dir)
+    return model
+
+
+class TestSharedStore:
+    """Tests for the memory-mapped multi-worker store"""
+    
+    def test_attached_worker_has_no_dataframe(self, worker):
+        """Test an attached worker serves without holding the raw data"""
+        assert worker.data is None
+        assert worker.has_data()
+        assert "Johnson" in worker.get_counties()
+        assert "mental_health" in worker.get_claim_types()
+
+    def test_arrays_are_memory_mapped(self, worker):
+        """Test columns and coefficient tables are read-only memory maps"""
+        import numpy as np
+        assert isinstance(worker.store.columns["claim_count"], np.memmap)
+        assert isinstance(worker.store.coefficients["count"], np.memmap)
+        assert not worker.store.columns["total_cost"].flags.writeable
+
+    def test_predictions_match_in_memory_models(self, predictor, worker):
+        """Test coefficient-table predictions equal the trained sklearn models"""
+        for county, claim_type, date in [("Johnson", "emergency", "2025-01-15"),
+                                         ("Ford", "pharmacy", "2025-07-04"),
+                                         ("Finney", "inpatient", "2026-02-01")]:
+            assert worker.predict_claims(county, claim_type, date) == predictor.predict_claims(county, claim_type, date)
+
+    def test_aggregates_match_dataframe(self, predictor, worker):
+        """Test precomputed insights and summaries equal the pandas results"""
+        assert worker.get_seasonal_insights("Johnson", "mental_health") == predictor.get_seasonal_insights("Johnson", "mental_health")
+        assert worker.get_county_summary("Sedgwick") == predictor.get_county_summary("Sedgwick")
+        assert worker.get_county_summary("InvalidCounty") == {}
+
+    def test_rollup_cube_matches_dataframe(self, predictor, store_dir):
+        """Test the rollup cube comes from the store's monthly rollup, without reading the columns"""
+        model = ClaimsPredictionModel()
+        model.attach_shared_store(store_dir)
+        model.store.columns = {}
+        assert model.store.county_attributes == predictor.coded_columns()[0]
+        query = {"measure": "claim_count", "group_by": ["metro", "claim_type"], "filters": {"year": [2024]}}
+        assert model.get_rollup_cube().query(**query) == predictor.get_rollup_cube().query(**query)
+
+    def test_prewarm_does_not_scan_rows(self, store_dir):
+        """Test a worker builds its cube and history index with far less memory than the columns"""
+        import tracemalloc
+        model = ClaimsPredictionModel()
+        model.attach_shared_store(store_dir)
+        column_bytes = sum(column.nbytes for column in model.store.columns.values())
+        tracemalloc.start()
+        try:
+            model.get_rollup_cube()
+            model.get_history_index()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert peak < column_bytes / 4
+
+    def test_history_matches_dataframe(self, predictor, worker):
+        """Test history served from the mapped columns equals the in-memory index"""
+        import numpy as np
+        args = ("Douglas", "outpatient", np.datetime64("2024-02-10"), np.datetime64("2024-05-20"), "weekly")
+        for mapped, in_memory in zip(worker.get_history_index().query(*args), predictor.get_history_index().query(*args)):
+            assert np.array_equal(mapped, in_memory)
+
+    def test_series_rows_sorted_by_date(self, worker):
+        """Test each series is a contiguous, date-sorted slice"""
+        import numpy as np
+        start, stop = worker.store.series_rows("Shawnee", "outpatient")
+        dates = worker.store.columns["date"][start:stop]
+        assert stop - start > 0
+        assert np.all(np.diff(dates.astype("int64")) > 0)
+
+    def test_ensure_store_builds_once(self, store_dir, dataset_path):
+        """Test a current store is reused instead of rebuilt"""
+        calls = []
+        assert shared_store.is_store_current(store_dir, dataset_path)
+        assert shared_store.ensure_store(store_dir, lambda: calls.append(1), dataset_path) is False
+        assert calls == []
+
+@pytest.fixture(scope="module")
+def partitions(predictor, tmp_path_factory):
+    """The session dataset shuffled and split into two partition files"""
+    directory = tmp_path_factory.mktemp("partitions")
+    shuffled = predictor.data.sample(frac=1, random_state=0)
+    paths = []
+    for k, part in enumerate((shuffled.iloc[: len(shuffled) // 2], shuffled.iloc[len(shuffled) // 2:])):
+        paths.append(str(directory / f"kansas_claims_part{k}.csv"))
+        part.assign(date=part['date'].dt.strftime('%Y-%m-%d')).to_csv(paths[-1], index=False)
+    return paths
+
+
+@pytest.fixture(scope="module")
+def stores(predictor, partitions, tmp_path_factory):
+    directory = tmp_path_factory.mktemp("stores")
+    in_memory = ClaimsPredictionModel()
+    predictor.export_shared_store(str(directory / "in_memory"))
+    in_memory.attach_shared_store(str(directory / "in_memory"))
+    streamed = ClaimsPredictionModel()
+    streamed.load_data_out_of_core(partitions, str(directory / "streamed"), chunk_size=2000)
+    return in_memory, streamed
+
+
+class TestOutOfCoreStore:
+    """Tests for building a store from CSV chunks without loading the data"""
+
+    def test_columns_match_in_memory_build(self, stores):
+        """Test chunked scattering yields the same sorted columns and offsets"""
+        import numpy as np
+        in_memory, streamed = stores
+        assert streamed.data is None
+        assert streamed.store.meta['vocabularies'] == in_memory.store.meta['vocabularies']
+        assert np.array_equal(streamed.store.series_offsets, in_memory.store.series_offsets)
+        for name, column in in_memory.store.columns.items():
+            assert streamed.store.columns[name].dtype == column.dtype
+            assert np.array_equal(streamed.store.columns[name], column), name
+
+    def test_aggregates_and_models_match(self, stores, predictor):
+        """Test insights, summaries and models trained from the streamed statistics"""
+        import numpy as np
+        in_memory, streamed = stores
+        assert streamed.get_seasonal_insights("Johnson", "mental_health") == in_memory.get_seasonal_insights("Johnson", "mental_health")
+        assert streamed.get_county_summary("Sedgwick") == in_memory.get_county_summary("Sedgwick")
+        assert streamed.store.county_attributes == in_memory.store.county_attributes
+        assert np.allclose(streamed.store.monthly_rollup, in_memory.store.monthly_rollup)
+        assert streamed.models.keys() == predictor.models.keys()
+        for key in ("Johnson_emergency", "Ford_pharmacy"):
+            for target in ("count", "cost"):
+                assert streamed.models[key][f"{target}_model"].coef_ == pytest.approx(
+                    predictor.models[key][f"{target}_model"].coef_, rel=1e-6, abs=1e-9)
+
+    def test_reuses_saved_models(self, predictor, partitions, tmp_path):
+        """Test saved models are stored as-is instead of retrained"""
+        predictor.save_models(str(tmp_path / "models.pkl"))
+        model = ClaimsPredictionModel()
+        model.load_data_out_of_core(partitions, str(tmp_path / "store"), models_path=str(tmp_path / "models.pkl"))
+        assert model.predict_claims("Johnson", "emergency", "2025-01-15") == predictor.predict_claims(
+            "Johnson", "emergency", "2025-01-15")
+        assert shared_store.is_store_current(str(tmp_path / "store"), partitions, str(tmp_path / "models.pkl"))
@@ -10,6 +10,8 @@ export const useClaimsStore = defineStore('claims', {
     selectedCounty: null,
     selectedClaimType: null,
     predictions: [],
+    summary: null,
+    insights: null,
     loading: false,
     error: null
   }),
@@ -19,17 +21,19 @@ export const useClaimsStore = defineStore('claims', {
       try {
         this.loading = true
         
-        const [countiesRes, claimTypesRes] = await Promise.all([
-          axios.get(`${API_BASE}/counties`),
-          axios.get(`${API_BASE}/claim-types`)
-        ])
+        // One request for vocabularies plus the default county's summary, insights and forecast
+        const response = await axios.get(`${API_BASE}/bootstrap`)
+        const data = response.data
         
-        this.counties = countiesRes.data.counties
-        this.claimTypes = claimTypesRes.data.claim_types
+        this.counties = data.counties
+        this.claimTypes = data.claim_types
+        this.summary = data.summary
+        this.insights = data.insights
+        this.predictions = data.forecast
         
         // Set defaults
-        this.selectedCounty = this.counties[0] || null
-        this.selectedClaimType = this.claimTypes[0] || null
+        this.selectedCounty = data.defaults.county
+        this.selectedClaimType = data.defaults.claim_type
         
       } catch (error) {
         this.error = error.message